@@ -6,6 +6,17 @@ import threading
 # Use thread-local storage instead
 _thread_local = threading.local()
 
+# Applied to every new connection.
+# WAL lets API reads proceed while the log writer commits; NORMAL sync is safe under WAL
+# (a power loss can drop the last commits, never corrupt the DB).
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{int(os.getenv('ORCHESTRATOR_DB_CACHE_KB', 16384))}",  # negative = KiB
+    f"PRAGMA busy_timeout={int(os.getenv('ORCHESTRATOR_DB_BUSY_TIMEOUT_MS', 10000))}",
+    "PRAGMA temp_store=MEMORY",
+)
+
 def get_db_connection():
     """Gets a thread-local connection to prevent SQLite thread errors."""
     # Check if we have a connection and if it's still valid
@@ -28,7 +39,10 @@ def get_db_connection():
         except:
             pass
             
-    _thread_local.connection = sqlite3.connect(db_path, timeout=10.0, check_same_thread=True)
+    conn = sqlite3.connect(db_path, timeout=10.0, check_same_thread=True)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _thread_local.connection = conn
     return _thread_local.connection
 
 def return_db_connection(conn):
@@ -1,22 +1,168 @@
 import asyncio
+import heapq
+import itertools
 import subprocess
 import os
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from .db import get_db_connection, return_db_connection
 
 logger = logging.getLogger("JobRunner")
 
+class LogSubscriber:
+    """
+    One live log consumer. If it falls too far behind, it is marked `overflowed`
+    and stops receiving rows; the consumer then catches up from the DB.
+    """
+    def __init__(self, maxsize=5000):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def push(self, row):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
 class JobRunner:
     # Dictionary to track running subprocesses by run_id
     active_processes = {}
+
+    # --- Admission Control ---
+    # Lower value = dispatched first
+    PRIORITY_MANUAL = 0
+    PRIORITY_SCHEDULED = 10
+
+    limits = {
+        "max_concurrent_runs": int(os.getenv("JOB_MAX_CONCURRENT_RUNS", 4)),
+        "max_runs_per_job": int(os.getenv("JOB_MAX_RUNS_PER_JOB", 1)),
+        "job_limits": {}  # {"<job_id>": max concurrent runs} overrides
+    }
+    _pending = []  # heap of (priority, seq, run)
+    _seq = itertools.count()
+    _running_total = 0
+    _running_by_job = {}  # job_id -> running count
+    _active_task_ids = set()  # tasks with a QUEUED or RUNNING run
+
+    # --- Log Writer ---
+    # One writer task merges log lines from every active run into shared batches
+    LOG_BATCH_SIZE = 500
+    LOG_FLUSH_INTERVAL = 0.5  # seconds
+    _log_queue = None  # asyncio.Queue of (run_id, text) or a flush Future
+    _log_writer_task = None
+    _log_subscribers = {}  # run_id -> set of LogSubscriber
+
+    @staticmethod
+    def load_limits():
+        """Reloads concurrency limits from orchestrator_config ('job_runner_config')."""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT config_value FROM orchestrator_config WHERE config_key = 'job_runner_config'")
+            row = cursor.fetchone()
+            return_db_connection(conn)
+            if row:
+                JobRunner.limits.update(json.loads(row[0]))
+        except Exception as e:
+            logger.error(f"Failed to load job_runner_config: {e}")
+        JobRunner._dispatch()
+
+    @staticmethod
+    def submit(job_id, script_path, config_override=None, proxy_manager=None,
+               priority=PRIORITY_MANUAL, task_id=None, skip_if_running=False):
+        """
+        Queues a run and dispatches it as soon as the global and per-job limits allow.
+        The run is visible in orchestrator_history as QUEUED until it starts.
+        Returns the run_id, or None if skipped because the task already has a run in flight.
+        """
+        if skip_if_running and task_id is not None and task_id in JobRunner._active_task_ids:
+            logger.info(f"Skipping Task {task_id} (Job {job_id}): previous run still queued/running")
+            return None
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO orchestrator_history (job_id, start_time, status)
+            VALUES (?, CURRENT_TIMESTAMP, 'QUEUED')
+        """, (job_id,))
+        run_id = cursor.lastrowid
+        conn.commit()
+        return_db_connection(conn)
+
+        run = {
+            "run_id": run_id,
+            "job_id": job_id,
+            "script_path": script_path,
+            "config_override": config_override,
+            "proxy_manager": proxy_manager,
+            "task_id": task_id
+        }
+        heapq.heappush(JobRunner._pending, (priority, next(JobRunner._seq), run))
+        if task_id is not None:
+            JobRunner._active_task_ids.add(task_id)
+
+        logger.info(f"Queued Job {job_id} (Run {run_id}, priority {priority})")
+        JobRunner._dispatch()
+        return run_id
+
+    @staticmethod
+    def _job_limit(job_id):
+        return int(JobRunner.limits.get("job_limits", {}).get(str(job_id), JobRunner.limits["max_runs_per_job"]))
+
+    @staticmethod
+    def _dispatch():
+        """Starts queued runs in priority order while slots are free."""
+        deferred = []
+        while JobRunner._pending and JobRunner._running_total < int(JobRunner.limits["max_concurrent_runs"]):
+            item = heapq.heappop(JobRunner._pending)
+            run = item[2]
+            if JobRunner._running_by_job.get(run["job_id"], 0) >= JobRunner._job_limit(run["job_id"]):
+                deferred.append(item)  # Job saturated; let other jobs through
+                continue
+
+            JobRunner._running_total += 1
+            JobRunner._running_by_job[run["job_id"]] = JobRunner._running_by_job.get(run["job_id"], 0) + 1
+            asyncio.create_task(JobRunner._run_admitted(run))
+
+        for item in deferred:
+            heapq.heappush(JobRunner._pending, item)
+
+    @staticmethod
+    async def _run_admitted(run):
+        try:
+            await JobRunner.run_job(run["job_id"], run["script_path"], run["config_override"],
+                                    run["proxy_manager"], run_id=run["run_id"])
+        except Exception as e:
+            logger.error(f"Run {run['run_id']} crashed: {e}")
+        finally:
+            JobRunner._running_total -= 1
+            JobRunner._running_by_job[run["job_id"]] -= 1
+            if run["task_id"] is not None:
+                JobRunner._active_task_ids.discard(run["task_id"])
+            JobRunner._dispatch()
+
+    @staticmethod
+    def _cancel_queued(run_id):
+        for i, item in enumerate(JobRunner._pending):
+            run = item[2]
+            if run["run_id"] == run_id:
+                JobRunner._pending.pop(i)
+                heapq.heapify(JobRunner._pending)
+                if run["task_id"] is not None:
+                    JobRunner._active_task_ids.discard(run["task_id"])
+                JobRunner._end_log_stream(run_id)
+                return True
+        return False
     
     @staticmethod
-    async def run_job(job_id, script_path, config_override=None, proxy_manager=None):
+    async def run_job(job_id, script_path, config_override=None, proxy_manager=None, run_id=None):
         """
         Executes a script as a subprocess.
         Updates orchestrator_history and writes logs to orchestrator_logs.
+        If run_id is given (a QUEUED run from submit), that history row is reused.
         """
         # 1. Prepare Config & Env
         env = os.environ.copy()
@@ -37,25 +183,28 @@ class JobRunner:
         if config_override and config_override != "{}":
             args.extend(["--config", config_override])
 
-        # 2. DB: Create History Record
+        # 2. DB: Create (or promote the queued) History Record
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO orchestrator_history (job_id, start_time, status)
-            VALUES (?, CURRENT_TIMESTAMP, 'RUNNING')
-        """, (job_id,))
-        run_id = cursor.lastrowid
+        if run_id is None:
+            cursor.execute("""
+                INSERT INTO orchestrator_history (job_id, start_time, status)
+                VALUES (?, CURRENT_TIMESTAMP, 'RUNNING')
+            """, (job_id,))
+            run_id = cursor.lastrowid
+        else:
+            cursor.execute("""
+                UPDATE orchestrator_history SET start_time=CURRENT_TIMESTAMP, status='RUNNING'
+                WHERE run_id=?
+            """, (run_id,))
         conn.commit()
         return_db_connection(conn)
         
         logger.info(f"Started Job {job_id} (Run {run_id}): {' '.join(args)}")
 
         # 3. Execute Subprocess
+        JobRunner._ensure_log_writer()
         try:
-            # Create log queue and writer task
-            log_queue = asyncio.Queue()
-            log_writer_task = asyncio.create_task(JobRunner._batch_log_writer(run_id, log_queue))
-            
             process = await asyncio.create_subprocess_exec(
                 *args,
                 stdout=asyncio.subprocess.PIPE,
@@ -76,17 +225,13 @@ class JobRunner:
                     text = line.decode().strip()
                     if text:
                         print(f"[Job {job_id}] {text}")
-                        await log_queue.put(text)
+                        await JobRunner._log_queue.put((run_id, text))
 
             await asyncio.gather(
                 read_stream(process.stdout, "stdout"),
                 read_stream(process.stderr, "stderr")
             )
             
-            # Signal log writer to finish
-            await log_queue.put(None)
-            await log_writer_task
-            
             exit_code = await process.wait()
             # Remove from tracking once complete
             JobRunner.active_processes.pop(run_id, None)
@@ -98,11 +243,12 @@ class JobRunner:
             exit_code = -1
             status = 'FAILURE'
             # Log the crash
-            await log_queue.put(f"CRASH: {str(e)}")
-            await log_queue.put(None)
-            await log_writer_task
+            await JobRunner._log_queue.put((run_id, f"CRASH: {str(e)}"))
             JobRunner.active_processes.pop(run_id, None)
 
+        # Make sure every line of this run is committed before it is marked finished
+        await JobRunner._flush_logs()
+
         # 5. DB: Update History Record
         end_conn = get_db_connection()
         end_conn.cursor().execute("""
@@ -113,10 +259,11 @@ class JobRunner:
         end_conn.commit()
         
         # 6. Cleanup: Keep only last 5 runs
+        # Pruned run_ids are queued (same transaction) for RetentionWorker to delete their logs
         try:
-            end_conn.execute("""
-                DELETE FROM orchestrator_history 
+            prune_filter = """
                 WHERE job_id = ? 
+                AND status NOT IN ('QUEUED', 'RUNNING')
                 AND run_id NOT IN (
                     SELECT run_id 
                     FROM orchestrator_history 
@@ -124,60 +271,127 @@ class JobRunner:
                     ORDER BY start_time DESC 
                     LIMIT 5
                 )
-            """, (job_id, job_id))
+            """
+            end_conn.execute(f"INSERT OR IGNORE INTO orchestrator_pruned_runs (run_id) SELECT run_id FROM orchestrator_history {prune_filter}", (job_id, job_id))
+            end_conn.execute(f"DELETE FROM orchestrator_history {prune_filter}", (job_id, job_id))
             end_conn.commit()
         except Exception as e:
+            end_conn.rollback()
             logger.error(f"Failed to cleanup history for job {job_id}: {e}")
 
         return_db_connection(end_conn)
+        JobRunner._end_log_stream(run_id)
         
         return run_id
 
     @staticmethod
-    async def _batch_log_writer(run_id, queue):
+    def _ensure_log_writer():
+        if JobRunner._log_writer_task is None or JobRunner._log_writer_task.done():
+            JobRunner._log_queue = asyncio.Queue(maxsize=10000)  # Bounded: slows readers if the DB falls behind
+            JobRunner._log_writer_task = asyncio.create_task(JobRunner._log_writer())
+
+    @staticmethod
+    async def _flush_logs():
+        """Waits until every line queued so far has been committed."""
+        marker = asyncio.get_running_loop().create_future()
+        await JobRunner._log_queue.put(marker)
+        await marker
+
+    @staticmethod
+    async def _log_writer():
         """
-        Batched log writer to reduce DB connections.
-        Collects logs and writes in batches.
+        Single writer for orchestrator_logs.
+        Collects lines from all runs for up to LOG_FLUSH_INTERVAL (or LOG_BATCH_SIZE lines),
+        then commits them in one transaction off the event loop.
+        Flush markers are resolved once everything queued before them is committed.
         """
-        conn = get_db_connection()
-        batch = []
-        batch_size = 100
-        timeout = 1.0  # seconds
-        
+        queue = JobRunner._log_queue
+        loop = asyncio.get_running_loop()
         while True:
-            try:
-                # Try to collect up to batch_size logs
-                while len(batch) < batch_size:
-                    log_line = await asyncio.wait_for(queue.get(), timeout=timeout)
-                    if log_line is None:
-                        # Sentinel value - finish up
-                        if batch:
-                            cursor = conn.cursor()
-                            cursor.executemany(
-                                "INSERT INTO orchestrator_logs (run_id, log_text, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
-                                [(run_id, line) for line in batch]
-                            )
-                            conn.commit()
-                        return_db_connection(conn)
-                        return
-                    batch.append(log_line)
-            except asyncio.TimeoutError:
-                # Timeout - write whatever we have
-                pass
-            
-            # Write batch if we have anything
+            batch = []
+            markers = []
+            item = await queue.get()
+            deadline = loop.time() + JobRunner.LOG_FLUSH_INTERVAL
+            while True:
+                if isinstance(item, asyncio.Future):
+                    markers.append(item)
+                    break  # Someone is waiting: write now
+                batch.append(item)
+                if len(batch) >= JobRunner.LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+
             if batch:
-                cursor = conn.cursor()
-                cursor.executemany(
-                    "INSERT INTO orchestrator_logs (run_id, log_text, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
-                    [(run_id, line) for line in batch]
-                )
-                conn.commit()
-                batch = []
+                try:
+                    rows = await asyncio.to_thread(JobRunner._write_logs, batch)
+                    JobRunner._publish_logs(rows)
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} log lines: {e}")
+
+            for marker in markers:
+                if not marker.done():
+                    marker.set_result(None)
+
+    @staticmethod
+    def _write_logs(batch):
+        """
+        Inserts (run_id, text) pairs; returns them as committed rows with their log_ids.
+        This is the only writer of orchestrator_logs, so the batch gets contiguous ids
+        ending at last_insert_rowid().
+        """
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")  # Same format as CURRENT_TIMESTAMP
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO orchestrator_logs (run_id, log_text, created_at) VALUES (?, ?, ?)",
+            [(run_id, text, created_at) for run_id, text in batch]
+        )
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.commit()
+        return_db_connection(conn)
+
+        first_id = last_id - len(batch) + 1
+        return [
+            {"log_id": first_id + i, "run_id": run_id, "log_text": text, "created_at": created_at}
+            for i, (run_id, text) in enumerate(batch)
+        ]
+
+    # --- Live Log Subscriptions ---
+
+    @staticmethod
+    def subscribe_logs(run_id):
+        sub = LogSubscriber()
+        JobRunner._log_subscribers.setdefault(run_id, set()).add(sub)
+        return sub
+
+    @staticmethod
+    def unsubscribe_logs(run_id, sub):
+        subs = JobRunner._log_subscribers.get(run_id)
+        if subs:
+            subs.discard(sub)
+            if not subs:
+                JobRunner._log_subscribers.pop(run_id, None)
+
+    @staticmethod
+    def _publish_logs(rows):
+        """Fans committed rows out to live subscribers (event loop thread only)."""
+        for row in rows:
+            for sub in list(JobRunner._log_subscribers.get(row["run_id"], ())):
+                sub.push(row)
+
+    @staticmethod
+    def _end_log_stream(run_id):
+        for sub in JobRunner._log_subscribers.pop(run_id, set()):
+            sub.push(None)
 
     @staticmethod
     def cancel_job(run_id):
-        """Attempts to cleanly terminate a running job process."""
+        """Attempts to cleanly terminate a running job process, or drops a queued run."""
+        if JobRunner._cancel_queued(run_id):
+            return True
         process = JobRunner.active_processes.get(run_id)
         if process:
             try:
@@ -5,10 +5,11 @@ import requests
 import random
 import re
 import logging
-from concurrent.futures import ThreadPoolExecutor
 import json
 from typing import List, Dict, Set, Optional, Any, Union
 
+from shared_utils import ProxyValidator
+
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,11 @@ class ProxyManager:
                         "concurrency": 250, 
                         "ttl": 600, 
                         "test_url": "http://p2c.cityofdubuque.org/main.aspx",
+                        "probe_method": "partial", # get | head | partial
+                        "probe_bytes": 2048,
                         "target_pool_size": 100,
+                        "ewma_alpha": 0.3,
+                        "feedback_evict_failures": 3,
                         "sources": [
                             "https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/protocols/http/data.txt"
                         ]
@@ -39,10 +44,12 @@ class ProxyManager:
                     cls._instance.valid_proxies = [] # type: List[str]
                     cls._instance.raw_proxies_pool = set() # type: Set[str]
                     cls._instance.proxy_failures = {} # type: Dict[str, int]  # Track failures for LRU eviction
+                    cls._instance.proxy_stats = {} # type: Dict[str, Dict[str, Any]]  # Health scoreboard (EWMA latency / success rate)
                     cls._instance.total_raw = 0
                     cls._instance.running = False
                     cls._instance.last_fetch_time = 0.0
                     cls._instance.churn_stats = {"checked": 0, "success": 0}
+                    cls._instance._validator = None # type: Optional[ProxyValidator]
 
         return cls._instance
 
@@ -91,8 +98,97 @@ class ProxyManager:
         return True
 
     def get_proxies(self) -> List[str]:
+        """Valid proxies, best first."""
+        return [entry["proxy"] for entry in self.get_ranked_proxies()]
+
+    def get_ranked_proxies(self) -> List[Dict[str, Any]]:
+        """Valid proxies with their health stats, sorted by score (lower is better)."""
+        with self._lock:
+            ranked = []
+            for p in self.valid_proxies:
+                stats = self.proxy_stats.get(p, {})
+                latency = stats.get("ewma_latency")
+                ranked.append({
+                    "proxy": p,
+                    "latency_ms": round(latency * 1000) if latency is not None else None,
+                    "success_rate": round(stats["success_rate"], 3) if stats.get("success_rate") is not None else None,
+                    "last_success": stats.get("last_success"),
+                    "score": round(self._score(stats), 3)
+                })
+        ranked.sort(key=lambda e: e["score"])
+        return ranked
+
+    def record_result(self, proxy: str, success: bool, latency: Optional[float] = None) -> None:
+        """Folds one observation (seconds) into the proxy's EWMA latency and success rate."""
+        alpha = float(self.config.get("ewma_alpha", 0.3))
+        now = time.time()
+        with self._lock:
+            stats = self.proxy_stats.setdefault(proxy, {
+                "ewma_latency": None, "success_rate": None,
+                "successes": 0, "failures": 0, "consecutive_failures": 0,
+                "last_success": None, "last_checked": None
+            })
+            outcome = 1.0 if success else 0.0
+            if stats["success_rate"] is None:
+                stats["success_rate"] = outcome
+            else:
+                stats["success_rate"] = alpha * outcome + (1 - alpha) * stats["success_rate"]
+
+            if success:
+                stats["successes"] += 1
+                stats["consecutive_failures"] = 0
+                stats["last_success"] = now
+                if latency is not None:
+                    if stats["ewma_latency"] is None:
+                        stats["ewma_latency"] = latency
+                    else:
+                        stats["ewma_latency"] = alpha * latency + (1 - alpha) * stats["ewma_latency"]
+            else:
+                stats["failures"] += 1
+                stats["consecutive_failures"] += 1
+            stats["last_checked"] = now
+
+    def apply_feedback(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Applies outcomes reported by scrapers.
+        A proxy failing `feedback_evict_failures` times in a row is evicted from the
+        valid pool (it stays in the raw pool for re-validation); a proxy that works
+        for a scraper is promoted into the valid pool immediately.
+        Only proxies the manager already knows (raw pool or scoreboard) are considered;
+        feedback about any other address is ignored so clients cannot inject proxies.
+        """
+        evict_after = int(self.config.get("feedback_evict_failures", 3))
+        evicted = promoted = 0
         with self._lock:
-            return list(self.valid_proxies)
+            known = [r for r in results if r["proxy"] in self.raw_proxies_pool or r["proxy"] in self.proxy_stats]
+        for r in known:
+            self.record_result(r["proxy"], r["success"], r.get("latency"))
+
+        with self._lock:
+            valid_set = set(self.valid_proxies)
+            for proxy in {r["proxy"] for r in known}:
+                stats = self.proxy_stats.get(proxy, {})
+                if stats.get("consecutive_failures", 0) >= evict_after and proxy in valid_set:
+                    valid_set.discard(proxy)
+                    evicted += 1
+                elif stats.get("consecutive_failures", 0) == 0 and proxy not in valid_set:
+                    valid_set.add(proxy)
+                    self.raw_proxies_pool.add(proxy)
+                    self.proxy_failures.pop(proxy, None)
+                    promoted += 1
+            self.valid_proxies = list(valid_set)
+
+        return {"accepted": len(known), "ignored": len(results) - len(known), "evicted": evicted, "promoted": promoted}
+
+    def _score(self, stats: Dict[str, Any]) -> float:
+        """Expected seconds per successful request: latency inflated by failure rate."""
+        latency = stats.get("ewma_latency")
+        if latency is None:
+            latency = 5.0  # Validation timeout: unknown proxies rank as slow
+        success_rate = stats.get("success_rate")
+        if success_rate is None:
+            success_rate = 0.5
+        return latency / max(success_rate, 0.05)
 
     def _fetch_loop(self) -> None:
         logger.info("[ProxyManager] Started Source Fetch Loop.")
@@ -135,11 +231,10 @@ class ProxyManager:
                 test_url = self.config["test_url"]
                 working_batch: List[str] = []
                 
-                with ThreadPoolExecutor(max_workers=concurrency) as executor:
-                    futures = [executor.submit(self._check_proxy, p, test_url) for p in to_check]
-                    for f in futures:
-                        res = f.result()
-                        if res: working_batch.append(res)
+                results = self._get_validator().check_many(to_check, test_url)
+                for p, latency in results.items():
+                    self.record_result(p, latency is not None, latency)
+                    if latency is not None: working_batch.append(p)
                 
                 # 3. Update State
                 with self._lock:
@@ -166,6 +261,8 @@ class ProxyManager:
                             if self.proxy_failures[p] >= 3:
                                 self.raw_proxies_pool.discard(p)
                                 self.proxy_failures.pop(p, None)  # Clean up tracking
+                                self.proxy_stats.pop(p, None)
+                                self._get_validator().drop(p)
                              
                     self.valid_proxies = list(current_valid_set)
                     
@@ -220,12 +317,22 @@ class ProxyManager:
                 found.add(f"{ip}:{port}")
         return found
 
-    def _check_proxy(self, proxy: str, url: str) -> Optional[str]:
+    def _get_validator(self) -> ProxyValidator:
+        """
+        Long-lived probe engine (worker pool + per-proxy sessions).
+        Probe settings apply on the fly; the pool is only rebuilt if concurrency changes.
+        """
+        concurrency = int(self.config["concurrency"])
+        with self._lock:
+            if self._validator is None or self._validator.max_workers != concurrency:
+                if self._validator is not None:
+                    self._validator.close()
+                self._validator = ProxyValidator(max_workers=concurrency, max_sessions=max(concurrency * 8, 2000))
+            self._validator.probe_method = self.config.get("probe_method", "partial")
+            self._validator.probe_bytes = int(self.config.get("probe_bytes", 2048))
+            return self._validator
+
+    def _check_proxy(self, proxy: str, url: str) -> Optional[float]:
+        """Returns the probe latency in seconds, or None if the proxy failed."""
         # Strict validation: Timeout or connection error -> Fail (Effective Ban for this cycle)
-        proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-        try:
-            resp = requests.get(url, proxies=proxies, timeout=5, verify=False)
-            resp.raise_for_status() # Ban on 400/500
-            return proxy
-        except Exception:
-            return None
+        return self._get_validator().probe(proxy, url)
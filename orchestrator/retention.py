@@ -0,0 +1,207 @@
+import asyncio
+import gzip
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db import get_db_connection, return_db_connection
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("Retention")
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "interval_seconds": 300,
+    "delete_batch_size": 5000,     # Rows per DELETE transaction
+    "compress_enabled": True,
+    "compress_after_hours": 24,    # Finished runs older than this get archived
+    "compress_runs_per_cycle": 20,
+    "vacuum_pages": 2000           # Pages returned to the OS per cycle (incremental_vacuum)
+}
+
+
+class RetentionWorker:
+    """
+    Background housekeeping for orchestrator_logs.
+
+    Each cycle:
+      1. Deletes logs (and archives) of runs JobRunner pruned from orchestrator_history,
+         as queued in orchestrator_pruned_runs, in bounded batches. The first cycle also
+         sweeps orphans left by versions that did not queue pruned runs.
+      2. Optionally packs the logs of old finished runs into one compressed blob per run
+         (orchestrator_log_archive), zstd if installed, else gzip.
+      3. Runs PRAGMA incremental_vacuum so freed pages shrink the DB file.
+
+    All DB work happens in a worker thread, one short transaction at a time,
+    so the log writer and API are never blocked for long.
+    """
+
+    def __init__(self) -> None:
+        self.config: Dict[str, Any] = dict(DEFAULT_CONFIG)
+        self.last_stats: Dict[str, int] = {}
+        self._legacy_swept = False  # Full orphan scan done (once per process)
+
+    def start(self) -> asyncio.Task:
+        return asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        print("Retention: Started.")
+        while True:
+            try:
+                await asyncio.to_thread(self._load_config)
+                self.last_stats = await asyncio.to_thread(self.run_once)
+                if any(self.last_stats.values()):
+                    print(f"Retention: {self.last_stats}")
+                await asyncio.sleep(int(self.config["interval_seconds"]))
+            except asyncio.CancelledError:
+                print("Retention: Stopped.")
+                break
+            except Exception as e:
+                print(f"Retention Error: {e}")
+                await asyncio.sleep(60)  # Backoff on error
+
+    def run_once(self) -> Dict[str, int]:
+        stats = {"orphan_logs_deleted": 0, "orphan_archives_deleted": 0, "runs_compressed": 0, "pages_vacuumed": 0}
+        conn = get_db_connection()
+        try:
+            stats["orphan_logs_deleted"], stats["orphan_archives_deleted"] = self._delete_orphan_logs(conn)
+            if self.config.get("compress_enabled"):
+                stats["runs_compressed"] = self._compress_old_runs(conn)
+            stats["pages_vacuumed"] = self._incremental_vacuum(conn)
+        finally:
+            return_db_connection(conn)
+        return stats
+
+    def _load_config(self) -> None:
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT config_value FROM orchestrator_config WHERE config_key = 'retention_config'")
+            row = cursor.fetchone()
+            return_db_connection(conn)
+            if row:
+                self.config.update(json.loads(row[0]))
+        except Exception as e:
+            logger.error(f"Failed to load retention_config: {e}")
+
+    # --- Steps ---
+
+    def _delete_orphan_logs(self, conn) -> Tuple[int, int]:
+        """Deletes the logs and archive of pruned runs. Returns (log rows, archives) deleted."""
+        batch_size = int(self.config["delete_batch_size"])
+        cursor = conn.cursor()
+        cursor.execute("SELECT run_id FROM orchestrator_pruned_runs")
+        orphan_runs = [row[0] for row in cursor.fetchall()]
+
+        if not self._legacy_swept:
+            # Full scans, once: orphans from before runs were queued in orchestrator_pruned_runs
+            cursor.execute("""
+                SELECT DISTINCT run_id FROM orchestrator_logs
+                WHERE run_id NOT IN (SELECT run_id FROM orchestrator_history)
+                UNION
+                SELECT run_id FROM orchestrator_log_archive
+                WHERE run_id NOT IN (SELECT run_id FROM orchestrator_history)
+            """)
+            orphan_runs = sorted(set(orphan_runs) | {row[0] for row in cursor.fetchall()})
+            self._legacy_swept = True
+
+        logs_deleted = archives_deleted = 0
+        for run_id in orphan_runs:
+            while True:
+                cursor.execute("""
+                    DELETE FROM orchestrator_logs WHERE log_id IN (
+                        SELECT log_id FROM orchestrator_logs WHERE run_id = ? LIMIT ?
+                    )
+                """, (run_id, batch_size))
+                conn.commit()
+                logs_deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+            cursor.execute("DELETE FROM orchestrator_log_archive WHERE run_id = ?", (run_id,))
+            archives_deleted += cursor.rowcount
+            cursor.execute("DELETE FROM orchestrator_pruned_runs WHERE run_id = ?", (run_id,))
+            conn.commit()
+        return logs_deleted, archives_deleted
+
+    def _compress_old_runs(self, conn) -> int:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT h.run_id FROM orchestrator_history h
+            WHERE h.status NOT IN ('QUEUED', 'RUNNING')
+            AND COALESCE(h.end_time, h.start_time) < datetime('now', ?)
+            AND h.run_id NOT IN (SELECT run_id FROM orchestrator_log_archive)
+            AND EXISTS (SELECT 1 FROM orchestrator_logs l WHERE l.run_id = h.run_id)
+            LIMIT ?
+        """, (f"-{int(self.config['compress_after_hours'])} hours", int(self.config["compress_runs_per_cycle"])))
+        run_ids = [row[0] for row in cursor.fetchall()]
+
+        for run_id in run_ids:
+            cursor.execute(
+                "SELECT log_id, log_text, created_at FROM orchestrator_logs WHERE run_id = ? ORDER BY log_id ASC",
+                (run_id,)
+            )
+            rows = cursor.fetchall()
+            codec, blob = compress_lines(rows)
+            try:
+                cursor.execute("""
+                    INSERT INTO orchestrator_log_archive (run_id, codec, line_count, first_log_id, last_log_id, data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (run_id, codec, len(rows), rows[0][0], rows[-1][0], blob))
+                cursor.execute("DELETE FROM orchestrator_logs WHERE run_id = ?", (run_id,))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Failed to archive logs for run {run_id}: {e}")
+        return len(run_ids)
+
+    def _incremental_vacuum(self, conn) -> int:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            return 0  # Not converted yet (setup_orchestrator_db.py --enable-incremental-vacuum)
+        cursor.execute("PRAGMA freelist_count")
+        free_pages = cursor.fetchone()[0]
+        if not free_pages:
+            return 0
+        pages = min(free_pages, int(self.config["vacuum_pages"]))
+        # executescript steps the pragma to completion (execute() would free a single page)
+        conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+        return pages
+
+
+# --- Archive Format ---
+# One JSON array per line: [log_id, log_text, created_at]
+
+def compress_lines(rows) -> Tuple[str, bytes]:
+    payload = "\n".join(json.dumps(list(row)) for row in rows).encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(payload)
+    return "gzip", gzip.compress(payload, compresslevel=6)
+
+
+@lru_cache(maxsize=8)
+def _decompress(run_id: int, codec: str, blob: bytes) -> List[Dict[str, Any]]:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"Run {run_id} logs are zstd-compressed but 'zstandard' is not installed")
+        payload = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        payload = gzip.decompress(blob)
+    logs = []
+    for line in payload.decode("utf-8").splitlines():
+        log_id, log_text, created_at = json.loads(line)
+        logs.append({"log_id": log_id, "log_text": log_text, "created_at": created_at})
+    return logs
+
+
+def read_archived_logs(cursor, run_id: int) -> Optional[List[Dict[str, Any]]]:
+    """All logs of an archived run (oldest first), or None if the run is not archived."""
+    cursor.execute("SELECT codec, data FROM orchestrator_log_archive WHERE run_id = ?", (run_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return _decompress(run_id, row[0], bytes(row[1]))
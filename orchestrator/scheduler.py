@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .db import get_db_connection, return_db_connection
+from .job_runner import JobRunner
+from .proxy_manager import ProxyManager
+
+
+class TaskScheduler:
+    """
+    Event-driven task scheduler.
+
+    Keeps an in-memory min-heap of enabled tasks keyed by next_run and sleeps
+    exactly until the earliest deadline. Task CRUD endpoints call refresh_task /
+    remove_task, which wake the loop immediately. Both are thread-safe because
+    FastAPI runs sync routes in a threadpool.
+
+    Heap entries are invalidated lazily: every change gives the task a new version,
+    and entries carrying an old version are discarded when they surface. Versions come
+    from one scheduler-wide counter that only goes up, so a removed and re-added task
+    can never match an entry left over from before.
+    """
+
+    # Safety net: full reload from the DB in case rows were edited externally
+    RESYNC_SECONDS = 600
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, int]] = []  # (next_run_ts, task_id, version)
+        self._versions: Dict[int, int] = {}  # task_id -> current version; kept for removed tasks too
+        self._version_counter = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> asyncio.Task:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        return asyncio.create_task(self.run())
+
+    # --- Public API (any thread) ---
+
+    def refresh_task(self, task_id: int) -> None:
+        """Re-reads a task from the DB and reschedules (or unschedules) it."""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT enabled, next_run FROM orchestrator_tasks WHERE task_id = ?", (task_id,))
+        row = cursor.fetchone()
+        return_db_connection(conn)
+
+        if not row or not row[0]:
+            self.remove_task(task_id)
+        else:
+            self._call_in_loop(self._schedule, task_id, self._to_timestamp(row[1]))
+
+    def remove_task(self, task_id: int) -> None:
+        self._call_in_loop(self._schedule, task_id, None)
+
+    # --- Loop ---
+
+    async def run(self) -> None:
+        print("Scheduler: Started.")
+        self._load_all()
+        last_sync = time.monotonic()
+
+        while True:
+            try:
+                now = time.time()
+                self._drop_stale()
+
+                if self._heap and self._heap[0][0] <= now:
+                    self._fire_due(now)
+                    continue
+
+                timeout = self.RESYNC_SECONDS
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - now)
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+
+                if time.monotonic() - last_sync >= self.RESYNC_SECONDS:
+                    self._load_all()
+                    last_sync = time.monotonic()
+
+            except asyncio.CancelledError:
+                print("Scheduler: Stopped.")
+                break
+            except Exception as e:
+                print(f"Scheduler Error: {e}")
+                await asyncio.sleep(5)  # Backoff on error
+
+    # --- Internals (loop thread only) ---
+
+    def _call_in_loop(self, fn, *args) -> None:
+        if self._loop is None:
+            return  # Not started yet; _load_all will pick the change up
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    def _schedule(self, task_id: int, next_run_ts: Optional[float]) -> None:
+        # A removal still takes a fresh version: it is what invalidates the task's heap entries
+        version = next(self._version_counter)
+        self._versions[task_id] = version
+        if next_run_ts is not None:
+            heapq.heappush(self._heap, (next_run_ts, task_id, version))
+        self._wakeup.set()
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._versions.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+
+    def _load_all(self) -> None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT task_id, next_run FROM orchestrator_tasks WHERE enabled = 1")
+        rows = cursor.fetchall()
+        return_db_connection(conn)
+
+        # Rebuilding the heap drops every old entry; bump all known versions anyway so
+        # nothing queued against the old heap can match, and disabled tasks stay invalid
+        self._heap = []
+        for task_id in list(self._versions):
+            self._versions[task_id] = next(self._version_counter)
+        for task_id, next_run in rows:
+            version = next(self._version_counter)
+            self._versions[task_id] = version
+            self._heap.append((self._to_timestamp(next_run), task_id, version))
+        heapq.heapify(self._heap)
+
+    def _fire_due(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, version = heapq.heappop(self._heap)
+            if self._versions.get(task_id) != version:
+                continue
+            self._trigger(task_id, version)
+
+    def _trigger(self, task_id: int, version: int) -> None:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.job_id, t.config_json, t.interval_minutes, t.enabled, t.skip_if_running, j.script_path
+            FROM orchestrator_tasks t
+            JOIN orchestrator_jobs j ON t.job_id = j.job_id
+            WHERE t.task_id = ?
+        """, (task_id,))
+        row = cursor.fetchone()
+
+        if not row or not row[3]:
+            return_db_connection(conn)
+            self._versions[task_id] = next(self._version_counter)  # Invalidate without reusing a version
+            return
+
+        job_id, config_json, interval, _, skip_if_running, script_path = row
+
+        # Calculate next run time and persist it before launching
+        now = datetime.now()
+        next_run = now + timedelta(minutes=interval)
+        cursor.execute("""
+            UPDATE orchestrator_tasks
+            SET last_run = ?, next_run = ?
+            WHERE task_id = ?
+        """, (now, next_run, task_id))
+        conn.commit()
+        return_db_connection(conn)
+
+        heapq.heappush(self._heap, (next_run.timestamp(), task_id, version))
+
+        print(f"Scheduler: Triggering Task {task_id} (Job {job_id})")
+
+        full_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", script_path))
+        # Queue the run (JobRunner applies concurrency limits and handles logging)
+        JobRunner.submit(job_id, full_path, config_json, ProxyManager(),
+                         priority=JobRunner.PRIORITY_SCHEDULED, task_id=task_id,
+                         skip_if_running=bool(skip_if_running))
+
+    @staticmethod
+    def _to_timestamp(value) -> float:
+        """DB next_run -> epoch seconds. NULL (or unparseable) means due now."""
+        if not value:
+            return 0.0
+        if isinstance(value, datetime):
+            return value.timestamp()
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except ValueError:
+            return 0.0
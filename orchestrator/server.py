@@ -1,24 +1,30 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
+import json
+import re
 import asyncio
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
-from typing import Optional, Dict, Any
-from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, validator
 
-from .db import get_db_connection, return_db_connection
-from .proxy_manager import ProxyManager
-from .job_runner import JobRunner
 import sys
-# Add parent dir to path to import setup script
+# Add parent dir to path to import setup script and shared_utils
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from setup_orchestrator_db import create_tables
 
+from .db import get_db_connection, return_db_connection
+from .proxy_manager import ProxyManager
+from .job_runner import JobRunner
+from .scheduler import TaskScheduler
+from .retention import RetentionWorker, read_archived_logs
+
 # --- Models ---
 class RunJobRequest(BaseModel):
     config: Optional[Dict[str, Any]] = {}
+    priority: Optional[int] = None
 
 class TaskCreate(BaseModel):
     job_id: int
@@ -26,12 +32,31 @@ class TaskCreate(BaseModel):
     interval_minutes: int
     config: Optional[Dict[str, Any]] = {}
     enabled: bool = True
+    skip_if_running: bool = True
 
 class TaskUpdate(BaseModel):
     name: Optional[str] = None
     interval_minutes: Optional[int] = None
     config: Optional[Dict[str, Any]] = None
     enabled: Optional[bool] = None
+    skip_if_running: Optional[bool] = None
+
+PROXY_ADDRESS_RE = re.compile(r"^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3}):(\d{1,5})$")
+
+class ProxyFeedbackItem(BaseModel):
+    proxy: str
+    success: bool
+    latency: Optional[float] = None # seconds
+
+    @validator("proxy")
+    def proxy_must_be_ip_port(cls, v):
+        match = PROXY_ADDRESS_RE.match(v.strip())
+        if not match or any(int(octet) > 255 for octet in match.groups()[:4]) or not 0 < int(match.group(5)) <= 65535:
+            raise ValueError("proxy must be an IPv4 host:port")
+        return v.strip()
+
+class ProxyFeedbackBatch(BaseModel):
+    results: List[ProxyFeedbackItem]
 
 # --- Lifespan ---
 @asynccontextmanager
@@ -48,23 +73,27 @@ async def lifespan(app: FastAPI):
         conn = get_db_connection()
         if conn:
             cursor = conn.cursor()
-            cursor.execute("UPDATE orchestrator_history SET status='CANCELLED', exit_code=-1 WHERE status='RUNNING'")
+            cursor.execute("UPDATE orchestrator_history SET status='CANCELLED', exit_code=-1 WHERE status IN ('RUNNING', 'QUEUED')")
             conn.commit()
             return_db_connection(conn)
-            print("Cleaned up orphaned RUNNING jobs.")
+            print("Cleaned up orphaned RUNNING/QUEUED jobs.")
+
+        JobRunner.load_limits()
     except Exception as e:
         print(f"DB Init/Cleanup Failed: {e}")
         
     ProxyManager().start_refresher()
     
     # Start Scheduler
-    scheduler_task = asyncio.create_task(scheduler_loop())
+    scheduler_task = scheduler.start()
+    retention_task = retention.start()
     
     yield
     
     # Shutdown
     print("Shutting down services...")
     scheduler_task.cancel()
+    retention_task.cancel()
 
 app = FastAPI(title="P2C Orchestrator", version="1.0.0", lifespan=lifespan)
 
@@ -81,60 +110,11 @@ app.add_middleware(
 active_tasks = {}  # {run_id: asyncio.Task}
 
 # --- Scheduler ---
-async def scheduler_loop():
-    """Background task to check for scheduled jobs to run."""
-    print("Scheduler: Started.")
-    while True:
-        try:
-            await asyncio.sleep(10) # Check every 10 seconds
-            
-            conn = get_db_connection()
-            if not conn: continue
-            
-            cursor = conn.cursor()
-            now = datetime.now()
-            
-            # Find tasks where enabled=1 AND (next_run <= now OR next_run IS NULL)
-            # Use 'limit 10' to verify logic without flooding
-            cursor.execute("""
-                SELECT t.task_id, t.job_id, t.config_json, t.interval_minutes, j.script_path
-                FROM orchestrator_tasks t
-                JOIN orchestrator_jobs j ON t.job_id = j.job_id
-                WHERE t.enabled = 1 
-                AND (t.next_run IS NULL OR t.next_run <= ?)
-            """, (now,))
-            
-            tasks_to_run = cursor.fetchall()
-            
-            for row in tasks_to_run:
-                task_id, job_id, config_json, interval, script_path = row
-                
-                # Calculate next run time
-                next_run = now + timedelta(minutes=interval)
-                
-                # Update DB immediately to prevent double-execution
-                cursor.execute("""
-                    UPDATE orchestrator_tasks 
-                    SET last_run = ?, next_run = ? 
-                    WHERE task_id = ?
-                """, (now, next_run, task_id))
-                conn.commit()
-                
-                print(f"Scheduler: Triggering Task {task_id} (Job {job_id})")
-                
-                # Execute Job
-                full_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", script_path))
-                # Fire and forget (JobRunner handles logging)
-                asyncio.create_task(JobRunner.run_job(job_id, full_path, config_json, ProxyManager()))
-                
-            return_db_connection(conn)
-            
-        except asyncio.CancelledError:
-            print("Scheduler: Stopped.")
-            break
-        except Exception as e:
-            print(f"Scheduler Error: {e}")
-            await asyncio.sleep(5) # Backoff on error
+# Event-driven: task endpoints below notify it of every change
+scheduler = TaskScheduler()
+
+# --- Log Retention ---
+retention = RetentionWorker()
 
 # --- Routes ---
 
@@ -189,6 +169,8 @@ async def update_config(config_key: str, request: dict):
     # If proxy_manager_config changed, force it to reload
     if config_key == "proxy_manager_config":
         ProxyManager()._load_config_from_db()
+    elif config_key == "job_runner_config":
+        JobRunner.load_limits()
         
     return {"status": "success", "config_key": config_key}
 
@@ -227,16 +209,15 @@ async def run_job(job_id: int, request: RunJobRequest, background_tasks: Backgro
     import json
     config_str = json.dumps(request.config) if request.config else "{}"
     
-    # Create task and store for tracking/cancellation
-    task = asyncio.create_task(JobRunner.run_job(job_id, full_path, config_str, ProxyManager()))
+    # Queue the run; JobRunner starts it once a concurrency slot is free
+    priority = request.priority if request.priority is not None else JobRunner.PRIORITY_MANUAL
+    run_id = JobRunner.submit(job_id, full_path, config_str, ProxyManager(), priority=priority)
     
-    # Task will update active_tasks dict with run_id when available
-    # For now, return immediately
-    return {"status": "Job started", "job_id": job_id}
+    return {"status": "Job queued", "job_id": job_id, "run_id": run_id}
 
 @app.post("/api/jobs/{run_id}/kill")
-def kill_job(run_id: int):
-    """Kills a currently running job instance by its run_id."""
+async def kill_job(run_id: int):
+    """Kills a running job instance (or drops a queued one) by its run_id."""
     success = JobRunner.cancel_job(run_id)
     if success:
         # Update DB to reflect cancellation immediately
@@ -250,17 +231,37 @@ def kill_job(run_id: int):
         raise HTTPException(status_code=404, detail="Job not found or already completed/cancelled")
 
 @app.get("/api/history")
-def get_history(limit: int = 50):
+def get_history(limit: int = 50, before_start_time: Optional[str] = None, before_run_id: Optional[int] = None,
+                job_id: Optional[int] = None):
+    """
+    Runs, newest first. Page with the (start_time, run_id) of the last row received
+    as before_start_time / before_run_id.
+    """
+    where = []
+    params = []
+    if job_id is not None:
+        where.append("h.job_id = ?")
+        params.append(job_id)
+    if before_start_time is not None:
+        if before_run_id is not None:
+            where.append("(h.start_time < ? OR (h.start_time = ? AND h.run_id < ?))")
+            params.extend([before_start_time, before_start_time, before_run_id])
+        else:
+            where.append("h.start_time < ?")
+            params.append(before_start_time)
+    params.append(min(max(limit, 1), 1000))
+
     conn = get_db_connection()
     cursor = conn.cursor()
     # FIX: Use parameterized query to prevent SQL injection
-    cursor.execute("""
-        SELECT h.run_id, j.name, h.start_time, h.end_time, h.status, h.exit_code 
+    cursor.execute(f"""
+        SELECT h.run_id, h.job_id, j.name, h.start_time, h.end_time, h.status, h.exit_code 
         FROM orchestrator_history h
         JOIN orchestrator_jobs j ON h.job_id = j.job_id
-        ORDER BY h.start_time DESC
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY h.start_time DESC, h.run_id DESC
         LIMIT ?
-    """, (limit,))
+    """, params)
     history = []
     columns = [column[0] for column in cursor.description]
     for row in cursor.fetchall():
@@ -269,15 +270,59 @@ def get_history(limit: int = 50):
     return history
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 # ... (Existing Routes) ...
 
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
 @app.get("/api/logs/{run_id}")
-def get_logs(run_id: int):
+def get_logs(run_id: int, after_log_id: int = 0, limit: int = 1000,
+             level: Optional[str] = None, pattern: Optional[str] = None):
+    """
+    Console logs for a run, oldest first, at most `limit` rows after `after_log_id`.
+    Page by passing the last log_id received. `level` keeps lines tagged with that
+    level or above (e.g. "[WARNING]"); `pattern` is a case-insensitive substring.
+    """
+    limit = min(max(limit, 1), 10000)
+    where = ["run_id = ?", "log_id > ?"]
+    params = [run_id, after_log_id]
+    tags = []
+    if level:
+        level = level.upper()
+        if level not in LOG_LEVELS:
+            raise HTTPException(status_code=400, detail=f"level must be one of {LOG_LEVELS}")
+        tags = [f"[{name}]" for name in LOG_LEVELS[LOG_LEVELS.index(level):]]
+        where.append("(" + " OR ".join(["instr(log_text, ?) > 0"] * len(tags)) + ")")
+        params.extend(tags)
+    if pattern:
+        escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where.append("log_text LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    params.append(limit)
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT log_text, created_at FROM orchestrator_logs WHERE run_id=? ORDER BY log_id ASC", (run_id,))
+
+    # Old runs may have been compacted into orchestrator_log_archive
+    archived = read_archived_logs(cursor, run_id)
+    if archived is not None:
+        return_db_connection(conn)
+        needle = pattern.lower() if pattern else None
+        logs = [
+            l for l in archived
+            if l["log_id"] > after_log_id
+            and (not tags or any(t in l["log_text"] for t in tags))
+            and (not needle or needle in l["log_text"].lower())
+        ]
+        return logs[:limit]
+
+    cursor.execute(f"""
+        SELECT log_id, log_text, created_at FROM orchestrator_logs
+        WHERE {" AND ".join(where)}
+        ORDER BY log_id ASC
+        LIMIT ?
+    """, params)
     logs = []
     columns = [column[0] for column in cursor.description]
     for row in cursor.fetchall():
@@ -285,6 +330,95 @@ def get_logs(run_id: int):
     return_db_connection(conn)
     return logs
 
+# --- Live Log Stream (Server-Sent Events) ---
+
+LOG_STREAM_PAGE = 1000
+LOG_STREAM_KEEPALIVE = 15  # seconds
+
+def _fetch_logs_after(run_id: int, after_log_id: int, limit: int):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    archived = read_archived_logs(cursor, run_id)
+    if archived is not None:
+        return_db_connection(conn)
+        return [l for l in archived if l["log_id"] > after_log_id][:limit]
+    cursor.execute("""
+        SELECT log_id, log_text, created_at FROM orchestrator_logs
+        WHERE run_id=? AND log_id>? ORDER BY log_id ASC LIMIT ?
+    """, (run_id, after_log_id, limit))
+    columns = [column[0] for column in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return_db_connection(conn)
+    return rows
+
+def _run_is_active(run_id: int) -> bool:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status FROM orchestrator_history WHERE run_id=?", (run_id,))
+    row = cursor.fetchone()
+    return_db_connection(conn)
+    return bool(row) and row[0] in ('QUEUED', 'RUNNING')
+
+def _sse_log(row) -> str:
+    data = {"log_id": row["log_id"], "log_text": row["log_text"], "created_at": row["created_at"]}
+    return f"id: {row['log_id']}\ndata: {json.dumps(data)}\n\n"
+
+async def _log_event_stream(run_id: int, last_id: int):
+    """
+    Backfills from the DB after last_id, then follows the live feed from JobRunner.
+    Subscribing before the backfill means no line can fall between the two;
+    duplicates are dropped by log_id.
+    """
+    sub = JobRunner.subscribe_logs(run_id)
+    ended = False
+    try:
+        while True:
+            # Catch up from the DB (initial backfill, or after the subscriber fell behind)
+            while True:
+                rows = await asyncio.to_thread(_fetch_logs_after, run_id, last_id, LOG_STREAM_PAGE)
+                for row in rows:
+                    last_id = row["log_id"]
+                    yield _sse_log(row)
+                if len(rows) < LOG_STREAM_PAGE:
+                    break
+
+            if ended or not await asyncio.to_thread(_run_is_active, run_id):
+                yield "event: end\ndata: {}\n\n"
+                return
+
+            # Follow live rows
+            while not sub.overflowed:
+                try:
+                    row = await asyncio.wait_for(sub.queue.get(), timeout=LOG_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    if not await asyncio.to_thread(_run_is_active, run_id):
+                        break
+                    continue
+                if row is None:
+                    ended = True
+                    break
+                if row["log_id"] > last_id:
+                    last_id = row["log_id"]
+                    yield _sse_log(row)
+
+            if sub.overflowed:
+                JobRunner.unsubscribe_logs(run_id, sub)
+                sub = JobRunner.subscribe_logs(run_id)
+    finally:
+        JobRunner.unsubscribe_logs(run_id, sub)
+
+@app.get("/api/logs/{run_id}/stream")
+async def stream_logs(run_id: int, after_log_id: int = 0, last_event_id: Optional[str] = Header(None)):
+    """Streams a run's logs as Server-Sent Events; resumes after `after_log_id` or the Last-Event-ID header."""
+    if last_event_id and last_event_id.isdigit():
+        after_log_id = max(after_log_id, int(last_event_id))
+    return StreamingResponse(
+        _log_event_stream(run_id, after_log_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # --- Task Management API ---
 
 @app.get("/api/tasks")
@@ -317,13 +451,14 @@ def create_task(task: TaskCreate):
     # Or maybe user EXPECTS it to run? Let's use NULL so it runs on next sweep.
     
     cursor.execute("""
-        INSERT INTO orchestrator_tasks (job_id, name, config_json, interval_minutes, enabled)
-        VALUES (?, ?, ?, ?, ?)
-    """, (task.job_id, task.name, config_str, task.interval_minutes, 1 if task.enabled else 0))
+        INSERT INTO orchestrator_tasks (job_id, name, config_json, interval_minutes, enabled, skip_if_running)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (task.job_id, task.name, config_str, task.interval_minutes, 1 if task.enabled else 0, 1 if task.skip_if_running else 0))
     
     new_id = cursor.lastrowid
     conn.commit()
     return_db_connection(conn)
+    scheduler.refresh_task(new_id)
     return {"status": "Task created", "task_id": new_id}
 
 @app.put("/api/tasks/{task_id}")
@@ -352,6 +487,10 @@ def update_task(task_id: int, task: TaskUpdate):
     if task.enabled is not None:
         fields.append("enabled = ?")
         values.append(1 if task.enabled else 0)
+
+    if task.skip_if_running is not None:
+        fields.append("skip_if_running = ?")
+        values.append(1 if task.skip_if_running else 0)
         
     if not fields:
         return {"status": "No changes"}
@@ -362,6 +501,7 @@ def update_task(task_id: int, task: TaskUpdate):
     cursor.execute(sql, tuple(values))
     conn.commit()
     return_db_connection(conn)
+    scheduler.refresh_task(task_id)
     
     return {"status": "Task updated"}
 
@@ -372,6 +512,7 @@ def delete_task(task_id: int):
     cursor.execute("DELETE FROM orchestrator_tasks WHERE task_id = ?", (task_id,))
     conn.commit()
     return_db_connection(conn)
+    scheduler.remove_task(task_id)
     return {"status": "Task deleted"}
 
 @app.post("/api/tasks/{task_id}/run")
@@ -380,10 +521,11 @@ def run_task_now(task_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Reset next_run to NOW, scheduler will pick it up in <10s
-    cursor.execute("UPDATE orchestrator_tasks SET next_run = CURRENT_TIMESTAMP WHERE task_id = ?", (task_id,))
+    # Reset next_run to NOW and wake the scheduler
+    cursor.execute("UPDATE orchestrator_tasks SET next_run = ? WHERE task_id = ?", (datetime.now(), task_id))
     conn.commit()
     return_db_connection(conn)
+    scheduler.refresh_task(task_id)
     
     return {"status": "Task scheduled for immediate execution"}
 
@@ -413,8 +555,17 @@ def update_proxy_config(config: Dict[str, Any]):
 
 @app.get("/api/proxies/list")
 def get_proxy_list():
-    """Returns the current list of valid proxies for scripts to refresh their pool."""
-    return {"proxies": ProxyManager().get_proxies()}
+    """
+    Returns the current valid proxies for scripts to refresh their pool, best first.
+    `stats` carries EWMA latency / success rate so scripts can weight their picks.
+    """
+    ranked = ProxyManager().get_ranked_proxies()
+    return {"proxies": [entry["proxy"] for entry in ranked], "stats": ranked}
+
+@app.post("/api/proxies/feedback")
+def proxy_feedback(batch: ProxyFeedbackBatch):
+    """Receives batched per-proxy outcomes from running scripts."""
+    return ProxyManager().apply_feedback([item.dict() for item in batch.results])
 
 # Mount UI (Place this last)
 if os.path.exists(UI_DIST_DIR):
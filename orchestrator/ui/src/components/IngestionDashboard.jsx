@@ -15,10 +15,20 @@ export default function IngestionDashboard() {
     const logsEndRef = useRef(null);
 
     useEffect(() => { fetchData(); }, []);
-    useInterval(() => {
-        fetchData();
-        if (selectedRunId) fetchLogs(selectedRunId, true);
-    }, 2000);
+    useInterval(fetchData, 2000);
+
+    // Live tail: backfills, then streams new lines until the run ends (EventSource resumes via Last-Event-ID)
+    useEffect(() => {
+        if (!selectedRunId) return;
+        setLogs([]);
+        const source = new EventSource(`/api/logs/${selectedRunId}/stream`);
+        source.onmessage = (e) => {
+            const line = JSON.parse(e.data);
+            setLogs(prev => [...prev, line]);
+        };
+        source.addEventListener('end', () => source.close());
+        return () => source.close();
+    }, [selectedRunId]);
 
     // Removed aggressive auto-scroll logic so the user can manually review historical chunks.
     const fetchData = async () => {
@@ -28,13 +38,7 @@ export default function IngestionDashboard() {
         } catch (e) { }
     };
 
-    const fetchLogs = async (runId, isPolling = false) => {
-        try {
-            const res = await axios.get(`/api/logs/${runId}`);
-            setLogs(res.data);
-            if (!isPolling) setSelectedRunId(runId);
-        } catch (e) { }
-    };
+    const fetchLogs = (runId) => setSelectedRunId(runId);
 
     const scanScripts = async () => {
         await axios.post('/api/jobs/scan');
@@ -63,6 +67,7 @@ export default function IngestionDashboard() {
             case 'SUCCESS': return <span className="badge badge-success"><CheckCircle2 size={14} /> Success</span>;
             case 'FAILURE': return <span className="badge badge-error"><AlertCircle size={14} /> Error</span>;
             case 'RUNNING': return <span className="badge badge-warning"><Clock size={14} className="animate-pulse" /> Running</span>;
+            case 'QUEUED': return <span className="badge badge-neutral"><Clock size={14} /> Queued</span>;
             case 'CANCELLED': return <span className="badge badge-neutral"><StopCircle size={14} /> Halted</span>;
             default: return <span className="badge badge-neutral">{status}</span>;
         }
@@ -130,7 +135,7 @@ export default function IngestionDashboard() {
                                 </div>
                             </div>
                             <div className="lr-actions">
-                                {run.status === 'RUNNING' && (
+                                {(run.status === 'RUNNING' || run.status === 'QUEUED') && (
                                     <button className="btn btn-danger" onClick={() => killJob(run.run_id)} disabled={isKilling[run.run_id]}>
                                         Terminate
                                     </button>
@@ -165,7 +170,7 @@ export default function IngestionDashboard() {
                                     if (l.log_text.includes("WARN")) c = '#f1fa8c';
                                     if (l.log_text.includes("SUCCESS")) c = '#50fa7b';
                                     return (
-                                        <div key={i} className="log-line">
+                                        <div key={l.log_id ?? i} className="log-line">
                                             <span className="log-ts">
                                                 {new Date(l.created_at).toISOString().split('T')[1].slice(0, 12)}
                                             </span>
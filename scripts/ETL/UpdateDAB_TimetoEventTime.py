@@ -2,6 +2,7 @@
 import sys
 import re
 from datetime import datetime
+from functools import lru_cache
 import os
 import sys
 import os
@@ -10,61 +11,106 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 import shared_utils # Use shared utils for API
 from shared_utils import APIClient
 
-def try_parse_formats(date_string, raw_time_str, rule_name):
-    formats = [
-        '%H:%M, %m/%d/%Y',       # 14:30, 11/20/2025
-        '%m/%d/%Y %I:%M:%S %p',  # 11/20/2025 2:57:00 PM
-        '%m/%d/%Y %I:%M %p',     # 11/20/2025 2:57 PM
-        '%m/%d/%Y %H:%M',        # 11/22/2025 23:42
-        '%m/%d/%Y'               # 11/23/2025
-    ]
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_string, fmt)
-            # print(f"MATCH {rule_name}: '{date_string}' (fmt: {fmt}) -> {dt}")
-            return dt
-        except ValueError:
-            continue
-    
-    # print(f"FAIL {rule_name}: '{date_string}' - No format matched")
-    return None
+# --- Time Text Parsing ---
+# Compiled once, no strptime: the accepted formats are translated into a single
+# alternation using the same component patterns as time.strptime, so matching
+# and validation rules are unchanged (1-2 digit fields, any whitespace run,
+# case-insensitive AM/PM, calendar-checked dates).
+TIME_FORMATS = [
+    '%H:%M, %m/%d/%Y',       # 14:30, 11/20/2025
+    '%m/%d/%Y %I:%M:%S %p',  # 11/20/2025 2:57:00 PM
+    '%m/%d/%Y %I:%M %p',     # 11/20/2025 2:57 PM
+    '%m/%d/%Y %H:%M',        # 11/22/2025 23:42
+    '%m/%d/%Y'               # 11/23/2025
+]
+
+_COMPONENTS = {
+    'd': r"3[01]|[12]\d|0[1-9]|[1-9]| [1-9]",
+    'H': r"2[0-3]|[0-1]\d|\d",
+    'I': r"1[0-2]|0[1-9]|[1-9]",
+    'm': r"1[0-2]|0[1-9]|[1-9]",
+    'M': r"[0-5]\d|\d",
+    'S': r"6[0-1]|[0-5]\d|\d",
+    'Y': r"\d\d\d\d",
+    'p': r"am|pm",
+}
+
+def _format_regex(fmt, index):
+    """Translates one strptime format into a regex with per-format group names (e.g. 'm2')."""
+    rx = re.sub(r"([\\.^$*+?\(\){}\[\]|])", r"\\\1", fmt)
+    rx = re.sub(r"\s+", r"\\s+", rx)
+    return re.sub(r"%([dHImMSYp])", lambda m: f"(?P<{m.group(1)}{index}>{_COMPONENTS[m.group(1)]})", rx)
+
+DATE_PATTERN = re.compile(
+    "|".join(f"(?P<f{i}>{_format_regex(fmt, i)})" for i, fmt in enumerate(TIME_FORMATS)),
+    re.IGNORECASE
+)
+
+RULE_REPORTED = re.compile(r"Reported:\s*(.+?)\.")
+RULE_BETWEEN = re.compile(r"and\s+(.+?)\.")
+RULE_ON = re.compile(r"on\s+(.+?)\.")
+RULE_ON_AT = re.compile(r"On\s+(.+?)\s+at\s+(.+?)(?:\.|$)", re.IGNORECASE)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def try_parse_formats(date_string, raw_time_str=None, rule_name=None):
+    """Parses date_string against TIME_FORMATS (first match wins); None if none fit."""
+    match = DATE_PATTERN.fullmatch(date_string)
+    if not match:
+        return None
+    i = match.lastgroup[1:] # The outer group (f<i>) closes last
+    parts = match.groupdict()
+
+    year = int(parts["Y" + i])
+    month = int(parts["m" + i])
+    day = int(parts["d" + i])
+    minute = int(parts.get("M" + i) or 0)
+    second = int(parts.get("S" + i) or 0)
+    if parts.get("I" + i):
+        hour = int(parts["I" + i]) % 12
+        if parts["p" + i].lower() == "pm":
+            hour += 12
+    else:
+        hour = int(parts.get("H" + i) or 0)
+
+    leap = month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    if year < 1 or day > _DAYS_IN_MONTH[month - 1] + leap or second > 59:
+        return None # strptime rejects these (e.g. 02/30, leap seconds)
+    return datetime(year, month, day, hour, minute, second)
 
+@lru_cache(maxsize=65536)
 def parse_time_with_regex(time_str):
     """
     Uses regex to find the timestamp after 'Reported: '.
     Returns a datetime object if successful, otherwise tries other patterns.
+    Memoized: many bulletin rows share the same time text.
     """
     if not time_str:
         return None
     
     # Rule 1: Prioritize 'Reported:' time.
-    reported_match = re.search(r"Reported:\s*(.+?)\.", time_str)
+    reported_match = RULE_REPORTED.search(time_str)
     if reported_match:
-        date_string = reported_match.group(1).strip()
-        dt = try_parse_formats(date_string, time_str, "Rule 1 (Reported)")
+        dt = try_parse_formats(reported_match.group(1).strip())
         if dt: return dt
 
     # Rule 2: Handle 'between...and...' format, taking the second time.
-    between_match = re.search(r"and\s+(.+?)\.", time_str)
+    between_match = RULE_BETWEEN.search(time_str)
     if between_match:
-        date_string = between_match.group(1).strip()
-        dt = try_parse_formats(date_string, time_str, "Rule 2 (Between)")
+        dt = try_parse_formats(between_match.group(1).strip())
         if dt: return dt
 
     # Rule 3: Handle simple 'on...' format.
-    on_match = re.search(r"on\s+(.+?)\.", time_str)
+    on_match = RULE_ON.search(time_str)
     if on_match:
-        date_string = on_match.group(1).strip()
-        dt = try_parse_formats(date_string, time_str, "Rule 3 (On)")
+        dt = try_parse_formats(on_match.group(1).strip())
         if dt: return dt
 
     # Rule 4: Handle 'On ... at ...' format (e.g. "On 11/15/2025 at 11:00")
-    on_at_match = re.search(r"On\s+(.+?)\s+at\s+(.+?)(?:\.|$)", time_str, re.IGNORECASE)
+    on_at_match = RULE_ON_AT.search(time_str)
     if on_at_match:
-        date_part = on_at_match.group(1).strip()
-        time_part = on_at_match.group(2).strip()
-        combined = f"{date_part} {time_part}"
-        dt = try_parse_formats(combined, time_str, "Rule 4 (On .. at)")
+        combined = f"{on_at_match.group(1).strip()} {on_at_match.group(2).strip()}"
+        dt = try_parse_formats(combined)
         if dt: return dt
 
     return None # Return None if no patterns match
@@ -138,4 +184,6 @@ def update_event_time(target_ids=None):
     print(f"  - Total Processed: {total_processed}")
 
 if __name__ == "__main__":
+    # Backfill only: the Daily Bulletin scraper sets event_time at ingest,
+    # so this picks up older rows the API still reports as candidates.
     update_event_time()
\ No newline at end of file
@@ -4,6 +4,7 @@ import time
 
 import os
 import re
+import threading
 
 import sys
 import os
@@ -14,6 +15,14 @@ import shared_utils
 # Configuration
 PROXY_GEOCODE_URL = os.getenv("PROXY_GEOCODE_URL", "http://p2cproxy:9000/geocode")
 
+# Geocode cache: addresses repeat heavily across CAD / Daily Bulletin rows
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "30")) * 86400
+GEOCODE_NEGATIVE_TTL = float(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", "24")) * 3600
+
+_geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+_CACHE_MISS = object()
+
 def ensure_columns(table):
     """Ensures lat/lon columns exist via API."""
     print(f"Ensuring columns for {table}...")
@@ -147,6 +156,115 @@ def extract_coordinates(address):
             
     return None, None
 
+def get_geocode_cache():
+    """Lazily opens the shared on-disk geocode cache."""
+    global _geocode_cache
+    with _geocode_cache_lock:
+        if _geocode_cache is None:
+            _geocode_cache = shared_utils.LocalCache("geocode_cache", default_ttl=GEOCODE_CACHE_TTL)
+    return _geocode_cache
+
+def _cached_lookup(key, resolver):
+    """
+    Returns (lat, lon) for `key`, calling `resolver` on a cache miss.
+    resolver returns (lat, lon, definitive). Misses are only cached when the
+    geocoder gave a definitive answer, so timeouts get retried on the next run.
+    """
+    cache = get_geocode_cache()
+    cached = cache.get(key, _CACHE_MISS)
+    if cached is not _CACHE_MISS:
+        return (cached[0], cached[1]) if cached else (None, None)
+
+    lat, lon, definitive = resolver()
+    if lat is not None and lon is not None:
+        cache.set(key, [lat, lon])
+    elif definitive:
+        cache.set(key, None, ttl=GEOCODE_NEGATIVE_TTL)
+    return lat, lon
+
+def fetch_coords(query):
+    """Geocodes a single query string via PROXY_GEOCODE_URL (cached)."""
+    def resolve():
+        definitive = False
+        for attempt in range(2):
+            try:
+                r = requests.get(PROXY_GEOCODE_URL, params={'q': query}, timeout=3)
+                if r.status_code == 200:
+                    d = r.json()
+                    if d and 'lat' in d and 'lon' in d:
+                        return float(d['lat']), float(d['lon']), True
+                    definitive = True
+                    break
+                if r.status_code == 404:
+                    definitive = True
+                    break
+            except Exception:
+                pass
+            time.sleep(0.1)
+        return None, None, definitive
+
+    return _cached_lookup(_query_key(query), resolve)
+
+def _query_key(query):
+    return f"q:{query.strip().upper()}"
+
+def resolve_address(address):
+    """
+    Resolves a cleaned address, walking the fallback chain
+    (intersection parts, bare street, county) on a miss.
+    The final result is cached on the cleaned address itself.
+    """
+    attempted = []
+
+    def lookup(query):
+        attempted.append(query)
+        return fetch_coords(query)
+
+    def resolve():
+        lat, lon = lookup(address)
+
+        if (lat is None) and " & " in address:
+            parts = address.split(" & ")
+            city_suffix = ", DUBUQUE, IA"
+            if "," in parts[-1]:
+                city_suffix = parts[-1][parts[-1].find(","):]
+            valid_coords = []
+            for part in parts:
+                part = part.strip()
+                if not part: continue
+                query = part if "," in part else part + city_suffix
+                plat, plon = lookup(query)
+                if plat: valid_coords.append((plat, plon))
+            if valid_coords:
+                lat = sum(c[0] for c in valid_coords) / len(valid_coords)
+                lon = sum(c[1] for c in valid_coords) / len(valid_coords)
+                print(f"  -> Resolved intersection: {lat}, {lon}")
+
+        if (lat is None) and address[0].isdigit():
+            parts = address.split(" ", 1)
+            if len(parts) > 1:
+                street_with_city = parts[1]
+                lat, lon = lookup(street_with_city)
+
+        if (lat is None):
+            bare_addr = address.split(',')[0].strip()
+            if bare_addr[0].isdigit() and " " in bare_addr:
+                 bare_addr = bare_addr.split(" ", 1)[1]
+            lat, lon = lookup(bare_addr)
+            if not lat and "NORTHWEST ARTERIAL" in address:
+                 lat, lon = lookup("NW ARTERIAL")
+
+        if (lat is None) and "DUBUQUE" in address:
+            county_addr = address.replace("DUBUQUE", "DUBUQUE COUNTY")
+            lat, lon = lookup(county_addr)
+
+        # A miss is only definitive if every fallback query was answered
+        cache = get_geocode_cache()
+        definitive = all(cache.get(_query_key(q), _CACHE_MISS) is not _CACHE_MISS for q in attempted)
+        return lat, lon, definitive
+
+    return _cached_lookup(f"addr:{address}", resolve)
+
 def geocode_and_update(table, id_col, address_col, time_col, target_ids=None):
     """Reads rows with null lat/lon, geocodes, and updates them via API."""
     api = shared_utils.APIClient()
@@ -186,55 +304,7 @@ def geocode_and_update(table, id_col, address_col, time_col, target_ids=None):
                         print(f"Skipping known bad: {address}")
                         return {"Id": str(record_id), "Lat": 0.0, "Lon": 0.0, "Table": table}
 
-                    def fetch_coords(query):
-                        for attempt in range(2):
-                            try:
-                                r = requests.get(PROXY_GEOCODE_URL, params={'q': query}, timeout=3)
-                                if r.status_code == 200:
-                                    d = r.json()
-                                    if d and 'lat' in d and 'lon' in d:
-                                        return float(d['lat']), float(d['lon'])
-                            except Exception:
-                                pass
-                            time.sleep(0.1)
-                        return None, None
-
-                    lat, lon = fetch_coords(address)
-
-                    if (lat is None) and " & " in address:
-                        parts = address.split(" & ")
-                        city_suffix = ", DUBUQUE, IA"
-                        if "," in parts[-1]:
-                            city_suffix = parts[-1][parts[-1].find(","):]
-                        valid_coords = []
-                        for part in parts:
-                            part = part.strip()
-                            if not part: continue
-                            query = part if "," in part else part + city_suffix
-                            plat, plon = fetch_coords(query)
-                            if plat: valid_coords.append((plat, plon))
-                        if valid_coords:
-                            lat = sum(c[0] for c in valid_coords) / len(valid_coords)
-                            lon = sum(c[1] for c in valid_coords) / len(valid_coords)
-                            print(f"  -> Resolved intersection: {lat}, {lon}")
-
-                    if (lat is None) and address[0].isdigit():
-                        parts = address.split(" ", 1)
-                        if len(parts) > 1:
-                            street_with_city = parts[1]
-                            lat, lon = fetch_coords(street_with_city)
-                    
-                    if (lat is None):
-                        bare_addr = address.split(',')[0].strip()
-                        if bare_addr[0].isdigit() and " " in bare_addr:
-                             bare_addr = bare_addr.split(" ", 1)[1]
-                        lat, lon = fetch_coords(bare_addr)
-                        if not lat and "NORTHWEST ARTERIAL" in address:
-                             lat, lon = fetch_coords("NW ARTERIAL")
-
-                    if (lat is None) and "DUBUQUE" in address:
-                        county_addr = address.replace("DUBUQUE", "DUBUQUE COUNTY")
-                        lat, lon = fetch_coords(county_addr)
+                    lat, lon = resolve_address(address)
 
                 if lat is not None and lon is not None:
                     print(f"Geocoded {record_id}: {lat}, {lon}")
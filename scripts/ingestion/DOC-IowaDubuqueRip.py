@@ -4,6 +4,7 @@ import time
 import random
 import sys
 import concurrent.futures
+import queue
 import threading 
 from datetime import datetime
 from bs4 import BeautifulSoup
@@ -19,7 +20,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 import shared_utils
 import shared_utils
-from shared_utils import status, parse_date, APIClient
+from shared_utils import status, parse_date, APIClient, extract_form_state
 
 # --- GLOBAL CONFIGURATION AND THREAD MANAGEMENT ---
 LIST_URL = 'https://doc-search.iowa.gov/api/offender/GetOffenderListAjax'
@@ -28,13 +29,26 @@ DETAIL_BASE_URL = 'https://doc-search.iowa.gov/offender/detail?offenderNumber='
 INITIAL_BASE_SEARCH_URL = 'https://doc-search.iowa.gov/Offender/Search' 
 AJAX_REFERER_URL = 'https://doc-search.iowa.gov/Offender/SearchResult?search=%7B%22FirsName%22%3Anull,%22MiddleName%22%3Anull,%22LastName%22%3Anull,%22Gender%22%3Anull,%22OffenderNumber%22%3Anull,%22Location%22%3Anull,%22Offense%22%3Anull,%22County%22%3A%2231%22,%22SearchType%22%3A%22SW%22%7D'
 
+# Authenticated session pool: sessions are re-authenticated after SESSION_MAX_AGE seconds,
+# idle ones health-checked every SESSION_CHECK_INTERVAL seconds
+SESSION_POOL_SIZE = 30
+SESSION_MAX_AGE = 1200
+SESSION_CHECK_INTERVAL = 300
+LIST_PAGE_ATTEMPTS = 5
+PROXY_TOPUP_COUNT = 25  # Proxies validated per top-up when every pooled proxy is bound or cooling down
+DETAIL_ATTEMPTS = 4  # Tries per offender before it is given up (waiting for a session does not count)
+DETAIL_STALL_SECONDS = 600  # Give up on the remaining details once no session could be leased for this long
+SESSION_ERROR_STATUSES = (403, 407)  # Responses that mean the session or its proxy is blocked
+
 # Threading control variables and shared counters
 PROXY_REFRESHER_RUNNING = True
 PROXY_LOCK = threading.Lock()
 DETAIL_STATS_LOCK = threading.Lock()
 CHARGE_STATS_LOCK = threading.Lock()
 # Counters for the final summary report
-DETAIL_STATS = {'inserted': 0, 'skipped': 0}
+DETAIL_STATS = {'inserted': 0, 'skipped': 0, 'failed': 0}
+# Detail phase liveness: monotonic time of the last successful lease, and whether the phase gave up
+DETAIL_PROGRESS = {'last_lease': 0.0, 'stalled': False}
 CHARGE_STATS = {'inserted': 0, 'skipped': 0}
 
 # Base headers and LIST_BASE_DATA (unchanged)
@@ -132,7 +146,7 @@ def execute_batch_insert_api(table_name, records):
         # Note: Detail insertion is more complex as it involves children. 
         # The script calls this function for Detail AND Charges separately.
         # But our API endpoint `doc/batch-details` expects a structured object.
-        # We need to adapt the caller `process_detail_batch` to construct the full DTO.
+        # Details are posted by detail_worker through an IngestionBatcher instead.
         return len(records), 0
     except Exception as e:
         import logging
@@ -142,304 +156,285 @@ def execute_batch_insert_api(table_name, records):
 # --- Core Scraper Functions ---
 
 
-@shared_utils.get_retry_decorator(max_attempts=200, wait_seconds=0.1)
-def get_authenticated_session(proxy_pool):
+def authenticate_session(proxy):
     """
-    Acquires a fresh session and performs the CSRF token dance.
-    Returns (session, proxy) or raises Exception (which retry decorator handles).
-    
-    This version cycles through ALL available proxies until one works.
+    Performs the CSRF token dance through one proxy.
+    Returns an authenticated session or raises (AuthSessionPool tries another proxy).
     """
-    if not proxy_pool:
-        raise Exception("No proxies available")
-    
-    # Shuffle to randomize order
-    import random
-    shuffled_proxies = list(proxy_pool)
-    random.shuffle(shuffled_proxies)
-    
-    # Try EVERY proxy in the pool
-    for proxy in shuffled_proxies:
-        try:
-            session = requests.Session()
-            session.headers.update({'User-Agent': random.choice(shared_utils.USER_AGENTS)})
-            
-            proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-            
-            # 1. Hit the base search page
-            response = session.get(INITIAL_BASE_SEARCH_URL, headers={'User-Agent': session.headers['User-Agent']}, 
-                                 proxies=proxies_dict, timeout=10, verify=False)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 2. Scrape the __RequestVerificationToken
-            antiforgery_input = soup.find('input', {'name': '__RequestVerificationToken'})
-            
-            if antiforgery_input and antiforgery_input.get('value'):
-                token_value = antiforgery_input.get('value')
-                
-                # Set the token explicitly as a cookie 
-                session.cookies.set('__RequestVerificationToken', token_value, domain='doc-search.iowa.gov', path='/')
-                
-                # 3. Navigate to the search results page to set the specific referer
-                session.get(AJAX_REFERER_URL, headers={'User-Agent': session.headers['User-Agent']}, 
-                          proxies=proxies_dict, timeout=10, verify=False)
-                
-                return session, proxy
-        except Exception:
-            # Try next proxy
-            continue
-    
-    # If we get here, all proxies failed
-    raise Exception(f"All {len(shuffled_proxies)} proxies failed for authentication handshake")
+    session = requests.Session()
+    session.headers.update({'User-Agent': random.choice(shared_utils.USER_AGENTS)})
+    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+
+    try:
+        # 1. Hit the base search page
+        start = time.monotonic()
+        response = session.get(INITIAL_BASE_SEARCH_URL, headers={'User-Agent': session.headers['User-Agent']}, 
+                             proxies=proxies_dict, timeout=10, verify=False)
+        response.raise_for_status()
+        shared_utils.report_proxy_result(proxy, True, time.monotonic() - start)
+
+        # 2. Scrape the __RequestVerificationToken
+        token_value = extract_form_state(response.text, ('__RequestVerificationToken',)).get('__RequestVerificationToken')
+        if not token_value:
+            raise Exception("No __RequestVerificationToken on search page")
+
+        # Set the token explicitly as a cookie 
+        session.cookies.set('__RequestVerificationToken', token_value, domain='doc-search.iowa.gov', path='/')
+
+        # 3. Navigate to the search results page to set the specific referer
+        session.get(AJAX_REFERER_URL, headers={'User-Agent': session.headers['User-Agent']}, 
+                  proxies=proxies_dict, timeout=10, verify=False)
+        return session
+    except requests.RequestException:
+        shared_utils.report_proxy_result(proxy, False)
+        session.close()
+        raise
+    except Exception:
+        session.close()
+        raise
+
+def check_session(session, proxy):
+    """Background health check for idle pooled sessions."""
+    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+    resp = session.get(AJAX_REFERER_URL, headers={'User-Agent': session.headers['User-Agent']},
+                       proxies=proxies_dict, timeout=10, verify=False)
+    return resp.status_code == 200
 
-def create_session_pool(proxy_pool, pool_size=30):
+def make_proxy_topup(raw_proxies):
     """
-    Pre-create authenticated sessions to avoid re-auth on every detail fetch.
-    Returns: list of (session, proxy) tuples
+    Proxy refresh for the session pool: the orchestrator's current list when running under it,
+    otherwise PROXY_TOPUP_COUNT more proxies validated from the raw source list.
     """
-    status("Session Pool", f"Creating pool of {pool_size} authenticated sessions...")
-    session_pool = []
-    
-    import random
-    shuffled = list(proxy_pool)
-    random.shuffle(shuffled)
-    
-    attempted = 0
-    for proxy in shuffled:
-        if len(session_pool) >= pool_size:
-            break
-        attempted += 1
+    def topup(current):
+        if os.getenv("ORCHESTRATOR_API_URL"):
+            return shared_utils.refresh_proxy_pool(list(current))
+        known = set(current)
+        candidates = [p for p in raw_proxies if p not in known]
+        if not candidates:
+            return []
+        return shared_utils.validate_proxies(candidates, target_count=PROXY_TOPUP_COUNT)
+    return topup
+
+def create_session_pool(proxy_pool, pool_size=30, raw_proxies=None):
+    """
+    Authenticated sessions shared by the list and detail workers.
+    Handshakes run in parallel; the pool re-authenticates expired or failed sessions in the background
+    and tops up its proxies from raw_proxies (or the orchestrator) when they run out.
+    """
+    return shared_utils.AuthSessionPool(
+        authenticate_session, proxy_pool, size=pool_size,
+        auth_workers=min(pool_size, 20), max_age=SESSION_MAX_AGE,
+        check=check_session, check_interval=SESSION_CHECK_INTERVAL,
+        refresh=make_proxy_topup(raw_proxies or []),
+        name="Session Pool"
+    )
+
+def scrape_offender_detail(offender_number, leased):
+    """
+    Fetches and parses one offender's detail page with a pooled session.
+    Returns the detail DTO (with Charges); raises on fetch or parse failure.
+    Single attempt: retries happen on another session (see detail_worker).
+    """
+    session = leased.session
+
+    url = DETAIL_BASE_URL + offender_number
+    headers = HEADERS.copy()
+    headers['User-Agent'] = session.headers['User-Agent']
+
+    resp = session.get(url, headers=headers, proxies=leased.proxies, timeout=15, verify=False)
+    resp.raise_for_status()
+
+    soup = BeautifulSoup(resp.text, 'html.parser')
+
+    if not soup.find('div', class_='label'):
+        raise ValueError("Invalid content")
+
+    def get_detail_value(label_text):
+        label_element = soup.find('div', class_='label', string=lambda t: t and label_text in t)
+        if label_element:
+            data_element = label_element.find_next_sibling('div', class_='d-inline-flex')
+            if data_element:
+                return data_element.get_text(strip=True)
+        return None
+
+    def to_iso(dt):
+        return dt.isoformat() if dt else None
+
+    # Extract Detail
+    local_detail_data = {
+        'OffenderNumber': offender_number.strip(),
+        'Location': get_detail_value('Location:'),
+        'Offense': get_detail_value('Offense:'),
+        'TDD_SDD': to_iso(parse_date(get_detail_value('TDD/SDD *:'))),
+        'CommitmentDate': to_iso(parse_date(get_detail_value('Commitment Date:'))),
+        'RecallDate': to_iso(parse_date(get_detail_value('Recall Date:'))),
+        'InterviewDate': get_detail_value('Interview Date and Time (if being interviewd):'),
+        'MandatoryMinimum': get_detail_value('Mandatory Minimum (if applicable):'),
+        'DecisionType': get_detail_value('Decision Type:'),
+        'Decision': get_detail_value('Decision:'),
+        'DecisionDate': to_iso(parse_date(get_detail_value('Decision Date:'))),
+        'EffectiveDate': to_iso(parse_date(get_detail_value('Effective Date:'))),
+        'Charges': []
+    }
+
+    # Extract Charges
+    charges_table = soup.find('table', id='charges')
+    if charges_table:
+        tbody = charges_table.find('tbody')
+        if tbody:
+            for row in tbody.find_all('tr'):
+                cols = row.find_all('td')
+                if len(cols) >= 5:
+                    end_date_raw = cols[4].get('data-sort') or cols[4].get_text(strip=True)
+                    charge_data = {
+                        'SupervisionStatus': (cols[1].get_text(strip=True) or None),
+                        'OffenseClass': (cols[2].get_text(strip=True) or None),
+                        'CountyOfCommitment': (cols[3].get_text(strip=True) or None),
+                        'EndDate': to_iso(parse_date(end_date_raw))
+                    }
+                    local_detail_data['Charges'].append(charge_data)
+
+    return local_detail_data
+
+def on_detail_posted(dto, error):
+    """IngestionBatcher callback: tallies each detail (and its charges) once its batch is posted."""
+    if error:
+        import logging
+        logging.error(f"Detail insert failed for {dto['OffenderNumber']}: {error}")
+    key = 'skipped' if error else 'inserted'
+    with DETAIL_STATS_LOCK:
+        DETAIL_STATS[key] += 1
+    with CHARGE_STATS_LOCK:
+        CHARGE_STATS[key] += len(dto['Charges'])
+
+def is_session_error(exc):
+    """True if a detail fetch failed because of the session or its proxy (not the offender's page)."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, 'response', None)
+    return isinstance(exc, requests.HTTPError) and response is not None and response.status_code in SESSION_ERROR_STATUSES
+
+def detail_worker(work_queue, session_pool, batcher):
+    """
+    Worker function: pulls one offender at a time from the shared queue and scrapes it
+    with a session leased from the pool, so a slow proxy only holds up a single offender.
+    A failed offender goes back on the queue with its attempt count. Transport and auth
+    failures also retire the session, so the retry runs on a different one; page-level
+    failures (404, 500, unexpected content) keep it. Waiting for a session does not use
+    up an attempt; once none could be leased for DETAIL_STALL_SECONDS the remaining
+    offenders are given up. Stops at the None sentinel.
+    """
+    import logging
+    while True:
+        item = work_queue.get()
+        if item is None:
+            work_queue.task_done()
+            return
+
+        offender_number, attempt = item
         try:
-            session = requests.Session()
-            session.headers.update({'User-Agent': random.choice(shared_utils.USER_AGENTS)})
-            
-            proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-            
-            response = session.get(INITIAL_BASE_SEARCH_URL, headers={'User-Agent': session.headers['User-Agent']}, 
-                                 proxies=proxies_dict, timeout=10, verify=False)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            antiforgery_input = soup.find('input', {'name': '__RequestVerificationToken'})
-            
-            if antiforgery_input and antiforgery_input.get('value'):
-                token_value = antiforgery_input.get('value')
-                session.cookies.set('__RequestVerificationToken', token_value, domain='doc-search.iowa.gov', path='/')
-                session.get(AJAX_REFERER_URL, headers={'User-Agent': session.headers['User-Agent']}, 
-                          proxies=proxies_dict, timeout=10, verify=False)
-                
-                session_pool.append((session, proxy))
-        except Exception:
-            continue
-    
-    status("Session Pool", f"Created {len(session_pool)} working sessions from {attempted} attempts")
-    return session_pool
+            if DETAIL_PROGRESS['stalled']:
+                with DETAIL_STATS_LOCK:
+                    DETAIL_STATS['failed'] += 1
+                continue
 
-def process_detail_batch(offender_batch, session_with_proxy):
+            try:
+                leased = session_pool.acquire()
+            except TimeoutError as e:
+                with DETAIL_STATS_LOCK:
+                    stalled = time.monotonic() - DETAIL_PROGRESS['last_lease'] > DETAIL_STALL_SECONDS
+                    if stalled and not DETAIL_PROGRESS['stalled']:
+                        DETAIL_PROGRESS['stalled'] = True
+                        logging.error(f"No session could be leased for {DETAIL_STALL_SECONDS}s ({e}); giving up on the remaining details")
+                    if stalled:
+                        DETAIL_STATS['failed'] += 1
+                if not stalled:
+                    work_queue.put((offender_number, attempt))
+                continue
+
+            with DETAIL_STATS_LOCK:
+                DETAIL_PROGRESS['last_lease'] = time.monotonic()
+            try:
+                dto = scrape_offender_detail(offender_number, leased)
+            except Exception as e:
+                if is_session_error(e):
+                    leased.fail()
+                if attempt + 1 < DETAIL_ATTEMPTS:
+                    work_queue.put((offender_number, attempt + 1))
+                else:
+                    logging.error(f"Failed to scrape {offender_number} after {DETAIL_ATTEMPTS} attempts: {e}")
+                    with DETAIL_STATS_LOCK:
+                        DETAIL_STATS['failed'] += 1
+                continue
+            finally:
+                session_pool.release(leased)
+
+            batcher.add(dto, on_detail_posted)
+            status("Detail Scrape", f"Processed {offender_number}")
+        finally:
+            work_queue.task_done()
+
+def fetch_list_page(session_pool, start_index):
     """
-    Worker function to process offender details using a pre-authenticated session.
-    session_with_proxy: tuple of (session, proxy_string)
+    Fetches one offender list page (JSON) with a leased session.
+    A failed request retires that session and the page is retried on another one.
     """
-    if not offender_batch:
-        return
+    page_size = int(LIST_BASE_DATA['length'])
+    list_data = LIST_BASE_DATA.copy()
+    list_data['start'] = str(start_index)
+    list_data['draw'] = str((start_index // page_size) + 1)
 
-    batch_dtos = []
-    session, proxy = session_with_proxy
-    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-    
-    for offender in offender_batch:
-        offender_number = offender['OffenderNumber']
+    last_error = None
+    for attempt in range(LIST_PAGE_ATTEMPTS):
         try:
-            # Fetch detail with simple retry
-            url = DETAIL_BASE_URL + offender_number
-            headers = HEADERS.copy()
-            headers['User-Agent'] = session.headers['User-Agent']
-            
-            html = None
-            for attempt in range(3):
+            with session_pool.lease() as leased:
+                list_headers = HEADERS.copy()
+                list_headers['Referer'] = AJAX_REFERER_URL
+                list_headers['User-Agent'] = leased.session.headers['User-Agent']
+                token = leased.session.cookies.get('__RequestVerificationToken')
+                if token:
+                    list_data['__RequestVerificationToken'] = token
                 try:
-                    resp = session.get(url, headers=headers, proxies=proxies_dict, timeout=15, verify=False)
+                    resp = leased.session.post(LIST_URL, data=list_data, headers=list_headers, proxies=leased.proxies, timeout=15, verify=False)
                     resp.raise_for_status()
-                    html = resp.text
-                    break
+                    return resp.json()
                 except Exception:
-                    if attempt == 2:
-                        raise
-                    time.sleep(0.1)
-            
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            if not soup.find('div', class_='label'):
-                raise ValueError("Invalid content")
-
-            def get_detail_value(label_text):
-                label_element = soup.find('div', class_='label', string=lambda t: t and label_text in t)
-                if label_element:
-                    data_element = label_element.find_next_sibling('div', class_='d-inline-flex')
-                    if data_element:
-                        return data_element.get_text(strip=True)
-                return None
-
-            def to_iso(dt):
-                return dt.isoformat() if dt else None
-
-            # Extract Detail
-            local_detail_data = {
-                'OffenderNumber': offender_number.strip(),
-                'Location': get_detail_value('Location:'),
-                'Offense': get_detail_value('Offense:'),
-                'TDD_SDD': to_iso(parse_date(get_detail_value('TDD/SDD *:'))),
-                'CommitmentDate': to_iso(parse_date(get_detail_value('Commitment Date:'))),
-                'RecallDate': to_iso(parse_date(get_detail_value('Recall Date:'))),
-                'InterviewDate': get_detail_value('Interview Date and Time (if being interviewd):'),
-                'MandatoryMinimum': get_detail_value('Mandatory Minimum (if applicable):'),
-                'DecisionType': get_detail_value('Decision Type:'),
-                'Decision': get_detail_value('Decision:'),
-                'DecisionDate': to_iso(parse_date(get_detail_value('Decision Date:'))),
-                'EffectiveDate': to_iso(parse_date(get_detail_value('Effective Date:'))),
-                'Charges': []
-            }
-            
-            # Extract Charges
-            charges_table = soup.find('table', id='charges')
-            if charges_table:
-                tbody = charges_table.find('tbody')
-                if tbody:
-                    for row in tbody.find_all('tr'):
-                        cols = row.find_all('td')
-                        if len(cols) >= 5:
-                            end_date_raw = cols[4].get('data-sort') or cols[4].get_text(strip=True)
-                            charge_data = {
-                                'SupervisionStatus': (cols[1].get_text(strip=True) or None),
-                                'OffenseClass': (cols[2].get_text(strip=True) or None),
-                                'CountyOfCommitment': (cols[3].get_text(strip=True) or None),
-                                'EndDate': to_iso(parse_date(end_date_raw))
-                            }
-                            local_detail_data['Charges'].append(charge_data)
-
-            batch_dtos.append(local_detail_data)
-            status("Detail Scrape", f"Processed {offender_number}")
-
+                    leased.fail()
+                    raise
         except Exception as e:
-            import logging
-            logging.error(f"Failed to scrape {offender_number}: {e}")
+            last_error = e
+            time.sleep(1)
 
-    # Send Batch to API
-    if batch_dtos:
-        try:
-            api = APIClient()
-            api.post_ingestion("doc/batch-details", batch_dtos)
-            
-            with DETAIL_STATS_LOCK:
-                DETAIL_STATS['inserted'] += len(batch_dtos)
-            with CHARGE_STATS_LOCK:
-                c_count = sum(len(d['Charges']) for d in batch_dtos)
-                CHARGE_STATS['inserted'] += c_count
-                  
-        except Exception as e:
-            import logging
-            logging.error(f"Batch API Insert Failed: {e}")
+    raise Exception(f"List page {list_data['draw']} failed after {LIST_PAGE_ATTEMPTS} attempts: {last_error}")
 
-def process_list_batch(offsets, valid_proxies):
+def process_list_batch(offsets, session_pool):
     """
-    Worker function to fetch a batch of list pages using a persistent session.
+    Worker function to fetch a batch of list pages with pooled sessions.
     """
     results = []
-    try:
-        session, proxy = get_authenticated_session(valid_proxies)
-    except Exception:
-        session = None
-
-    if not session:
-        return []
-
-    # get_authenticated_session sets cookies, but we need to pass headers.
-    list_headers = HEADERS.copy()
-    list_headers['Referer'] = AJAX_REFERER_URL
-    list_headers['User-Agent'] = session.headers['User-Agent']
-    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
     page_size = int(LIST_BASE_DATA['length'])
 
     for start_index in offsets:
-        list_data = LIST_BASE_DATA.copy()
-        list_data['start'] = str(start_index)
-        list_data['draw'] = str((start_index // page_size) + 1)
-        
-        token = session.cookies.get('__RequestVerificationToken')
-        if token:
-            list_data['__RequestVerificationToken'] = token
+        try:
+            offenders = fetch_list_page(session_pool, start_index).get('data', [])
+            results.extend(offenders)
+            status("Batch Worker", f"Fetched page {(start_index // page_size) + 1}. Found {len(offenders)} records.")
+        except Exception as e:
+            import logging
+            logging.error(f"[ERROR] {e}")
 
-        page_success = False
-        while True:
-            try:
-                resp = session.post(LIST_URL, data=list_data, headers=list_headers, proxies=proxies_dict, timeout=15, verify=False)
-                resp.raise_for_status()
-                data = resp.json()
-                offenders = data.get('data', [])
-                results.extend(offenders)
-                page_success = True
-                status("Batch Worker", f"Fetched page {list_data['draw']}. Found {len(offenders)} records.")
-                break
-            except Exception as e:
-                # Retry loop for scraping
-                for attempt in range(3): 
-                    if not session:
-                        try:
-                            session, proxy = get_authenticated_session(valid_proxies)
-                        except Exception:
-                            session = None
-                            
-                        if not session:
-                            time.sleep(1)
-                            continue
-                    
-                    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-                    list_headers['User-Agent'] = session.headers['User-Agent']
-                    token = session.cookies.get('__RequestVerificationToken')
-                    if token:
-                        list_data['__RequestVerificationToken'] = token
-                    
-                    # If we got a session, try again
-                    if session:
-                        break # Break from attempt loop to retry the main request
-                else: # This else belongs to the for loop, executed if no break occurred
-                    # All attempts failed to get a session or update details
-                    time.sleep(2) # Original sleep if no session could be acquired after retries
-                    break # Break from while True, giving up on this page
-        
         time.sleep(random.uniform(1.0, 2.0))
     
     return results
 
-def scrape_offender_list(valid_proxies, existing_detail_ids):
+def scrape_offender_list(session_pool, existing_detail_ids):
     """
     Orchestrates the parallel scraping of the offender list.
     """
     status("List Scrape", "Starting parallel list scrape...")
-    
-    session = None
-    proxy_for_list = None
-    
-    # Get authenticated session (retry decorator handles all attempts)
-    try:
-        session, proxy_for_list = get_authenticated_session(valid_proxies)
-    except Exception as e:
-        import logging
-        logging.error(f"[FATAL] Could not get session after trying all proxies: {e}")
-        sys.exit(1)
 
     try:
-        proxies_dict = {"http": f"http://{proxy_for_list}", "https": f"http://{proxy_for_list}"}
-        list_data = LIST_BASE_DATA.copy()
-        token = session.cookies.get('__RequestVerificationToken')
-        if token:
-            list_data['__RequestVerificationToken'] = token
-            
-        resp = session.post(LIST_URL, data=list_data, headers=HEADERS, proxies=proxies_dict, timeout=15, verify=False)
-        resp.raise_for_status()
-        data = resp.json()
+        data = fetch_list_page(session_pool, 0)
         total_records = data.get('recordsFiltered', 0)
         status("List Scrape", f"Total records to fetch: {total_records}")
     except Exception as e:
@@ -452,18 +447,19 @@ def scrape_offender_list(valid_proxies, existing_detail_ids):
         return [], 0, []
 
     page_size = int(LIST_BASE_DATA['length'])
-    all_offsets = range(0, total_records, page_size)
+    # The count request already returned the first page
+    all_offsets = range(page_size, total_records, page_size)
     
     BATCH_SIZE = 10 # Pages per worker
     offset_chunks = [all_offsets[i:i + BATCH_SIZE] for i in range(0, len(all_offsets), BATCH_SIZE)]
     
     status("List Scrape", f"Split {len(all_offsets)} pages into {len(offset_chunks)} batches.")
 
-    all_offenders_raw = []
+    all_offenders_raw = list(data.get('data', []))
     MAX_WORKERS = 10
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(process_list_batch, chunk, valid_proxies) for chunk in offset_chunks]
+        futures = [executor.submit(process_list_batch, chunk, session_pool) for chunk in offset_chunks]
         for future in concurrent.futures.as_completed(futures):
             try:
                 batch_results = future.result()
@@ -530,14 +526,22 @@ def main():
         
     status("Proxy Setup", f"Initial setup complete: {len(valid_proxies)} proxies available.")
     
-    # We removed the separate thread. If we needed to refresh, we'd do it in loops, 
-    # but this script runs in phases. We can adding logic to reuse refresh_proxy_pool if needed.
-    
     existing_detail_ids = set()
     status("Pre-Check", "Skipping existing ID check (assuming full scrape).")
 
+    # 2. Authenticated Session Pool (shared by list and detail workers)
+    # The list phase starts once a few sessions are ready; the rest authenticate in the background.
+    pool_size = int(config.get("session_pool_size", SESSION_POOL_SIZE))
+    # The pool validates more proxies from raw_proxies when retired ones leave it short
+    session_pool = create_session_pool(valid_proxies, pool_size, raw_proxies)
+    if not session_pool.start(min_ready=min(10, pool_size), timeout=60):
+        import logging
+        logging.error("[FATAL] Could not authenticate any session after trying all proxies")
+        session_pool.close()
+        sys.exit(1)
+
     # 3. List Scrape
-    offenders_to_scrape, total_records_found, summary_records_to_insert = scrape_offender_list(valid_proxies, existing_detail_ids)
+    offenders_to_scrape, total_records_found, summary_records_to_insert = scrape_offender_list(session_pool, existing_detail_ids)
     
     # 4. Summary Insert
     execute_batch_insert_api('Offender_Summary', summary_records_to_insert)
@@ -545,44 +549,40 @@ def main():
     summary_skipped = 0
     status("Summary Insert", f"Inserted {summary_inserted} summaries.")
     
-    # 5. Detail Scrape (Session Pooling)
+    # 5. Detail Scrape (shared work queue over the session pool)
     if offenders_to_scrape:
         status("Detail Scrape", f"Starting scrape for {len(offenders_to_scrape)} missing details...")
         
-        # Create pool of authenticated sessions
-        SESSION_POOL_SIZE = 30
-        session_pool = create_session_pool(valid_proxies, SESSION_POOL_SIZE)
+        work_queue = queue.Queue()
+        DETAIL_PROGRESS['last_lease'] = time.monotonic()
+        for offender in offenders_to_scrape:
+            work_queue.put((offender['OffenderNumber'], 0))
         
-        if not session_pool:
-            import logging
-            logging.error("[FATAL] Could not create any working sessions for detail scraping")
-            sys.exit(1)
-        
-        BATCH_SIZE = 50  # Records per worker
-        offender_chunks = [offenders_to_scrape[i:i + BATCH_SIZE] for i in range(0, len(offenders_to_scrape), BATCH_SIZE)]
-        
-        # Use as many workers as we have sessions (up to chunk count)
-        MAX_WORKERS = min(len(session_pool), len(offender_chunks))
-        status("Detail Scrape", f"Using {MAX_WORKERS} workers with {len(session_pool)} pre-authenticated sessions")
+        # One worker per pooled session (up to offender count); details are posted in batches of 50
+        MAX_WORKERS = min(pool_size, len(offenders_to_scrape))
+        status("Detail Scrape", f"Using {MAX_WORKERS} workers with {session_pool.ready_count()} sessions ready (pool size {pool_size})")
+        batcher = shared_utils.IngestionBatcher("doc/batch-details", id_field="OffenderNumber", max_records=50)
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Distribute sessions to workers via round-robin
-            futures = []
-            for i, chunk in enumerate(offender_chunks):
-                session_idx = i % len(session_pool)
-                futures.append(executor.submit(process_detail_batch, chunk, session_pool[session_idx]))
-            concurrent.futures.wait(futures)
-
+            for _ in range(MAX_WORKERS):
+                executor.submit(detail_worker, work_queue, session_pool, batcher)
+            work_queue.join()
+            for _ in range(MAX_WORKERS):
+                work_queue.put(None)
+        batcher.close()
 
         detail_inserted, detail_skipped = DETAIL_STATS['inserted'], DETAIL_STATS['skipped']
         charge_inserted, charge_skipped = CHARGE_STATS['inserted'], CHARGE_STATS['skipped']
         
-        status("Detail Insert", f"Inserted {detail_inserted} details, skipped {detail_skipped}.")
+        status("Detail Insert", f"Inserted {detail_inserted} details, skipped {detail_skipped}, gave up on {DETAIL_STATS['failed']}.")
         status("Charge Insert", f"Inserted {charge_inserted} charges, skipped {charge_skipped}.")
     else:
         status("Detail Scrape", "No missing details to scrape.")
         detail_inserted, detail_skipped, charge_inserted, charge_skipped = 0, 0, 0, 0
         
+    session_pool.close()
+    status("Session Pool", f"Stats: {session_pool.stats}")
+
     # 6. Final Summary
     print("\n" + "="*50)
     print("FINAL SCRAPING SUMMARY")
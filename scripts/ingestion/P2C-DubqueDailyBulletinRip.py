@@ -8,6 +8,7 @@ import argparse
 import hashlib
 import concurrent.futures
 import threading
+import queue
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from urllib.parse import quote_plus
@@ -18,6 +19,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 import shared_utils
 from shared_utils import APIClient
 
+# Shared time parser (same rules as the event_time backfill ETL)
+ETL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ETL')
+if ETL_DIR not in sys.path: sys.path.append(ETL_DIR)
+from UpdateDAB_TimetoEventTime import parse_time_with_regex
+
+UNPARSEABLE_EVENT_TIME = "1900-01-01T00:00:00" # Same sentinel the ETL writes, so rows aren't re-picked as candidates
+
 # --- CONFIGURATION CONSTANTS ---
 DATA_URL = "http://p2c.cityofdubuque.org/jqHandler.ashx?op=s"
 SESSION_INIT_URL = "http://p2c.cityofdubuque.org/main.aspx"
@@ -26,6 +34,13 @@ DAILY_BULLETIN_URL = "http://p2c.cityofdubuque.org/dailybulletin.aspx"
 DEFAULT_DAYS_TO_SCRAPE = 7
 DEFAULT_MAX_WORKERS = 7
 DEFAULT_CHUNK_SIZE = 7
+DEFAULT_CLOSED_AFTER_DAYS = 3       # Days older than this are considered settled
+DEFAULT_REFETCH_CLOSED_HOURS = 24   # How often a settled day is re-checked
+DEFAULT_UPLOAD_BATCH_ROWS = 2000    # Rows per daily-bulletin/batch post (coalesced across days)
+UPLOAD_FLUSH_SECONDS = 2.0          # Post a partial batch after this long without new days
+UPLOAD_MAX_PENDING_DAYS = 4         # Day workers block when this many days await upload
+UPLOAD_ATTEMPTS = 3
+DEFAULT_ETL_CHUNK_IDS = 2000        # Inserted IDs per post-processing pass (across days)
 
 # --- Global Statistics ---
 stats_lock = threading.Lock()
@@ -40,6 +55,28 @@ def update_audit(record_id, date, status, details=""):
     with stats_lock:
         audit_log[record_id] = {"date": date, "status": status, "details": details}
 
+# --- Incremental State ---
+# Per-day fingerprint of the last successful fetch: {"rows": int, "hash": str, "fetched_at": float}
+FORCE_REFETCH = False
+CLOSED_AFTER_DAYS = DEFAULT_CLOSED_AFTER_DAYS
+REFETCH_CLOSED_HOURS = DEFAULT_REFETCH_CLOSED_HOURS
+_day_state = None
+
+def get_day_state():
+    global _day_state
+    with stats_lock:
+        if _day_state is None:
+            _day_state = shared_utils.LocalCache("daily_bulletin_days")
+    return _day_state
+
+def day_fingerprint(record_ids):
+    """Row count + MD5 over the sorted composite IDs (order-independent)."""
+    digest = hashlib.md5("\n".join(sorted(record_ids)).encode('utf-8')).hexdigest()
+    return len(record_ids), digest
+
+def is_closed_day(current_date):
+    return (datetime.now().date() - current_date.date()).days >= CLOSED_AFTER_DAYS
+
 def verify_database_state(start_date, end_date):
     """
     Queries the database for all IDs in the date range and compares with audit_log.
@@ -121,23 +158,23 @@ def get_fresh_session(user_agent, proxy_pool):
         return None, None
 
     # Proxy Mode
-    local_proxy_pool = list(proxy_pool)
-    random.shuffle(local_proxy_pool)
-    
-    # Try up to 10 distinct proxies
-    for proxy_idx, proxy in enumerate(local_proxy_pool[:10]):
+    # Try up to 10 distinct proxies, weighted towards healthy ones
+    for proxy_idx, proxy in enumerate(shared_utils.pick_proxies(proxy_pool, 10)):
         proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
         
         # Try 3 times per proxy
         for attempt in range(3):
             try:
                 session = requests.Session()
+                start = time.monotonic()
                 resp = session.get(SESSION_INIT_URL, headers=headers, proxies=proxies_dict, timeout=20)
                 resp.raise_for_status()
+                shared_utils.report_proxy_result(proxy, True, time.monotonic() - start)
                 if "ASP.NET_SessionId" in session.cookies:
                     return session, proxy 
             except requests.RequestException as e:
                 logging.warning(f"Proxy {proxy} attempt {attempt+1}/3 failed: {e}")
+                shared_utils.report_proxy_result(proxy, False)
                 time.sleep(1)
         
         logging.warning(f"Proxy {proxy} failed 3 times. Switching...")
@@ -177,13 +214,173 @@ def init_session_form(session, current_date, report_type, user_agent, proxy_in_u
         logging.warning(f"Form initialization failed for {date_str}: {e}")
         return False
 
+class BulletinUploader:
+    """
+    Consumer side of the scrape pipeline.
+    Day workers hand over each fetched (and changed) day; a single thread coalesces
+    rows across days into larger daily-bulletin/batch posts, so fetching the next
+    days overlaps with uploading the previous ones. The hand-off queue is bounded:
+    if uploads fall behind, workers wait instead of piling up rows in memory.
+    A day's fingerprint is saved (and its IDs handed to the ETL stage) only once all its rows are accepted.
+    """
+
+    def __init__(self, batch_rows=DEFAULT_UPLOAD_BATCH_ROWS):
+        self.batch_rows = batch_rows
+        self._queue = queue.Queue(maxsize=UPLOAD_MAX_PENDING_DAYS)
+        self._thread = threading.Thread(target=self._run, name="Uploader", daemon=True)
+        self._thread.start()
+
+    def submit_day(self, date_str, date_key, dtos, row_count, digest, parse_skipped=0):
+        day = {
+            "date_str": date_str, "date_key": date_key,
+            "row_count": row_count, "digest": digest,
+            "remaining": len(dtos), "failed": False,
+            "inserted": 0, "skipped": 0, "ids": [],
+            "parse_skipped": parse_skipped # Records that failed to parse; never sent
+        }
+        self._queue.put((day, dtos))
+
+    def close(self):
+        """Uploads everything still queued, then stops the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        buffer = [] # (day, dto)
+        closing = False
+        while not closing:
+            idle = False
+            try:
+                item = self._queue.get(timeout=UPLOAD_FLUSH_SECONDS)
+                if item is None:
+                    closing = True
+                else:
+                    day, dtos = item
+                    if not dtos:
+                        self._finish_day(day)
+                    buffer.extend((day, dto) for dto in dtos)
+            except queue.Empty:
+                idle = True
+
+            # Full batches go out right away; a partial one only when idle or closing
+            while len(buffer) >= self.batch_rows:
+                self._post(buffer[:self.batch_rows])
+                buffer = buffer[self.batch_rows:]
+            if buffer and (closing or idle):
+                self._post(buffer)
+                buffer = []
+
+    def _post(self, entries):
+        batch_dto = [dto for _, dto in entries]
+        res = None
+        for attempt in range(UPLOAD_ATTEMPTS):
+            try:
+                res = APIClient().post_ingestion("daily-bulletin/batch", batch_dto)
+                break
+            except Exception as e:
+                logging.error(f"API Batch Upload Failed ({len(batch_dto)} rows, attempt {attempt+1}/{UPLOAD_ATTEMPTS}): {e}")
+                time.sleep(2 ** attempt)
+
+        inserted_ids = set(res.get('insertedIds', [])) if res else set()
+        for day, dto in entries:
+            day["remaining"] -= 1
+            if res is None:
+                day["failed"] = True
+            elif dto["id"] in inserted_ids:
+                day["inserted"] += 1
+                day["ids"].append(dto["id"])
+            else:
+                day["skipped"] += 1
+            if day["remaining"] == 0:
+                self._finish_day(day)
+
+    def _finish_day(self, day):
+        global total_inserted, total_skipped
+        date_str = day["date_str"]
+        if day["failed"]:
+            logging.error(f"Upload failed for {date_str}; it will be re-sent on the next run.")
+            return
+
+        # Only remember the fingerprint once the API has everything
+        get_day_state().set(day["date_key"], {"rows": day["row_count"], "hash": day["digest"], "fetched_at": time.time()})
+        with stats_lock:
+            total_inserted += day["inserted"]
+            total_skipped += day["skipped"] + day["parse_skipped"]
+            total_inserted_ids.extend(day["ids"])
+        logging.info(f"Finished {date_str}. Inserted: {day['inserted']}")
+
+        # Post-processing is batched across days by the run-level ETL stage
+        if day["ids"]:
+            etl.add(day["ids"])
+
+class BulletinETL:
+    """
+    Run-level post-processing stage (geocoding; event_time is already set at ingest).
+    Collects inserted IDs from every day and geocodes them in large chunks on its
+    own thread, so neither the day workers nor the uploader ever wait on ETL.
+    """
+
+    def __init__(self, chunk_ids=DEFAULT_ETL_CHUNK_IDS):
+        self.chunk_ids = chunk_ids
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ETL", daemon=True)
+        self._thread.start()
+
+    def add(self, ids):
+        self._queue.put(list(ids))
+
+    def close(self):
+        """Processes the remaining IDs, then stops the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        pending = []
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                closing = True
+            else:
+                pending.extend(item)
+
+            while len(pending) >= self.chunk_ids or (closing and pending):
+                chunk, pending = pending[:self.chunk_ids], pending[self.chunk_ids:]
+                self._process(chunk)
+
+    def _process(self, ids):
+        try:
+            import backfill_geocoding
+
+            logging.info(f"Triggering Target ETL for {len(ids)} rows...")
+            backfill_geocoding.geocode_and_update('DailyBulletinArrests', 'id', 'location', 'event_time', target_ids=ids)
+        except Exception as e:
+            logging.error(f"Inline ETL Failed for {len(ids)} rows: {e}")
+
+uploader = None # BulletinUploader, created in main
+etl = None # BulletinETL, created in main
+
+def event_time_for(raw_time):
+    """event_time computed at ingest, so new rows need no time-parsing round-trip."""
+    event_time = parse_time_with_regex(raw_time)
+    return event_time.isoformat() if event_time else UNPARSEABLE_EVENT_TIME
+
 def daterange(start_date, end_date):
     for n in range(int((end_date - start_date).days) + 1):
         yield start_date + timedelta(n)
 
 def process_day(current_date, valid_proxies):
-    global total_inserted, total_skipped
+    global total_skipped
     date_str = current_date.strftime("%m/%d/%Y")
+    date_key = current_date.strftime("%Y-%m-%d")
+
+    # Settled days only need an occasional re-check
+    state = get_day_state().get(date_key)
+    if state and not FORCE_REFETCH and is_closed_day(current_date):
+        age_hours = (time.time() - state["fetched_at"]) / 3600
+        if age_hours < REFETCH_CLOSED_HOURS:
+            logging.info(f"Skipping {date_str}: closed day, fetched {age_hours:.1f}h ago ({state['rows']} rows).")
+            return
     
     # Try multiple attempts to handle "All proxies dead" scenario
     MAX_DAY_RETRIES = 5
@@ -231,9 +428,8 @@ def process_day(current_date, valid_proxies):
         # Process Types (Empty string = ALL)
         REPORT_TYPES = [''] 
         day_success = True
-        daily_inserted = 0
-        daily_skipped = 0
-        daily_ids = []
+        day_batches = [] # Handed to the uploader only once the whole day is fetched and known to have changed
+        parse_skipped = 0
 
         for report_type in REPORT_TYPES:
             if not init_session_form(session, current_date, report_type, current_user_agent, proxy_in_use):
@@ -301,7 +497,8 @@ def process_day(current_date, valid_proxies):
                             "lastname": record.get("lastname"),
                             "firstname": record.get("firstname"),
                             "charge": record.get("charge"),
-                            "middlename": record.get("middlename")
+                            "middlename": record.get("middlename"),
+                            "event_time": event_time_for(record.get("time"))
                         }
                         batch_dto.append(dto)
                         
@@ -310,48 +507,30 @@ def process_day(current_date, valid_proxies):
                         
                     except Exception as e:
                         logging.warning(f"Error parsing record: {e}")
-                        daily_skipped += 1
+                        parse_skipped += 1
 
                 if batch_dto:
-                    try:
-                        api = APIClient()
-                        res = api.post_ingestion("daily-bulletin/batch", batch_dto)
-                        daily_inserted += res.get('inserted', 0)
-                        daily_skipped += res.get('skipped', 0)
-                        daily_ids.extend(res.get('insertedIds', []))
-                    except Exception as e:
-                        logging.error(f"API Batch Upload Failed: {e}")
-                        day_success = False # Fail day on API error
-                        break
+                    day_batches.append(batch_dto)
                 
                 page_num += 1
                 time.sleep(0.5)
             
             if not day_success: break
-        
+
+        # --- FINGERPRINT CHECK ---
         if day_success:
-            with stats_lock:
-                total_inserted += daily_inserted
-                total_skipped += daily_skipped
-                total_inserted_ids.extend(daily_ids)
-            logging.info(f"Finished {date_str}. Inserted: {daily_inserted}")
-            
-            # --- INLINE POST-PROCESSING ---
-            if daily_ids:
-                try:
-                    import os, sys
-                    etl_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ETL')
-                    if etl_path not in sys.path: sys.path.append(etl_path)
-                    
-                    import UpdateDAB_TimetoEventTime
-                    import backfill_geocoding
-                    
-                    logging.info(f"Triggering Target ETL for {len(daily_ids)} rows...")
-                    UpdateDAB_TimetoEventTime.update_event_time(target_ids=daily_ids)
-                    backfill_geocoding.geocode_and_update('DailyBulletinArrests', 'id', 'location', 'event_time', target_ids=daily_ids)
-                except Exception as e:
-                    logging.error(f"Inline ETL Failed for {date_str}: {e}")
-            # -----------------------------
+            day_dtos = [dto for batch in day_batches for dto in batch]
+            row_count, digest = day_fingerprint([dto["id"] for dto in day_dtos])
+            if state and not FORCE_REFETCH and state["rows"] == row_count and state["hash"] == digest:
+                get_day_state().set(date_key, {"rows": row_count, "hash": digest, "fetched_at": time.time()})
+                if parse_skipped:
+                    with stats_lock:
+                        total_skipped += parse_skipped
+                logging.info(f"Unchanged {date_str} ({row_count} rows). Skipping upload and ETL.")
+                return
+
+            logging.info(f"Fetched {date_str}: {row_count} rows queued for upload.")
+            uploader.submit_day(date_str, date_key, day_dtos, row_count, digest, parse_skipped)
             return
         
         logging.warning(f"Failed processing {date_str}. Retrying...")
@@ -367,6 +546,8 @@ if __name__ == "__main__":
     parser.add_argument("--DAYS_TO_SCRAPE", type=int, default=DEFAULT_DAYS_TO_SCRAPE, help="Number of days to scrape backwards from today")
     parser.add_argument("--MAX_WORKERS", type=int, default=DEFAULT_MAX_WORKERS, help="Number of concurrent worker threads")
     parser.add_argument("--CHUNK_SIZE", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of days per processing batch")
+    parser.add_argument("--UPLOAD_BATCH_ROWS", type=int, default=DEFAULT_UPLOAD_BATCH_ROWS, help="Rows per API upload, coalesced across days")
+    parser.add_argument("--FORCE", action="store_true", help="Ignore stored day fingerprints and re-upload every day")
     parser.add_argument("--LOG_LEVEL", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging verbosity level")
     parser.add_argument("--config", type=str, default="{}", help="JSON config string override")
     args = parser.parse_args()
@@ -378,8 +559,13 @@ if __name__ == "__main__":
     DAYS_TO_SCRAPE = int(config.get("days", args.DAYS_TO_SCRAPE))
     MAX_WORKERS = int(config.get("workers", args.MAX_WORKERS))
     CHUNK_SIZE = int(config.get("chunk_size", args.CHUNK_SIZE))
+    FORCE_REFETCH = bool(config.get("force", args.FORCE))
+    CLOSED_AFTER_DAYS = int(config.get("closed_after_days", DEFAULT_CLOSED_AFTER_DAYS))
+    REFETCH_CLOSED_HOURS = float(config.get("refetch_closed_hours", DEFAULT_REFETCH_CLOSED_HOURS))
+    UPLOAD_BATCH_ROWS = int(config.get("upload_batch_rows", args.UPLOAD_BATCH_ROWS))
 
     logging.info(f"Configuration: Days={DAYS_TO_SCRAPE}, Workers={MAX_WORKERS}, Chunk={CHUNK_SIZE}, Level={args.LOG_LEVEL}")
+    logging.info(f"Incremental: Force={FORCE_REFETCH}, ClosedAfterDays={CLOSED_AFTER_DAYS}, RefetchClosedHours={REFETCH_CLOSED_HOURS}")
 
     # 3. Proxies
     raw_proxies = shared_utils.get_proxies_from_source(config=config)
@@ -393,6 +579,8 @@ if __name__ == "__main__":
     dates = list(daterange(start_date, end_date))
     
     logging.info(f"Scraping range: {dates[0].strftime('%Y-%m-%d')} to {dates[-1].strftime('%Y-%m-%d')}")
+    etl = BulletinETL(int(config.get("etl_chunk_ids", DEFAULT_ETL_CHUNK_IDS)))
+    uploader = BulletinUploader(UPLOAD_BATCH_ROWS)
 
     for i in range(0, len(dates), CHUNK_SIZE):
         chunk = dates[i:i + CHUNK_SIZE]
@@ -402,12 +590,16 @@ if __name__ == "__main__":
         logging.info("Batch complete. Pausing...")
         time.sleep(2)
 
+    # Drain the upload pipeline, then the ETL stage it feeds, before reporting
+    uploader.close()
+    etl.close()
+
     # 5. Summary
     logging.info("="*30)
     logging.info(f"SUMMARY: New={total_inserted}, Skipped={total_skipped}")
     logging.info("="*30)
 
-    # Note: ETL Post-Processing is now executed inline inside process_day() on strictly daily batches.
+    # Note: ETL Post-Processing runs in the run-level BulletinETL stage, fed by the uploader.
     verify_database_state(dates[0], dates[-1])
 
     sys.exit(0)
@@ -10,7 +10,7 @@ import argparse
 import json
 import os
 from datetime import datetime
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from dotenv import load_dotenv
 
 import sys
@@ -18,7 +18,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 import shared_utils
-from shared_utils import status, parse_date, APIClient
+from shared_utils import status, parse_date, APIClient, parse_html, extract_form_state, lxml_document, lxml_text
 import base64
 
 load_dotenv()
@@ -29,24 +29,59 @@ JAIL_PAGE_URL = f"{BASE_URL}/jailinmates.aspx"
 DATA_URL = f"{BASE_URL}/jqHandler.ashx?op=s"
 MUG_URL_TEMPLATE = f"{BASE_URL}/Mug.aspx?Type=4&ImageID={{}}&ss=1"
 
+# Detail page elements
+NAME_ID = 'mainContent_CenterColumnContent_lblName'
+BOND_ID = 'mainContent_CenterColumnContent_lblTotalBoundAmount'
+COURT_DATE_ID = 'mainContent_CenterColumnContent_lblNextCourtDate'
+PHOTO_ID = 'mainContent_CenterColumnContent_imgPhoto'
+LAYOUT_TABLE_IDS = ('classicmenu', 'superfishtb', 'Table1')
+# bs4 fallback: only these subtrees are built
+DETAIL_STRAINER = SoupStrainer(['span', 'img', 'table'])
+
 # --- GLOBAL STATS ---
 total_processed = 0
 total_inserted = 0
 total_updated = 0
 total_released = 0
 total_errors = 0
+total_photos_unchanged = 0
 stats_lock = threading.Lock()
 
+# --- PHOTO INDEX ---
+# "No photo" placeholder image served by Mug.aspx
+PLACEHOLDER_PHOTO_SIZE = 1981
+photo_index = shared_utils.PhotoIndex("jail_photos")
+
 # --- DETAIL FETCHING LOGIC ---
-def get_detail_url(session, record_index, viewstate, viewstategen, eventvalidation):
-    data = {
-        '__VIEWSTATE': viewstate,
-        '__VIEWSTATEGENERATOR': viewstategen,
-        '__EVENTVALIDATION': eventvalidation,
-        'ctl00$MasterPage$mainContent$CenterColumnContent$hfRecordIndex': str(record_index),
-        'ctl00$MasterPage$mainContent$CenterColumnContent$btnInmateDetail': ''
-    }
-    
+class JailFormState:
+    """
+    ASP.NET form state (__VIEWSTATE etc.) of jailinmates.aspx for one session.
+
+    Detail postbacks reuse the cached state instead of re-fetching the page per inmate.
+    When the server rejects a postback (anything but a 302), the state is refreshed from
+    the rejection page if it carries one, else by re-fetching the page.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.fields = {}
+
+    def update(self, html):
+        state = extract_form_state(html)
+        if '__VIEWSTATE' not in state:
+            return False
+        self.fields = state
+        return True
+
+    def refresh(self, timeout=15):
+        resp = self.session.get(JAIL_PAGE_URL, timeout=timeout)
+        return self.update(resp.text)
+
+def get_detail_url(session, record_index, form):
+    """
+    Posts the detail postback with the cached form state and returns the 302 Location.
+    On a rejected postback the form state is refreshed and the postback retried once.
+    """
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded',
         'Referer': JAIL_PAGE_URL,
@@ -54,17 +89,101 @@ def get_detail_url(session, record_index, viewstate, viewstategen, eventvalidati
     }
     
     try:
-        # allow_redirects=False to capture the 302
-        resp = session.post(JAIL_PAGE_URL, data=data, headers=headers, allow_redirects=False, timeout=15)
-        if resp.status_code == 302:
-            return resp.headers.get('Location')
+        for attempt in range(2):
+            data = {
+                '__VIEWSTATE': form.fields.get('__VIEWSTATE', ''),
+                '__VIEWSTATEGENERATOR': form.fields.get('__VIEWSTATEGENERATOR', ''),
+                '__EVENTVALIDATION': form.fields.get('__EVENTVALIDATION', ''),
+                'ctl00$MasterPage$mainContent$CenterColumnContent$hfRecordIndex': str(record_index),
+                'ctl00$MasterPage$mainContent$CenterColumnContent$btnInmateDetail': ''
+            }
+            # allow_redirects=False to capture the 302
+            resp = session.post(JAIL_PAGE_URL, data=data, headers=headers, allow_redirects=False, timeout=15)
+            if resp.status_code == 302:
+                return resp.headers.get('Location')
+
+            # Rejected: stale state. Use the returned page's state if it has one, else re-fetch.
+            if attempt == 0 and not form.update(resp.text) and not form.refresh():
+                break
     except Exception as e:
         pass
     return None
 
-def fetch_inmate_details(session, record_index, viewstate, viewstategen, eventvalidation):
+def charges_from_rows(rows):
+    """
+    rows: one (header_cells, data_cells) pair per <tr> of a table, where header_cells are
+    the texts of the direct td/th children and data_cells those of the direct td children.
+    Returns the charges listed under the Charge / Status / Bond Amount header row.
+    """
+    for r_idx, (cols, _) in enumerate(rows):
+        if len(cols) < 4: continue
+
+        cols_lower = [c.lower() for c in cols]
+        if "charge" in cols_lower and "status" in cols_lower and "bond amount" in cols_lower:
+            charges = []
+            for _, d_cols in rows[r_idx+1:]:
+                if len(d_cols) < 4: continue
+                if "charge" in d_cols[0].lower(): continue
+
+                val0 = d_cols[0].lower()
+                if val0.startswith("name") or val0.startswith("age") or val0.startswith("race"): continue
+
+                charges.append({
+                    'charge': d_cols[0],
+                    'status': d_cols[1],
+                    'docket': d_cols[2],
+                    'bond': d_cols[3]
+                })
+            return charges
+    return []
+
+def parse_detail_lxml(doc):
+    def text_of(element_id):
+        found = doc.xpath('//span[@id=$id]', id=element_id)
+        return lxml_text(found[0]) if found else None
+
+    photo = doc.xpath('//img[@id=$id]', id=PHOTO_ID)
+    mug_url = photo[0].get('src') if photo else None
+
+    charges = []
+    for table in doc.iter('table'):
+        if table.get('id') in LAYOUT_TABLE_IDS:
+            continue
+        rows = []
+        for row in table.iterchildren('tr'):
+            cells = [(cell.tag, lxml_text(cell)) for cell in row.iterchildren('td', 'th')]
+            rows.append(([text for _, text in cells], [text for tag, text in cells if tag == 'td']))
+        charges = charges_from_rows(rows)
+        if charges:
+            break
+
+    return text_of(NAME_ID), text_of(BOND_ID), text_of(COURT_DATE_ID), mug_url, charges
+
+def parse_detail_soup(soup):
+    def text_of(element_id):
+        span = soup.find('span', id=element_id)
+        return span.get_text(strip=True) if span else None
+
+    photo = soup.find('img', id=PHOTO_ID)
+    mug_url = photo.get('src') if photo else None
+
+    charges = []
+    for table in soup.find_all('table'):
+        if table.get('id') in LAYOUT_TABLE_IDS:
+            continue
+        rows = []
+        for row in table.find_all('tr', recursive=False):
+            cells = row.find_all(['td', 'th'], recursive=False)
+            rows.append(([c.get_text(strip=True) for c in cells], [c.get_text(strip=True) for c in cells if c.name == 'td']))
+        charges = charges_from_rows(rows)
+        if charges:
+            break
+
+    return text_of(NAME_ID), text_of(BOND_ID), text_of(COURT_DATE_ID), mug_url, charges
+
+def fetch_inmate_details(session, record_index, form):
     # 1. Get URL
-    location = get_detail_url(session, record_index, viewstate, viewstategen, eventvalidation)
+    location = get_detail_url(session, record_index, form)
     if not location:
         return None, [], None, None, None
         
@@ -72,72 +191,23 @@ def fetch_inmate_details(session, record_index, viewstate, viewstategen, eventva
     
     try:
         resp = session.get(full_url, timeout=15)
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        
-        # 2. Extract Name for Verification
-        detail_name = None
-        name_span = soup.find('span', id='mainContent_CenterColumnContent_lblName')
-        if name_span:
-            detail_name = name_span.get_text(strip=True)
-
-        # 3. Extract Total Bond
-        total_bond = None
-        bond_span = soup.find('span', id='mainContent_CenterColumnContent_lblTotalBoundAmount')
-        if bond_span:
-            total_bond = bond_span.get_text(strip=True)
+
+        # 2. Parse once: lxml tree when available, else a partial BeautifulSoup tree
+        doc = lxml_document(resp.text)
+        if doc is not None:
+            detail_name, total_bond, court_str, mug_url, charges = parse_detail_lxml(doc)
+        else:
+            detail_name, total_bond, court_str, mug_url, charges = parse_detail_soup(parse_html(resp.text, DETAIL_STRAINER))
+
+        # 3. Normalize Total Bond
+        if total_bond is not None:
             if "NO BOND" in total_bond.upper() or "N/A" in total_bond.upper():
                 total_bond = "0.00"
 
-        # 4. Extract Next Court Date
-        next_court_date = None
-        court_span = soup.find('span', id='mainContent_CenterColumnContent_lblNextCourtDate')
-        if court_span:
-            court_str = court_span.get_text(strip=True)
-            if court_str:
-                next_court_date = parse_date(court_str)
-
-        # 3. Extract Mugshot URL
-        mug_url = None
-        mug_img = soup.find('img', id='mainContent_CenterColumnContent_imgPhoto')
-        if mug_img and mug_img.get('src'):
-            mug_url = mug_img.get('src')
-            
-        # 4. Extract Charges
-        charges = []
-        tables = soup.find_all('table')
-        for table in tables:
-            if table.get('id') in ['classicmenu', 'superfishtb', 'Table1']:
-                continue
-                
-            rows = table.find_all('tr', recursive=False)
-            for r_idx, row in enumerate(rows):
-                cols = [c.get_text(strip=True) for c in row.find_all(['td', 'th'], recursive=False)]
-                if not cols: continue
-                if len(cols) < 4: continue
-                
-                cols_lower = [c.lower() for c in cols]
-                if "charge" in cols_lower and "status" in cols_lower and "bond amount" in cols_lower:
-                    for data_row in rows[r_idx+1:]:
-                        d_cols = [c.get_text(strip=True) for c in data_row.find_all('td', recursive=False)]
-                        if len(d_cols) < 4: continue
-                        if "charge" in d_cols[0].lower(): continue
-                        
-                        val0 = d_cols[0].lower()
-                        if val0.startswith("name") or val0.startswith("age") or val0.startswith("race"): continue
-                        
-                        charge_obj = {
-                            'charge': d_cols[0],
-                            'status': d_cols[1],
-                            'docket': d_cols[2],
-                            'bond': d_cols[3]
-                        }
-                        charges.append(charge_obj)
-                    break 
-            
-            if charges:
-                break 
-                
-        return total_bond, charges, mug_url, detail_name, next_court_date
+        # 4. Next Court Date
+        next_court_date = parse_date(court_str) if court_str else None
+
+        return total_bond, charges, mug_url or None, detail_name, next_court_date
         
     except Exception as e:
         return None, [], None, None, None
@@ -148,7 +218,7 @@ def process_batch(batch, valid_proxies):
     """
     Worker function to process a list of inmate records (dicts) in a separate session.
     """
-    global total_processed, total_inserted, total_updated, total_errors, total_released
+    global total_processed, total_inserted, total_updated, total_errors, total_released, total_photos_unchanged
 
     # 1. Setup Session & Init
     initialized = False
@@ -173,18 +243,9 @@ def process_batch(batch, valid_proxies):
             # No, get_resilient_session just checks it. We might need to keep cookies.
             # Safe to redo.
             
-            resp = session.get(JAIL_PAGE_URL, timeout=15)
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            
-            vs_input = soup.find('input', {'name': '__VIEWSTATE'})
-            if not vs_input:
+            form = JailFormState(session)
+            if not form.refresh():
                 continue
-                
-            viewstate = vs_input.get('value', '')
-            viewstategen_input = soup.find('input', {'name': '__VIEWSTATEGENERATOR'})
-            viewstategen = viewstategen_input.get('value', '') if viewstategen_input else ''
-            eventvalidation_input = soup.find('input', {'name': '__EVENTVALIDATION'})
-            eventvalidation = eventvalidation_input.get('value', '') if eventvalidation_input else ''
 
             # Perform Search (Load Grid)
             jq_payload = {
@@ -209,6 +270,7 @@ def process_batch(batch, valid_proxies):
 
     # 2. Process Records - Build Batch for API
     inmates_payload = []
+    photo_entries = {}
     
     for record in batch:
         book_id = record.get('book_id')
@@ -218,27 +280,25 @@ def process_batch(batch, valid_proxies):
         
         if record_index is not None:
             try:
-                # Re-fetch Page for strict ViewState sync
-                resp = session.get(JAIL_PAGE_URL, timeout=10)
-                soup_page = BeautifulSoup(resp.text, 'html.parser')
-                vs_input = soup_page.find('input', {'name': '__VIEWSTATE'})
-                if vs_input:
-                    viewstate = vs_input.get('value', '')
-                    viewstategen = soup_page.find('input', {'name': '__VIEWSTATEGENERATOR'}).get('value', '')
-                    eventvalidation = soup_page.find('input', {'name': '__EVENTVALIDATION'}).get('value', '')
-                    
-                    total_bond, charges, mug_src, detail_name, next_court_date = fetch_inmate_details(session, record_index, viewstate, viewstategen, eventvalidation)
+                # Reuses the session's cached ViewState; refreshed only when a postback is rejected
+                total_bond, charges, mug_src, detail_name, next_court_date = fetch_inmate_details(session, record_index, form)
             except Exception as e:
                 pass
         
-        # Download Photo
+        # Download Photo (conditional; unchanged photos are left out of the payload)
         photo_b64 = None
+        photo_unchanged = False
         if mug_src:
             pk = f"{BASE_URL}/{mug_src}" if not mug_src.startswith("http") else mug_src
             try:
-                p_resp = session.get(pk, headers={"Referer": f"{BASE_URL}/InmateDetail.aspx"}, timeout=10)
-                if p_resp.status_code == 200 and len(p_resp.content) != 1981:
-                    photo_b64 = base64.b64encode(p_resp.content).decode('utf-8')
+                content, photo_unchanged, photo_entry = photo_index.fetch(
+                    session, str(book_id), pk, placeholder_sizes=(PLACEHOLDER_PHOTO_SIZE,),
+                    headers={"Referer": f"{BASE_URL}/InmateDetail.aspx"}, timeout=10
+                )
+                if content:
+                    photo_b64 = base64.b64encode(content).decode('utf-8')
+                if photo_entry:
+                    photo_entries[str(book_id)] = photo_entry
             except: pass
 
         # Construct DTO
@@ -281,6 +341,8 @@ def process_batch(batch, valid_proxies):
             "photo_data": photo_b64,
             "charges": charges_dto
         }
+        if photo_unchanged:
+            del inmate_dto["photo_data"]  # API keeps the stored photo
         inmates_payload.append(inmate_dto)
 
     # API Sync
@@ -290,7 +352,11 @@ def process_batch(batch, valid_proxies):
              # Endpoint expects { inmates: [...] }
              payload = { "inmates": inmates_payload }
              res = client.post_ingestion("jail/sync", payload)
+             # Index photos only once the API has them
+             for key, entry in photo_entries.items():
+                 photo_index.commit(key, entry)
              with stats_lock:
+                 total_photos_unchanged += sum(1 for dto in inmates_payload if "photo_data" not in dto)
                  total_inserted += res.get('inserted', 0)
                  total_updated += res.get('updated', 0)
                  total_released += res.get('released', 0)
@@ -387,6 +453,7 @@ def main():
     print(f"  Total Inserted:  {total_inserted}")
     print(f"  Total Updated:   {total_updated}")
     print(f"  Total Released:  {total_released}")
+    print(f"  Photos Unchanged: {total_photos_unchanged}")
     print(f"  Total Errors:    {total_errors}")
     print("="*30 + "\n")
     
@@ -33,9 +33,51 @@ DETAIL_BASE_URL = "https://www.iowasexoffender.gov/api/registrant/"
 total_inserted = 0
 total_skipped = 0
 total_errors = 0
+total_photos_unchanged = 0
 stats_lock = threading.Lock()
 
-def construct_dto(reg, photo_data=None):
+# Photos the API already has, keyed by registrant_id
+photo_index = shared_utils.PhotoIndex("sex_offender_photos")
+
+# Shared sex-offenders/batch accumulator (created in main)
+batcher = None
+
+# --- Incremental State ---
+# registrant_id -> {"last_changed": iso str or None, "synced_at": float}, written once the API accepts the record.
+# Details are only fetched for registrants that are new or whose listed last_changed moved,
+# except on a full resync (every FULL_RESYNC_HOURS, or forced).
+DEFAULT_FULL_RESYNC_HOURS = 168
+FULL_SYNC_KEY = "_meta:last_full_sync"
+registrant_index = shared_utils.LocalCache("sex_offender_registrants")
+
+def normalize_last_changed(raw):
+    dt = parse_date(raw) if raw else None
+    return dt.isoformat() if dt else None
+
+def needs_detail(registrant_id, listed_last_changed, full_resync):
+    """True if the registrant is new, changed since the last sync, or the run is a full resync."""
+    if full_resync:
+        return True
+    entry = registrant_index.get(registrant_id)
+    if not entry:
+        return True
+    listed = normalize_last_changed(listed_last_changed)
+    # Listing without a usable last_changed: can't tell, so fetch
+    return listed is None or listed != entry.get("last_changed")
+
+def is_full_resync_due(full_resync_hours):
+    last_full = registrant_index.get(FULL_SYNC_KEY)
+    return not last_full or time.time() - last_full >= full_resync_hours * 3600
+
+def find_disappeared(listed_ids):
+    """Indexed registrants missing from a complete listing; they are dropped from the index."""
+    indexed = {key for key, _ in registrant_index.items() if not key.startswith("_meta:")}
+    disappeared = sorted(indexed - set(listed_ids))
+    for registrant_id in disappeared:
+        registrant_index.delete(registrant_id)
+    return disappeared
+
+def construct_dto(reg, photo_data=None, photo_unchanged=False):
     registrant_id = reg.get('registrant')
     if not registrant_id:
         registrant_id = reg.get('registrant_id') or reg.get('id')
@@ -109,8 +151,79 @@ def construct_dto(reg, photo_data=None):
         "alias_list": alias_list,
         "markings": markings
     }
+    if photo_unchanged:
+        del dto["photo_data"]  # API keeps the stored photo
     return dto
 
+# --- SEARCH ---
+SEARCH_PER_PAGE = 100
+SEARCH_PAGE_ATTEMPTS = 10
+DEFAULT_SEARCH_WORKERS = 4
+
+def fetch_search_page(page, proxy_pool, update=False):
+    """
+    Fetches one search results page with a fresh resilient session per attempt.
+    Returns (records, raw_json); raises after SEARCH_PAGE_ATTEMPTS failures.
+    """
+    params = {
+        "countyname": "Dubuque",
+        "per_page": SEARCH_PER_PAGE,
+        "page": page
+    }
+    if update:
+        params["updated"] = "yesterday"
+    query_str = "&".join([f"{k}={v}" for k, v in params.items()])
+    search_url = f"{SEARCH_BASE_URL}?{query_str}"
+
+    last_error = None
+    for attempt in range(SEARCH_PAGE_ATTEMPTS):
+        session, proxy = shared_utils.get_resilient_session(
+            user_agent=None,
+            proxy_pool=proxy_pool,
+            verify=False,
+            test_url=None
+        )
+        if not session:
+            last_error = "no session"
+            status("Search", f"Failed to get session for page {page}. Refreshing proxies...")
+            shared_utils.refresh_proxy_pool(proxy_pool) # Updates the shared pool in place
+            time.sleep(5)
+            continue
+
+        try:
+            resp = session.get(search_url, timeout=20, verify=False)
+            resp.raise_for_status()
+            data = resp.json()
+
+            records = []
+            if isinstance(data, dict):
+                records = data.get('records', [])
+            elif isinstance(data, list):
+                records = data
+            return records, data
+        except Exception as e:
+            last_error = e
+            status("Search", f"Error fetching page {page}: {e}")
+            time.sleep(2)
+
+    raise Exception(f"Search page {page} failed after {SEARCH_PAGE_ATTEMPTS} attempts: {last_error}")
+
+def search_page_count(data, per_page=SEARCH_PER_PAGE):
+    """
+    Total number of result pages from the first response, or None if it doesn't say.
+    Only keys that unambiguously mean the whole result set are trusted; generic ones
+    like 'count' or 'pages' may describe just this page. The caller still confirms the
+    page after the last one is empty before treating the listing as complete.
+    """
+    if not isinstance(data, dict):
+        return None
+    if str(data.get('total_pages', '')).isdigit():
+        return int(data['total_pages'])
+    for key in ('total_records', 'total_count', 'records_total'):
+        if str(data.get(key, '')).isdigit():
+            return max(1, -(-int(data[key]) // per_page))
+    return None
+
 # --- WORKER FUNCTIONS ---
 @shared_utils.get_retry_decorator(max_attempts=6, wait_seconds=1)
 def fetch_registrant_data_with_retry(url, proxy_pool):
@@ -169,24 +282,36 @@ def fetch_and_process_registrant(registrant_id, proxy_pool):
                  with stats_lock: total_errors += 1
                  return
 
-            # Download Photo if URL exists (Best Effort)
+            # Download Photo if URL exists (Best Effort, conditional on what the API already has)
             photo_data = None
+            photo_unchanged = False
+            photo_entry = None
             if data.get('photo'):
                 try:
-                    p_resp = session.get(data['photo'], timeout=10, verify=False)
-                    if p_resp.status_code == 200:
-                        photo_data = p_resp.content
+                    photo_data, photo_unchanged, photo_entry = photo_index.fetch(
+                        session, str(registrant_id), data['photo'], timeout=10, verify=False
+                    )
                 except: pass
 
             # Construct DTO
-            dto = construct_dto(data, photo_data)
-            
-            api = APIClient()
-            payload = { "registrants": [dto] }
-            api.post_ingestion("sex-offenders/batch", payload)
-            
-            with stats_lock:
-                total_inserted += 1
+            dto = construct_dto(data, photo_data, photo_unchanged)
+
+            # Queue for the shared batch post; the outcome is reported per record
+            def on_result(_dto, error):
+                global total_inserted, total_errors, total_photos_unchanged
+                if error:
+                    import logging
+                    logging.error(f"API rejected registrant {registrant_id}: {error}")
+                    with stats_lock: total_errors += 1
+                    return
+                photo_index.commit(str(registrant_id), photo_entry)
+                registrant_index.set(str(registrant_id), {"last_changed": _dto.get("last_changed"), "synced_at": time.time()})
+                with stats_lock:
+                    total_inserted += 1
+                    if photo_unchanged:
+                        total_photos_unchanged += 1
+
+            batcher.add(dto, on_result)
                 
         except json.JSONDecodeError:
             status("Worker", f"Failed to decode JSON for {registrant_id}.")
@@ -207,6 +332,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Iowa Sex Offender Scraper")
     parser.add_argument("--update", action="store_true", help="Fetch only updated records (updated=yesterday)")
     parser.add_argument("--max_workers", type=int, default=10, help="Number of concurrent workers")
+    parser.add_argument("--batch_size", type=int, default=25, help="Registrants per sex-offenders/batch post")
+    parser.add_argument("--search_workers", type=int, default=DEFAULT_SEARCH_WORKERS, help="Concurrent search page fetches")
+    parser.add_argument("--full_resync_hours", type=float, default=DEFAULT_FULL_RESYNC_HOURS, help="Fetch every registrant's details at least this often")
+    parser.add_argument("--full", action="store_true", help="Force a full resync (ignore the local last_changed index)")
     parser.add_argument("--LOG_LEVEL", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging verbosity level")
     parser.add_argument("--config", type=str, default="{}", help="JSON config string override")
     args = parser.parse_args()
@@ -229,6 +358,18 @@ if __name__ == "__main__":
         args.update = True
     if config.get("max_workers"):
         args.max_workers = int(config.get("max_workers"))
+    if config.get("batch_size"):
+        args.batch_size = int(config.get("batch_size"))
+    if config.get("search_workers"):
+        args.search_workers = int(config.get("search_workers"))
+    if config.get("full_resync_hours"):
+        args.full_resync_hours = float(config.get("full_resync_hours"))
+    if config.get("full"):
+        args.full = True
+
+    # --update lists only yesterday's changes: fetch them all, and the listing can't reveal disappearances
+    full_resync = not args.update and (args.full or is_full_resync_due(args.full_resync_hours))
+    status("Main", f"Sync mode: {'update' if args.update else ('full resync' if full_resync else 'incremental')}")
 
     # 2. Get Proxies
     # 2. Get Proxies
@@ -243,84 +384,94 @@ if __name__ == "__main__":
         status("Main", "[FATAL] No valid proxies found. Direct connections are disabled.")
         sys.exit(1)
 
-    # 3. Search Loop
-    all_registrant_ids = set()
-    page = 1
-    
-    status("Main", "Starting Search Loop...")
-    
-    while True:
-        # Get resilient session for search page
-        session, proxy = shared_utils.get_resilient_session(
-            user_agent=None,
-            proxy_pool=valid_proxies,
-            verify=False,
-            test_url=None
-        )
-        
-        if not session:
-            status("Main", "Failed to get session for search page. Retrying/Refreshing...")
-            valid_proxies = shared_utils.refresh_proxy_pool(valid_proxies)
-            time.sleep(5)
-            continue
+    # 3. Search + Detail Fetch
+    # Detail fetches stream as search pages arrive; the API sees batches via the shared batcher.
+    batcher = shared_utils.IngestionBatcher(
+        "sex-offenders/batch", wrap_key="registrants", id_field="registrant_id",
+        max_records=args.batch_size
+    )
+    detail_executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers)
+    detail_futures = []
+    all_registrant_ids = {} # registrant_id -> listed last_changed
 
-        try:
-            params = {
-                "countyname": "Dubuque",
-                "per_page": 100,
-                "page": page
-            }
-            if args.update:
-                params["updated"] = "yesterday"
-                
-            query_str = "&".join([f"{k}={v}" for k, v in params.items()])
-            search_url = f"{SEARCH_BASE_URL}?{query_str}"
-            
-            resp = session.get(search_url, timeout=20, verify=False)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            records = []
-            if isinstance(data, dict):
-                records = data.get('records', [])
-            elif isinstance(data, list):
-                records = data
-            
-            if not records:
+    def queue_details(page, records):
+        """Queues detail fetches for the page's new/changed registrants; returns how many IDs it listed."""
+        count_new = 0
+        for rec in records:
+            reg_id = rec.get('registrant')
+            if not reg_id:
+                continue
+            count_new += 1
+            reg_id = str(reg_id)
+            if reg_id in all_registrant_ids:
+                continue
+            all_registrant_ids[reg_id] = rec.get('last_changed')
+            if needs_detail(reg_id, rec.get('last_changed'), full_resync or args.update):
+                detail_futures.append(detail_executor.submit(fetch_and_process_registrant, reg_id, valid_proxies))
+        status("Search", f"Page {page}: Found {count_new} IDs.")
+        return count_new
+
+    def walk_pages(page):
+        """Fetches pages one by one from `page` until one comes back empty."""
+        while True:
+            records, _ = fetch_search_page(page, valid_proxies, args.update)
+            if not records or queue_details(page, records) == 0:
                 status("Search", "No more records found. Stopping search.")
-                break
-                
-            count_new = 0
-            for rec in records:
-                reg_id = rec.get('registrant')
-                if reg_id:
-                    all_registrant_ids.add(str(reg_id))
-                    count_new += 1
-            
-            status("Search", f"Page {page}: Found {count_new} IDs.")
-            
-            if count_new == 0:
-                break 
-                
+                return
             page += 1
-            time.sleep(1) 
-            
-        except Exception as e:
-            status("Search", f"Error fetching page {page}: {e}")
-            time.sleep(2)
-            # Loop continues, getting new session next time
-            continue
+
+    status("Main", "Starting Search...")
+    search_complete = True
+    try:
+        records, first_data = fetch_search_page(1, valid_proxies, args.update)
+        pages = search_page_count(first_data)
+
+        if not records or queue_details(1, records) == 0:
+            status("Search", "No more records found. Stopping search.")
+        elif pages is not None:
+            # Page count known: fan out the remaining pages
+            status("Search", f"{pages} pages reported; fetching with {args.search_workers} workers.")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=args.search_workers) as search_executor:
+                page_futures = {
+                    search_executor.submit(fetch_search_page, page, valid_proxies, args.update): page
+                    for page in range(2, pages + 1)
+                }
+                for future in concurrent.futures.as_completed(page_futures):
+                    try:
+                        queue_details(page_futures[future], future.result()[0])
+                    except Exception as e:
+                        status("Search", str(e))
+                        search_complete = False
+            # Only an empty page after the reported last one proves the listing is complete;
+            # if the count was off, keep walking from there
+            walk_pages(pages + 1)
+        else:
+            # No page count in the response: walk pages until one comes back empty
+            walk_pages(2)
+    except Exception as e:
+        status("Search", str(e))
+        search_complete = False
 
     status("Main", f"Total unique Registrant IDs found: {len(all_registrant_ids)}")
+    if not search_complete:
+        status("Main", "WARNING: Search incomplete; skipping disappearance check.")
 
-    # 4. Detail Fetch Loop
-    status("Main", "Starting Detail Fetch & Insert...")
-    
-    registrant_list = list(all_registrant_ids)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-        futures = [executor.submit(fetch_and_process_registrant, rid, valid_proxies) for rid in registrant_list]
-        concurrent.futures.wait(futures)
+    # Registrants no longer listed (only a complete listing can tell)
+    disappeared = []
+    if not args.update and search_complete:
+        disappeared = find_disappeared(all_registrant_ids)
+        if disappeared:
+            status("Main", f"{len(disappeared)} registrants no longer listed: {', '.join(disappeared[:50])}{' ...' if len(disappeared) > 50 else ''}")
+
+    total_unchanged = len(all_registrant_ids) - len(detail_futures)
+    status("Main", f"Waiting on {len(detail_futures)} detail fetches ({total_unchanged} unchanged)...")
+    concurrent.futures.wait(detail_futures)
+    detail_executor.shutdown()
+
+    batcher.close()
+    status("Main", f"API batches: {batcher.stats}")
+    if full_resync and search_complete:
+        registrant_index.set(FULL_SYNC_KEY, time.time())
 
     status("Main", "Job Complete.")
     print("\n" + "="*30)
@@ -328,6 +479,9 @@ if __name__ == "__main__":
     print("="*30)
     print(f"  Total Records Inserted/Updated: {total_inserted}")
     print(f"  Total Skipped (404/Empty):      {total_skipped}")
+    print(f"  Unchanged (not re-fetched):     {total_unchanged}")
+    print(f"  No Longer Listed:               {len(disappeared)}")
+    print(f"  Photos Unchanged (not re-sent): {total_photos_unchanged}")
     print(f"  Total Errors:                   {total_errors}")
     print("="*30 + "\n")
     
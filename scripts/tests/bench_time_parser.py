@@ -0,0 +1,111 @@
+import sys
+import os
+import re
+import random
+import time
+from datetime import datetime
+
+# Benchmarks the compiled event_time parser against the original strptime loop
+# on a corpus shaped like real Daily Bulletin time strings, and checks both agree.
+# Usage: python scripts/tests/bench_time_parser.py [corpus_size]
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ETL"))
+from UpdateDAB_TimetoEventTime import TIME_FORMATS, parse_time_with_regex
+
+# --- Reference implementation (pre-compiled-pattern version) ---
+
+def legacy_try_parse_formats(date_string):
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(date_string, fmt)
+        except ValueError:
+            continue
+    return None
+
+def legacy_parse_time(time_str):
+    if not time_str:
+        return None
+    match = re.search(r"Reported:\s*(.+?)\.", time_str)
+    if match:
+        dt = legacy_try_parse_formats(match.group(1).strip())
+        if dt:
+            return dt
+    match = re.search(r"and\s+(.+?)\.", time_str)
+    if match:
+        dt = legacy_try_parse_formats(match.group(1).strip())
+        if dt:
+            return dt
+    match = re.search(r"on\s+(.+?)\.", time_str)
+    if match:
+        dt = legacy_try_parse_formats(match.group(1).strip())
+        if dt:
+            return dt
+    match = re.search(r"On\s+(.+?)\s+at\s+(.+?)(?:\.|$)", time_str, re.IGNORECASE)
+    if match:
+        dt = legacy_try_parse_formats(f"{match.group(1).strip()} {match.group(2).strip()}")
+        if dt:
+            return dt
+    return None
+
+# --- Corpus ---
+
+def build_corpus(size, seed=42):
+    rng = random.Random(seed)
+
+    def stamp():
+        dt = datetime(2025, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+        shape = rng.random()
+        if shape < 0.5:
+            return dt.strftime("%m/%d/%Y %I:%M %p").lstrip("0")
+        if shape < 0.7:
+            return dt.strftime("%m/%d/%Y %H:%M:%S")
+        if shape < 0.85:
+            return dt.strftime("%I:%M %p, %m/%d/%Y")
+        if shape < 0.95:
+            return dt.strftime("%m/%d/%Y %H:%M")
+        return dt.strftime("%m/%d/%Y")
+
+    templates = [
+        lambda: f"Occurred on {stamp()}. Reported: {stamp()}.",
+        lambda: f"Occurred between {stamp()} and {stamp()}. Reported: {stamp()}.",
+        lambda: f"Reported: {stamp()}.",
+        lambda: f"Arrested on {stamp()}.",
+        lambda: f"On {stamp().split(' ')[0]} at {datetime(2025, 1, 1, rng.randint(0, 23), rng.randint(0, 59)).strftime('%I:%M %p')}",
+        lambda: "Time not available",
+    ]
+    # Real pages repeat the same handful of timestamps across many rows
+    unique = [rng.choice(templates)() for _ in range(max(size // 4, 1))]
+    return [rng.choice(unique) for _ in range(size)]
+
+# --- Bench ---
+
+def timed(fn, corpus):
+    start = time.perf_counter()
+    results = [fn(s) for s in corpus]
+    return time.perf_counter() - start, results
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    corpus = build_corpus(size)
+    print(f"Corpus: {len(corpus)} strings ({len(set(corpus))} unique)")
+
+    legacy_s, expected = timed(legacy_parse_time, corpus)
+
+    parse_time_with_regex.cache_clear()
+    uncached_s, _ = timed(parse_time_with_regex.__wrapped__, corpus)
+
+    parse_time_with_regex.cache_clear()
+    memo_s, actual = timed(parse_time_with_regex, corpus)
+
+    mismatches = [s for s, a, b in zip(corpus, expected, actual) if a != b]
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} mismatches, e.g. {mismatches[:3]}")
+        sys.exit(1)
+
+    print(f"strptime loop:       {legacy_s:.3f}s")
+    print(f"compiled (uncached): {uncached_s:.3f}s  ({legacy_s / uncached_s:.1f}x)")
+    print(f"compiled (memoized): {memo_s:.3f}s  ({legacy_s / memo_s:.1f}x)")
+    print("Results identical.")
+
+if __name__ == "__main__":
+    main()
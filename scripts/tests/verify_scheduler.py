@@ -0,0 +1,121 @@
+import sys
+import os
+import asyncio
+import heapq
+import sqlite3
+import time
+from datetime import datetime
+
+# Checks TaskScheduler's lazy heap invalidation against an in-memory task table:
+# a task that is removed and re-added (or disabled and reloaded) must fire once per due time,
+# not once per heap entry left over from before.
+# Usage: python scripts/tests/verify_scheduler.py
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import orchestrator.scheduler as scheduler_module
+from orchestrator.scheduler import TaskScheduler
+
+INTERVAL = 60.0
+
+
+class FakeScheduler(TaskScheduler):
+    """
+    TaskScheduler on an in-memory orchestrator_tasks table. _trigger only records the
+    firing and reschedules the entry one interval after the simulated clock, like the real one.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute("CREATE TABLE orchestrator_tasks (task_id INTEGER PRIMARY KEY, enabled INTEGER, next_run DATETIME)")
+        scheduler_module.get_db_connection = lambda: self.db
+        scheduler_module.return_db_connection = lambda conn: None
+        self.clock = time.time()
+        self.fired = []
+
+    def set_task(self, task_id, next_run_ts, enabled=True):
+        self.db.execute("INSERT OR REPLACE INTO orchestrator_tasks VALUES (?, ?, ?)",
+                        (task_id, int(enabled), datetime.fromtimestamp(next_run_ts).isoformat()))
+        self.db.commit()
+
+    def _trigger(self, task_id, version):
+        self.fired.append(task_id)
+        heapq.heappush(self._heap, (self.clock + INTERVAL, task_id, version))
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def due_firings(scheduler, task_id, now):
+    scheduler.clock = now
+    scheduler.fired.clear()
+    scheduler._drop_stale()
+    scheduler._fire_due(now)
+    return scheduler.fired.count(task_id)
+
+
+async def test_remove_then_readd_fires_once():
+    scheduler = FakeScheduler()
+    scheduler._wakeup = asyncio.Event()
+    now = time.time()
+
+    scheduler._schedule(1, now - 5)
+    scheduler._schedule(1, None)       # Task removed / disabled
+    scheduler._schedule(1, now - 1)    # Re-added
+    check(due_firings(scheduler, 1, now) == 1, "re-added task fired more than once")
+
+    # Next interval: only the entry pushed by the single firing may remain
+    check(due_firings(scheduler, 1, now + INTERVAL + 1) == 1, "re-added task fired more than once in the next interval")
+
+
+async def test_readd_after_resync_fires_once():
+    scheduler = FakeScheduler()
+    scheduler._wakeup = asyncio.Event()
+    now = time.time()
+
+    scheduler.set_task(1, now - 1)
+    scheduler._load_all()
+    scheduler._schedule(1, None)
+    scheduler._schedule(1, now - 1)
+    check(due_firings(scheduler, 1, now) == 1, "task re-added after a resync fired more than once")
+
+    # Disabled in the DB, resynced, then enabled again
+    scheduler.set_task(1, now + INTERVAL + 1, enabled=False)
+    scheduler._load_all()
+    scheduler.set_task(1, now + INTERVAL + 1)
+    scheduler._schedule(1, now + INTERVAL + 1)
+    check(due_firings(scheduler, 1, now + INTERVAL + 2) == 1, "task re-enabled after a resync fired more than once")
+
+
+async def test_removed_task_does_not_fire():
+    scheduler = FakeScheduler()
+    scheduler._wakeup = asyncio.Event()
+    now = time.time()
+
+    scheduler._schedule(2, now - 1)
+    scheduler._schedule(2, None)
+    check(due_firings(scheduler, 2, now) == 0, "removed task still fired")
+
+
+def main():
+    tests = [
+        test_remove_then_readd_fires_once,
+        test_readd_after_resync_fires_once,
+        test_removed_task_does_not_fire,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            asyncio.run(test())
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print(f"All {len(tests)} checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import sys
+import os
+import threading
+import time
+
+# Exercises shared_utils.AuthSessionPool with a fake handshake (no network):
+# start(min_ready), fail() -> retire/cooldown/refill, max_age expiry, health checks,
+# proxy top-up through refresh(), and close() while leases are out.
+# Usage: python scripts/tests/verify_session_pool.py
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from shared_utils import AuthSessionPool
+
+PROXIES = [f"10.0.0.{i}:8080" for i in range(1, 21)]
+
+
+class FakeSession:
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAuth:
+    """Handshake stub: optional delay, and proxies listed in `broken` always fail."""
+
+    def __init__(self, delay=0.0, broken=()):
+        self.delay = delay
+        self.broken = set(broken)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, proxy):
+        with self.lock:
+            self.calls.append(proxy)
+        time.sleep(self.delay)
+        if proxy in self.broken:
+            raise RuntimeError(f"handshake via {proxy} failed")
+        return FakeSession(proxy)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def test_start_min_ready():
+    auth = FakeAuth(delay=0.05, broken=PROXIES[:3])
+    pool = AuthSessionPool(auth, PROXIES, size=8, auth_workers=8)
+    try:
+        ready = pool.start(min_ready=4, timeout=5)
+        check(ready >= 4, f"start() returned {ready} ready sessions, expected >= 4")
+        check(wait_for(lambda: pool.ready_count() == 8), "pool did not fill to size in the background")
+        check(pool.stats["auth_failed"] == len(auth.broken.intersection(auth.calls)), "failed handshakes miscounted")
+        bound = {entry.proxy for entry in pool._idle}
+        check(len(bound) == 8 and not bound & auth.broken, "sessions must use distinct, working proxies")
+    finally:
+        pool.close()
+
+
+def test_start_gives_up_without_proxies():
+    pool = AuthSessionPool(FakeAuth(broken=PROXIES[:2]), PROXIES[:2], size=4)
+    try:
+        started = time.monotonic()
+        ready = pool.start(min_ready=2, timeout=10)
+        check(ready == 0, f"expected 0 ready sessions, got {ready}")
+        check(time.monotonic() - started < 5, "start() should return once every proxy has failed")
+    finally:
+        pool.close()
+
+
+def test_fail_retires_and_refills():
+    auth = FakeAuth()
+    pool = AuthSessionPool(auth, PROXIES[:6], size=3, proxy_cooldown=60)
+    try:
+        pool.start(timeout=5)
+        with pool.lease() as leased:
+            bad_proxy = leased.proxy
+            bad_session = leased.session
+            leased.fail()
+        check(bad_session.closed, "failed session was not closed")
+        check(pool.stats["retired"] == 1, "failed lease was not counted as retired")
+        check(wait_for(lambda: pool.ready_count() == 3), "pool did not refill after a failed lease")
+        live = {entry.proxy for entry in pool._idle}
+        check(bad_proxy not in live, "retired proxy was reused during its cooldown")
+        check(bad_proxy in pool._cooldown, "retired proxy was not put on cooldown")
+    finally:
+        pool.close()
+
+
+def test_max_age_expiry():
+    auth = FakeAuth()
+    pool = AuthSessionPool(auth, PROXIES[:6], size=2, max_age=0.2)
+    try:
+        pool.start(timeout=5)
+        leased = pool.acquire()
+        old_session = leased.session
+        time.sleep(0.3)
+        pool.release(leased)
+        check(old_session.closed, "expired session was not closed on release")
+        check(pool.stats["expired"] >= 1, "expiry on release was not counted")
+        check(pool.proxy_pool and wait_for(lambda: pool.ready_count() == 2), "pool did not replace the expired session")
+        # Idle sessions expire through the maintainer thread (5 s tick)
+        check(wait_for(lambda: pool.stats["expired"] >= 3, timeout=8), "maintainer did not expire idle sessions")
+    finally:
+        pool.close()
+
+
+def test_health_check_retires_unhealthy():
+    unhealthy = set()
+    pool = AuthSessionPool(FakeAuth(), PROXIES[:6], size=2, check=lambda session, proxy: proxy not in unhealthy,
+                           check_interval=0.1, proxy_cooldown=60)
+    try:
+        pool.start(timeout=5)
+        unhealthy.update(entry.proxy for entry in list(pool._idle))
+        check(wait_for(lambda: pool.stats["health_failed"] >= 2, timeout=8), "unhealthy idle sessions were not retired")
+        check(wait_for(lambda: pool.ready_count() == 2), "pool did not refill after health-check failures")
+        check(not {entry.proxy for entry in pool._idle} & unhealthy, "unhealthy proxies are still in the pool")
+    finally:
+        pool.close()
+
+
+def test_refresh_tops_up_proxies():
+    spare = PROXIES[10:14]
+    refreshed = []
+
+    def refresh(current):
+        refreshed.append(list(current))
+        return spare
+
+    pool = AuthSessionPool(FakeAuth(), PROXIES[:2], size=3, refresh=refresh, refresh_interval=60)
+    try:
+        ready = pool.start(min_ready=3, timeout=5)
+        check(ready == 3, f"expected 3 ready sessions after top-up, got {ready}")
+        check(len(refreshed) == 1 and refreshed[0] == PROXIES[:2], "refresh() should run once, with the current proxies")
+        check(pool.stats["proxies_added"] == len(spare), "new proxies were not added to the pool")
+    finally:
+        pool.close()
+
+
+def test_close_with_leases_out():
+    pool = AuthSessionPool(FakeAuth(), PROXIES[:6], size=3)
+    pool.start(timeout=5)
+    held = [pool.acquire(), pool.acquire()]
+    idle_sessions = [entry.session for entry in pool._idle]
+    pool.close()
+
+    check(idle_sessions and all(session.closed for session in idle_sessions), "idle sessions were not closed")
+    for entry in held:
+        pool.release(entry)
+    check(all(entry.session.closed for entry in held), "sessions released after close() were not closed")
+    check(pool.ready_count() == 0, "released sessions went back into a closed pool")
+    try:
+        pool.acquire(timeout=1)
+        check(False, "acquire() on a closed pool should raise")
+    except RuntimeError:
+        pass
+
+
+def test_close_wakes_blocked_acquire():
+    pool = AuthSessionPool(FakeAuth(), PROXIES[:2], size=2)
+    pool.start(timeout=5)
+    held = [pool.acquire(), pool.acquire()]
+    errors = []
+
+    def waiter():
+        try:
+            pool.acquire(timeout=5)
+        except RuntimeError:
+            errors.append("closed")
+        except TimeoutError:
+            errors.append("timeout")
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.1)
+    pool.close()
+    thread.join(timeout=5)
+    for entry in held:
+        pool.release(entry)
+
+    check(not thread.is_alive(), "acquire() kept blocking after close()")
+    check(errors == ["closed"], f"blocked acquire() should raise RuntimeError on close, got {errors}")
+
+
+def main():
+    tests = [
+        test_start_min_ready,
+        test_start_gives_up_without_proxies,
+        test_fail_retires_and_refills,
+        test_max_age_expiry,
+        test_health_check_retires_unhealthy,
+        test_refresh_tops_up_proxies,
+        test_close_with_leases_out,
+        test_close_wakes_blocked_acquire,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print(f"All {len(tests)} checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import pyodbc
 import os
 import glob
 import json
+import time
+import argparse
 from shared_utils import status
 from orchestrator.db import get_db_connection
 
@@ -41,7 +43,45 @@ def scan_for_scripts(root_dir="."):
         scripts.append((filename.replace('.py', ''), rel_path, default_config))
     return scripts
 
-def create_tables(scan_dir="."):
+def ensure_column(cursor, table, column, definition):
+    """Adds a column to an existing table if it is missing (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        status("DB Setup", f"Added column {table}.{column}.")
+
+def ensure_incremental_vacuum(cursor, convert_existing=False):
+    """
+    Switches the DB to auto_vacuum=INCREMENTAL so the retention worker can return
+    freed pages to the OS. The switch takes a VACUUM (the connection is already in WAL
+    mode), which is instant on a new, empty database. On an existing one it rewrites the
+    whole file (about 2x its size in free disk) and blocks writers, so that only runs as
+    an explicit one-off step:
+        python setup_orchestrator_db.py --enable-incremental-vacuum
+    """
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] == 2:
+        return
+
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+    is_new = cursor.fetchone()[0] == 0
+    if not is_new and not convert_existing:
+        status("DB Setup", "auto_vacuum is not INCREMENTAL, so freed log pages are not returned to the OS. "
+                           "Stop the orchestrator and run `python setup_orchestrator_db.py --enable-incremental-vacuum` once to convert.")
+        return
+
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if is_new:
+        cursor.execute("VACUUM")
+        status("DB Setup", "Enabled incremental auto-vacuum.")
+        return
+
+    status("DB Setup", "Converting to incremental auto-vacuum (full VACUUM, this can take several minutes)...")
+    start = time.monotonic()
+    cursor.execute("VACUUM")
+    status("DB Setup", f"Enabled incremental auto-vacuum (VACUUM took {time.monotonic() - start:.1f}s).")
+
+def create_tables(scan_dir=".", convert_auto_vacuum=False):
     conn = get_db_connection()
     if not conn:
         status("DB Setup", "Failed to connect to DB.")
@@ -71,6 +111,7 @@ def create_tables(scan_dir="."):
             last_run DATETIME NULL,
             next_run DATETIME NULL,
             enabled INTEGER DEFAULT 1,
+            skip_if_running INTEGER DEFAULT 1,
             FOREIGN KEY(job_id) REFERENCES orchestrator_jobs(job_id)
         )
         """,
@@ -80,7 +121,7 @@ def create_tables(scan_dir="."):
             job_id INTEGER NOT NULL,
             start_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
             end_time DATETIME NULL,
-            status TEXT NOT NULL, -- 'RUNNING', 'SUCCESS', 'FAILURE'
+            status TEXT NOT NULL, -- 'QUEUED', 'RUNNING', 'SUCCESS', 'FAILURE', 'CANCELLED'
             exit_code INTEGER NULL,
             FOREIGN KEY(job_id) REFERENCES orchestrator_jobs(job_id)
         )
@@ -95,6 +136,23 @@ def create_tables(scan_dir="."):
         )
         """,
         """
+        CREATE TABLE IF NOT EXISTS orchestrator_log_archive (
+            run_id INTEGER PRIMARY KEY,
+            codec TEXT NOT NULL, -- 'zstd' or 'gzip'
+            line_count INTEGER NOT NULL,
+            first_log_id INTEGER NOT NULL,
+            last_log_id INTEGER NOT NULL,
+            data BLOB NOT NULL, -- newline-separated JSON [log_id, log_text, created_at]
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS orchestrator_pruned_runs (
+            run_id INTEGER PRIMARY KEY, -- Pruned from orchestrator_history; logs not yet deleted
+            pruned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
         CREATE TABLE IF NOT EXISTS orchestrator_config (
             config_key TEXT PRIMARY KEY,
             config_value TEXT NOT NULL,
@@ -103,9 +161,24 @@ def create_tables(scan_dir="."):
         """
     ]
 
+    indexes_sql = [
+        "CREATE INDEX IF NOT EXISTS idx_logs_run_log ON orchestrator_logs(run_id, log_id)",
+        "CREATE INDEX IF NOT EXISTS idx_history_job_start ON orchestrator_history(job_id, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_history_start ON orchestrator_history(start_time)"
+    ]
+
     try:
+        ensure_incremental_vacuum(cursor, convert_existing=convert_auto_vacuum)
+
         for i, sql in enumerate(tables_sql):
             cursor.execute(sql)
+
+        # Column migrations for databases created by older versions
+        ensure_column(cursor, "orchestrator_tasks", "skip_if_running", "INTEGER DEFAULT 1")
+
+        # Indexes for keyset pagination (/api/logs, /api/history) and per-job history cleanup
+        for sql in indexes_sql:
+            cursor.execute(sql)
         
         status("DB Setup", "Tables verified.")
         
@@ -134,12 +207,41 @@ def create_tables(scan_dir="."):
                 "ttl": int(os.environ.get("PROXY_TTL", 600)),
                 "test_url": os.environ.get("PROXY_TEST_URL", "http://p2c.cityofdubuque.org/main.aspx"),
                 "target_pool_size": int(os.environ.get("PROXY_TARGET_POOL_SIZE", 100)),
+                "probe_method": os.environ.get("PROXY_PROBE_METHOD", "partial"),
+                "probe_bytes": int(os.environ.get("PROXY_PROBE_BYTES", 2048)),
                 "sources": [s.strip() for s in os.environ.get("PROXY_SOURCES", "https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/protocols/http/data.txt").split(",")]
             }
             cursor.execute("INSERT INTO orchestrator_config (config_key, config_value) VALUES (?, ?)", 
                            ("proxy_manager_config", json.dumps(default_config)))
             status("DB Setup", "Seeded default proxy_manager_config.")
 
+        # Seed initial Job Runner (admission control) Config
+        cursor.execute("SELECT 1 FROM orchestrator_config WHERE config_key = 'job_runner_config'")
+        if not cursor.fetchone():
+            default_config = {
+                "max_concurrent_runs": int(os.environ.get("JOB_MAX_CONCURRENT_RUNS", 4)),
+                "max_runs_per_job": int(os.environ.get("JOB_MAX_RUNS_PER_JOB", 1)),
+                "job_limits": {}
+            }
+            cursor.execute("INSERT INTO orchestrator_config (config_key, config_value) VALUES (?, ?)",
+                           ("job_runner_config", json.dumps(default_config)))
+            status("DB Setup", "Seeded default job_runner_config.")
+
+        # Seed initial Log Retention Config
+        cursor.execute("SELECT 1 FROM orchestrator_config WHERE config_key = 'retention_config'")
+        if not cursor.fetchone():
+            default_config = {
+                "interval_seconds": int(os.environ.get("LOG_RETENTION_INTERVAL", 300)),
+                "delete_batch_size": 5000,
+                "compress_enabled": os.environ.get("LOG_COMPRESS_ENABLED", "1") == "1",
+                "compress_after_hours": int(os.environ.get("LOG_COMPRESS_AFTER_HOURS", 24)),
+                "compress_runs_per_cycle": 20,
+                "vacuum_pages": 2000
+            }
+            cursor.execute("INSERT INTO orchestrator_config (config_key, config_value) VALUES (?, ?)",
+                           ("retention_config", json.dumps(default_config)))
+            status("DB Setup", "Seeded default retention_config.")
+
         conn.commit()
         status("DB Setup", "Database setup complete.")
         
@@ -150,4 +252,8 @@ def create_tables(scan_dir="."):
         conn.close()
 
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Create or migrate the orchestrator database")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="One-off: convert an existing DB to auto_vacuum=INCREMENTAL (runs a full VACUUM; stop the orchestrator first)")
+    args = parser.parse_args()
+    create_tables(convert_auto_vacuum=args.enable_incremental_vacuum)
@@ -8,7 +8,15 @@ from requests.adapters import HTTPAdapter
 import concurrent.futures
 import argparse
 import json
+import hashlib
+import sqlite3
+import queue
+import atexit
+import contextlib
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
+from functools import lru_cache
 from threading import Lock
 from typing import List, Dict, Any, Optional, Union, Tuple
 from dotenv import load_dotenv
@@ -96,16 +104,529 @@ class APIClient:
         """Performs a POST request to the specified endpoint."""
         return self._request("POST", endpoint, json=data)
 
+class IngestionBatcher:
+    """
+    Thread-safe accumulator for an ingestion batch endpoint, shared by all worker threads.
+
+    add() queues one record; a daemon thread posts a batch once it holds max_records
+    records, max_bytes of JSON, or its oldest record has waited max_wait seconds.
+    Each record's on_result(record, error) callback runs after its batch: error is None
+    on success, else a message. Per-record failures are read from the batch response
+    (an "errors"/"failed" list of {index | <id_field>, error} entries or bare ids).
+    If the API rejects the whole post (a 4xx or a record that can't be serialised), the
+    batch is re-sent one record at a time so a single bad record does not fail the others.
+    Connection errors, timeouts and 5xx responses fail the whole batch without re-sending,
+    since the records aren't at fault. The queue is bounded: add() blocks when posting falls behind.
+    """
+
+    def __init__(self, endpoint: str, wrap_key: Optional[str] = None, id_field: Optional[str] = None,
+                 max_records: int = 50, max_bytes: int = 4_000_000, max_wait: float = 2.0,
+                 max_queue: int = 500) -> None:
+        self.endpoint = endpoint
+        self.wrap_key = wrap_key
+        self.id_field = id_field
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.stats: Dict[str, int] = {"batches": 0, "records": 0, "failed": 0, "single_posts": 0}
+        self._client = APIClient()
+        self._queue: "queue.Queue[Optional[Tuple[Any, int, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="IngestionBatcher", daemon=True)
+        self._thread.start()
+
+    def add(self, record: Any, on_result: Optional[Any] = None) -> None:
+        size = len(json.dumps(record, default=str))
+        self._queue.put((record, size, on_result))
+
+    def close(self) -> None:
+        """Posts everything still queued, then stops the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        batch: List[Tuple[Any, int, Any]] = []
+        batch_bytes = 0
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0.01) if deadline else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                self._post(batch)
+                return
+            if item:
+                # A record that would push the batch past max_bytes goes into the next one
+                if batch and batch_bytes + item[1] > self.max_bytes:
+                    self._post(batch)
+                    batch, batch_bytes = [], 0
+                if not batch:
+                    deadline = time.monotonic() + self.max_wait
+                batch.append(item)
+                batch_bytes += item[1]
+
+            if batch and (len(batch) >= self.max_records or batch_bytes >= self.max_bytes
+                          or time.monotonic() >= deadline):
+                self._post(batch)
+                batch, batch_bytes, deadline = [], 0, None
+
+    def _payload(self, records: List[Any]) -> Any:
+        return {self.wrap_key: records} if self.wrap_key else records
+
+    def _post(self, batch: List[Tuple[Any, int, Any]]) -> None:
+        if not batch:
+            return
+        records = [record for record, _, _ in batch]
+        try:
+            res = self._client.post_ingestion(self.endpoint, self._payload(records))
+        except Exception as e:
+            if len(batch) == 1:
+                self._report(batch, {0: str(e)})
+                return
+            if not self._payload_error(e):
+                logging.warning(f"[IngestionBatcher] {self.endpoint} batch of {len(batch)} failed ({e})")
+                self._report(batch, {i: str(e) for i in range(len(batch))})
+                return
+            logging.warning(f"[IngestionBatcher] {self.endpoint} batch of {len(batch)} rejected ({e}); retrying per record")
+            for entry in batch:
+                self.stats["single_posts"] += 1
+                self._post([entry])
+            return
+
+        self.stats["batches"] += 1
+        self._report(batch, self._record_errors(res, records))
+
+    @staticmethod
+    def _payload_error(e: Exception) -> bool:
+        """True if the failure is down to the records themselves rather than the connection or server."""
+        if isinstance(e, requests.HTTPError):
+            code = e.response.status_code if e.response is not None else None
+            return code is not None and 400 <= code < 500 and code not in (408, 429)
+        # Connection errors, timeouts and unreadable responses; anything else failed before sending
+        return not isinstance(e, requests.RequestException)
+
+    def _record_errors(self, res: Any, records: List[Any]) -> Dict[int, str]:
+        """Maps the response's per-record failures back to batch positions."""
+        if not isinstance(res, dict):
+            return {}
+        failures = res.get("errors") or res.get("failed") or []
+        if not isinstance(failures, list):
+            return {}
+
+        positions: Dict[str, int] = {}
+        if self.id_field:
+            for i, record in enumerate(records):
+                if isinstance(record, dict) and record.get(self.id_field) is not None:
+                    positions[str(record[self.id_field])] = i
+
+        errors: Dict[int, str] = {}
+        for failure in failures:
+            if isinstance(failure, dict):
+                index = failure.get("index")
+                if index is None and self.id_field:
+                    index = positions.get(str(failure.get(self.id_field)))
+                message = failure.get("error") or failure.get("message") or "rejected by API"
+            else:
+                index, message = positions.get(str(failure)), "rejected by API"
+            if isinstance(index, int) and 0 <= index < len(records):
+                errors[index] = str(message)
+        return errors
+
+    def _report(self, batch: List[Tuple[Any, int, Any]], errors: Dict[int, str]) -> None:
+        self.stats["records"] += len(batch) - len(errors)
+        self.stats["failed"] += len(errors)
+        for i, (record, _, on_result) in enumerate(batch):
+            if on_result is None:
+                continue
+            try:
+                on_result(record, errors.get(i))
+            except Exception as e:
+                logging.error(f"[IngestionBatcher] on_result callback failed: {e}")
+
+# --- LOCAL STATE ---
+# Scripts keep small bits of state between runs (caches, fingerprints, indexes).
+# Each store is a single SQLite file under SCRIPT_STATE_DIR.
+SCRIPT_STATE_DIR: str = os.getenv("SCRIPT_STATE_DIR", "/tmp/p2c_state")
+
+class LocalCache:
+    """
+    Thread-safe, on-disk key/value store with optional per-entry TTL.
+    Values are JSON-encoded, so None can be cached (e.g. negative lookups);
+    pass a sentinel as `default` to tell a cached None apart from a miss.
+    """
+
+    def __init__(self, name: str, default_ttl: Optional[float] = None, path: Optional[str] = None) -> None:
+        self.default_ttl = default_ttl
+        self.path = path or os.path.join(SCRIPT_STATE_DIR, f"{name}.db")
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                cache_key TEXT PRIMARY KEY,
+                cache_value TEXT,
+                expires_at REAL NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cache_value, expires_at FROM cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return default
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (cache_key, cache_value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE cache_key = ?", (key,))
+            self._conn.commit()
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Returns all non-expired (key, value) pairs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT cache_key, cache_value FROM cache WHERE expires_at IS NULL OR expires_at >= ?",
+                (time.time(),)
+            ).fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+class PhotoIndex:
+    """
+    Remembers, per record (book_id, registrant_id, ...), the photo that the API already has:
+    its URL, sha256, ETag and Last-Modified.
+
+    fetch() sends a conditional GET and reports an unchanged photo (304, or same hash)
+    so callers can omit photo_data from the payload. The returned entry must be passed to
+    commit() only after the API accepted the record, so a failed post is re-sent next run.
+    Entries older than resend_after_days are ignored, which periodically re-sends photos.
+    """
+
+    def __init__(self, name: str, resend_after_days: float = 30, path: Optional[str] = None) -> None:
+        self.cache = LocalCache(name, path=path)
+        self.resend_after = resend_after_days * 86400
+
+    def fetch(self, session: Any, key: str, url: str, placeholder_sizes: Tuple[int, ...] = (),
+              **request_kwargs: Any) -> Tuple[Optional[bytes], bool, Optional[Dict[str, Any]]]:
+        """
+        Returns (content, unchanged, entry):
+          - content: new photo bytes, or None (unchanged, placeholder, or download failed)
+          - unchanged: True when the API already has this exact photo
+          - entry: index entry to commit() once the API accepted the record
+        Responses whose size is in placeholder_sizes are treated as "no photo".
+        """
+        previous = self.cache.get(key)
+        if previous and time.time() - previous.get("sent_at", 0) > self.resend_after:
+            previous = None
+
+        headers = dict(request_kwargs.pop("headers", None) or {})
+        if previous and previous.get("url") == url:
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+
+        resp = session.get(url, headers=headers, **request_kwargs)
+        if resp.status_code == 304 and previous:
+            return None, True, None
+        if resp.status_code != 200 or len(resp.content) in placeholder_sizes:
+            return None, False, None
+
+        digest = hashlib.sha256(resp.content).hexdigest()
+        entry = {
+            "url": url,
+            "sha256": digest,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "sent_at": previous.get("sent_at") if previous else None
+        }
+        if previous and previous.get("sha256") == digest:
+            # Same bytes; still refresh the validators so the next run can get a 304
+            return None, True, entry
+        return resp.content, False, entry
+
+    def commit(self, key: str, entry: Optional[Dict[str, Any]]) -> None:
+        if not entry:
+            return
+        entry = dict(entry)
+        entry["sent_at"] = entry.get("sent_at") or time.time()
+        self.cache.set(key, entry)
+
 # --- PROXY ---
+# Proxy health scores (lower is better, seconds per successful request), fed by the
+# Orchestrator's /api/proxies/list stats. Env-injected lists only carry the Orchestrator's
+# ranking order; those positions are kept apart in _proxy_ranks, since they are not
+# on the same scale as scores.
+_proxy_scores: Dict[str, float] = {}
+_proxy_ranks: Dict[str, int] = {}
+_proxy_scores_lock = Lock()
+
+def register_proxy_stats(stats: List[Dict[str, Any]]) -> None:
+    """Stores scores from the Orchestrator's ranked proxy list."""
+    with _proxy_scores_lock:
+        for entry in stats:
+            if entry.get("proxy") and entry.get("score") is not None:
+                _proxy_scores[entry["proxy"]] = float(entry["score"])
+
+def register_proxy_ranking(proxies: List[str]) -> None:
+    """Records list position for proxies delivered best-first without stats."""
+    with _proxy_scores_lock:
+        for rank, proxy in enumerate(proxies):
+            _proxy_ranks.setdefault(proxy, rank)
+
+def pick_proxies(proxy_pool: List[str], count: int) -> List[str]:
+    """
+    Picks up to `count` distinct proxies using power-of-two-choices:
+    sample two at random, keep the one with the better score.
+    A pair is compared on health scores when either has one, else on ranking position;
+    the two are never compared with each other.
+    Falls back to a uniform shuffle when neither is known.
+    """
+    remaining = list(proxy_pool)
+    with _proxy_scores_lock:
+        scores = {p: _proxy_scores[p] for p in remaining if p in _proxy_scores}
+        ranks = {p: _proxy_ranks[p] for p in remaining if p in _proxy_ranks}
+    if not scores and not ranks:
+        random.shuffle(remaining)
+        return remaining[:count]
+
+    # Proxies missing a value (e.g. validated locally) count as average, so they still get traffic
+    default_score = sum(scores.values()) / len(scores) if scores else 0.0
+    default_rank = sum(ranks.values()) / len(ranks) if ranks else 0.0
+
+    def beats(a: str, b: str) -> bool:
+        if a in scores or b in scores:
+            return scores.get(a, default_score) < scores.get(b, default_score)
+        return ranks.get(a, default_rank) < ranks.get(b, default_rank)
+
+    picked: List[str] = []
+    while remaining and len(picked) < count:
+        i = random.randrange(len(remaining))
+        if len(remaining) > 1:
+            j = random.randrange(len(remaining) - 1)
+            j = j + 1 if j >= i else j
+            if beats(remaining[j], remaining[i]):
+                i = j
+        remaining[i], remaining[-1] = remaining[-1], remaining[i]
+        picked.append(remaining.pop())
+    return picked
+
+def choose_proxy(proxy_pool: List[str]) -> str:
+    """Picks a single proxy, weighted towards healthy ones."""
+    return pick_proxies(proxy_pool, 1)[0]
+
+class ProxyFeedbackReporter:
+    """
+    Ships per-proxy outcomes (success/failure/latency) to the Orchestrator's
+    /api/proxies/feedback endpoint in batches, from a daemon thread.
+    report() never blocks: if the queue is full, the observation is dropped.
+    """
+
+    def __init__(self, api_url: str, flush_interval: float = 5.0, max_batch: int = 200, max_queue: int = 10000) -> None:
+        self.url = f"{api_url}/api/proxies/feedback"
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="ProxyFeedback", daemon=True)
+        self._thread.start()
+
+    def report(self, proxy: str, success: bool, latency: Optional[float] = None) -> None:
+        try:
+            self._queue.put_nowait({"proxy": proxy, "success": success, "latency": latency})
+        except queue.Full:
+            pass
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flushes pending reports (called at interpreter exit)."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                if item is None:
+                    self._send(batch)
+                    return
+                batch.append(item)
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.max_batch or time.monotonic() >= deadline:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        try:
+            requests.post(self.url, json={"results": batch}, timeout=5)
+        except Exception as e:
+            logging.debug(f"[ProxyFeedback] Failed to send {len(batch)} reports: {e}")
+
+_feedback_reporter: Optional[ProxyFeedbackReporter] = None
+_feedback_reporter_lock = Lock()
+
+def report_proxy_result(proxy: Optional[str], success: bool, latency: Optional[float] = None) -> None:
+    """
+    Reports one proxy outcome to the Orchestrator (non-blocking, batched).
+    No-op for direct connections or when not running under the Orchestrator.
+    """
+    global _feedback_reporter
+    if not proxy:
+        return
+    if _feedback_reporter is None:
+        api_url = os.getenv("ORCHESTRATOR_API_URL")
+        if not api_url:
+            return
+        with _feedback_reporter_lock:
+            if _feedback_reporter is None:
+                _feedback_reporter = ProxyFeedbackReporter(api_url)
+                atexit.register(_feedback_reporter.close)
+    _feedback_reporter.report(proxy, success, latency)
+
+class ProxyValidator:
+    """
+    Long-lived proxy probe engine.
+    Keeps one persistent worker pool and a bounded LRU of per-proxy sessions, so
+    repeated checks of the same proxy reuse its open connection.
+
+    probe_method:
+      - "get":     plain GET, full body (strictest)
+      - "head":    HEAD request, no body
+      - "partial": streamed GET with a Range header; reads at most probe_bytes
+    """
+
+    PROBE_METHODS = ("get", "head", "partial")
+
+    def __init__(self, max_workers: int = 50, timeout: float = 5, probe_method: str = "get",
+                 probe_bytes: int = 2048, max_sessions: int = 2000) -> None:
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.probe_method = probe_method
+        self.probe_bytes = probe_bytes
+        self.max_sessions = max_sessions
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ProxyProbe")
+        self._sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self._lock = Lock()
+
+    def probe(self, proxy: str, url: str, timeout: Optional[float] = None) -> Optional[float]:
+        """Returns the probe latency in seconds, or None if the proxy failed."""
+        timeout = self.timeout if timeout is None else timeout
+        session = self._session_for(proxy)
+        try:
+            start = time.monotonic()
+            if self.probe_method == "head":
+                resp = session.head(url, timeout=timeout, allow_redirects=True)
+            elif self.probe_method == "partial":
+                resp = session.get(url, timeout=timeout, stream=True,
+                                   headers={"Range": f"bytes=0-{self.probe_bytes - 1}"})
+                try:
+                    next(resp.iter_content(self.probe_bytes), b"")
+                finally:
+                    resp.close()
+            else:
+                resp = session.get(url, timeout=timeout)
+            resp.raise_for_status() # Ban on 400/500
+            return time.monotonic() - start
+        except Exception:
+            self.drop(proxy) # Don't keep a possibly broken connection around
+            return None
+
+    def submit(self, proxy: str, url: str, timeout: Optional[float] = None) -> "concurrent.futures.Future[Optional[float]]":
+        return self._executor.submit(self.probe, proxy, url, timeout)
+
+    def check_many(self, proxies: List[str], url: str, timeout: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Probes proxies concurrently; returns {proxy: latency or None}."""
+        futures = {p: self.submit(p, url, timeout) for p in proxies}
+        return {p: f.result() for p, f in futures.items()}
+
+    def drop(self, proxy: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(proxy, None)
+        if session:
+            session.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _session_for(self, proxy: str) -> requests.Session:
+        evicted: List[requests.Session] = []
+        with self._lock:
+            session = self._sessions.get(proxy)
+            if session is not None:
+                self._sessions.move_to_end(proxy)
+                return session
+
+            session = requests.Session()
+            session.proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+            session.verify = False
+            session.headers["User-Agent"] = random.choice(USER_AGENTS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._sessions[proxy] = session
+
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return session
+
+_proxy_validator: Optional[ProxyValidator] = None
+
+def get_proxy_validator() -> ProxyValidator:
+    """Shared validator for scripts (built on first use)."""
+    global _proxy_validator
+    with _proxy_scores_lock:
+        if _proxy_validator is None:
+            _proxy_validator = ProxyValidator()
+    return _proxy_validator
+
 def check_proxy(proxy: str, test_url: str = "http://example.com", timeout: int = 5) -> Optional[str]:
     """Tests a single proxy against a reliable target."""
-    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-    try:
-        resp = requests.get(test_url, proxies=proxies_dict, timeout=timeout, verify=False)
-        resp.raise_for_status()
-        return proxy
-    except Exception:
+    if get_proxy_validator().probe(proxy, test_url, timeout) is None:
         return None
+    return proxy
 
 def validate_proxies(proxies_list: List[str], batch_size: int = 50, target_count: Optional[int] = None, test_url: str = "http://example.com") -> List[str]:
     """
@@ -121,15 +642,14 @@ def validate_proxies(proxies_list: List[str], batch_size: int = 50, target_count
 
     valid_proxies: List[str] = []
     status("ProxyManager", f"Validating {len(proxies_list)} proxies against {test_url}...")
+    validator = get_proxy_validator()
     
     for i in range(0, len(proxies_list), batch_size):
         batch = proxies_list[i:i + batch_size]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=batch_size) as executor:
-            # check_proxy defaults to example.com, suitable for general connectivity
-            futures = [executor.submit(check_proxy, proxy, test_url) for proxy in batch]
-            results = [f.result() for f in futures]
+        # test_url defaults to example.com, suitable for general connectivity
+        results = validator.check_many(batch, test_url)
         
-        valid_batch = [proxy for proxy in results if proxy]
+        valid_batch = [proxy for proxy in batch if results[proxy] is not None]
         valid_proxies.extend(valid_batch)
         
         status("ProxyManager", f"Batch {i//batch_size + 1}: Found {len(valid_batch)} working proxies. Total valid: {len(valid_proxies)}")
@@ -156,7 +676,9 @@ def get_proxies_from_source(source_url: str = PROXY_LIST_URL, config: Optional[D
     injected_proxies = os.environ.get("ORCHESTRATOR_PROXIES")
     if injected_proxies:
         status("ProxyManager", "Loading proxies from ORCHESTRATOR_PROXIES env var.")
-        return [p.strip() for p in injected_proxies.split(',') if p.strip()]
+        proxies = [p.strip() for p in injected_proxies.split(',') if p.strip()]
+        register_proxy_ranking(proxies) # Orchestrator injects them best-first
+        return proxies
 
     # 3. Orchestrator API Injection
     orchestrator_url = os.environ.get("ORCHESTRATOR_API_URL")
@@ -169,6 +691,7 @@ def get_proxies_from_source(source_url: str = PROXY_LIST_URL, config: Optional[D
                 data = resp.json()
                 proxies = data.get("proxies", [])
                 if proxies:
+                    register_proxy_stats(data.get("stats", []))
                     status("ProxyManager", f"Loaded {len(proxies)} validated proxies from Orchestrator.")
                     os.environ["ORCHESTRATOR_VALIDATED"] = "1" # Hint to skip local validation
                     return proxies
@@ -220,12 +743,8 @@ def get_resilient_session(user_agent, proxy_pool, verify=True, test_url=None):
         return None, None
 
     # Proxy Mode
-    # Copy and shuffle to avoid modifying original list in place if caller cares
-    local_proxy_pool = list(proxy_pool)
-    random.shuffle(local_proxy_pool)
-    
-    # Try up to 3 distinct proxies
-    for proxy_idx, proxy in enumerate(local_proxy_pool[:3]):
+    # Try up to 3 distinct proxies, weighted towards healthy ones
+    for proxy_idx, proxy in enumerate(pick_proxies(proxy_pool, 3)):
         proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
         
         # Try 3 times per proxy
@@ -234,12 +753,15 @@ def get_resilient_session(user_agent, proxy_pool, verify=True, test_url=None):
                 session = requests.Session()
                 # If test_url provided, verify connection
                 if test_url:
+                    start = time.monotonic()
                     resp = session.get(test_url, headers=headers, proxies=proxies_dict, timeout=20, verify=verify)
                     resp.raise_for_status()
+                    report_proxy_result(proxy, True, time.monotonic() - start)
                 
                 return session, proxy 
             except requests.RequestException as e:
                 logging.warning(f"Proxy {proxy} attempt {attempt+1}/3 failed: {e}")
+                report_proxy_result(proxy, False)
                 time.sleep(1)
         
         logging.warning(f"Proxy {proxy} failed 3 times. Switching...")
@@ -265,6 +787,7 @@ def refresh_proxy_pool(current_pool: List[str]) -> List[str]:
         new_proxies = data.get("proxies", [])
         
         if new_proxies:
+            register_proxy_stats(data.get("stats", []))
             logging.info(f"[ProxyRefresh] Refreshed pool with {len(new_proxies)} proxies.")
             # Update in place
             current_pool[:] = new_proxies
@@ -281,7 +804,7 @@ def refresh_proxy_pool(current_pool: List[str]) -> List[str]:
 def get_session(proxy_pool: Optional[List[str]] = None, user_agent: Optional[str] = None) -> Tuple[requests.Session, Optional[str]]:
     """
     Returns a requests.Session. 
-    If proxy_pool is provided, assigns a random proxy.
+    If proxy_pool is provided, assigns a proxy (weighted towards healthy ones).
     """
     session = requests.Session()
     
@@ -295,19 +818,616 @@ def get_session(proxy_pool: Optional[List[str]] = None, user_agent: Optional[str
     
     proxy: Optional[str] = None
     if proxy_pool:
-        proxy = random.choice(proxy_pool)
+        proxy = choose_proxy(proxy_pool)
         session.proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
     
     return session, proxy
 
+# --- AUTHENTICATED SESSION POOL ---
+class PooledSession:
+    """One authenticated session bound to one proxy, as handed out by AuthSessionPool.lease()."""
+
+    def __init__(self, session: requests.Session, proxy: str) -> None:
+        self.session = session
+        self.proxy = proxy
+        self.proxies: Dict[str, str] = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+        self.created = time.monotonic()
+        self.checked = self.created
+        self.uses = 0
+        self.failed = False
+
+    def fail(self) -> None:
+        """Retire this session when it is returned (dead proxy, expired auth, ...)."""
+        self.failed = True
+
+
+class AuthSessionPool:
+    """
+    Pool of pre-authenticated sessions shared by worker threads, one proxy per session.
+
+    authenticate(proxy) performs the site's handshake and returns a ready requests.Session
+    (raising on failure); handshakes run in parallel on auth_workers threads. A maintainer
+    thread keeps `size` sessions alive: sessions older than max_age are re-authenticated,
+    idle ones are health-checked with check(session, proxy) every check_interval seconds.
+    Workers borrow sessions with lease(); a lease marked fail() is retired on return, its
+    proxy cools down for proxy_cooldown seconds and a replacement is authenticated.
+    When every proxy is bound or cooling down, refresh(current_proxies) is called (at most
+    once per refresh_interval, on an auth worker) and any new proxies it returns are added.
+    """
+
+    def __init__(self, authenticate: Any, proxy_pool: List[str], size: int = 30, auth_workers: int = 16,
+                 max_age: float = 1200, check: Optional[Any] = None, check_interval: float = 300,
+                 proxy_cooldown: float = 300, refresh: Optional[Any] = None, refresh_interval: float = 60,
+                 name: str = "SessionPool") -> None:
+        self.authenticate = authenticate
+        self.proxy_pool = list(proxy_pool)  # Grows through refresh(); only touched under self._cond
+        self.refresh = refresh
+        self.refresh_interval = refresh_interval
+        self.size = size
+        self.max_age = max_age
+        self.check = check
+        self.check_interval = check_interval
+        self.proxy_cooldown = proxy_cooldown
+        self.name = name
+        self.stats: Dict[str, int] = {"authenticated": 0, "auth_failed": 0, "retired": 0, "expired": 0,
+                                      "health_failed": 0, "proxies_added": 0}
+
+        self._cond = threading.Condition()
+        self._idle: "deque[PooledSession]" = deque()
+        self._leased = 0
+        self._pending = 0
+        self._bound_proxies: set = set()          # Proxies with a live or authenticating session
+        self._cooldown: Dict[str, float] = {}     # proxy -> monotonic time it may be retried
+        self._closed = False
+        self._refreshing = False
+        self._last_refresh = float("-inf")
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=auth_workers, thread_name_prefix=name)
+        self._thread = threading.Thread(target=self._run, name=f"{name}-Maintainer", daemon=True)
+
+    # --- Public API ---
+
+    def start(self, min_ready: Optional[int] = None, timeout: float = 60.0) -> int:
+        """
+        Starts authenticating and returns once min_ready sessions (default: size) are idle,
+        or after timeout. The pool keeps filling in the background. Returns the ready count.
+        """
+        min_ready = self.size if min_ready is None else min(min_ready, self.size)
+        deadline = time.monotonic() + timeout
+        self._thread.start()
+        with self._cond:
+            self._fill()
+            while len(self._idle) < min_ready and time.monotonic() < deadline:
+                if not self._fill() and not self._pending and not self._refreshing:
+                    break  # Every proxy is bound or cooling down, and no refresh is running
+                self._cond.wait(max(deadline - time.monotonic(), 0.01))
+            ready = len(self._idle)
+        status(self.name, f"{ready} sessions ready ({self.stats['authenticated']} authenticated, {self.stats['auth_failed']} handshakes failed)")
+        return ready
+
+    def acquire(self, timeout: float = 120.0) -> PooledSession:
+        """Blocks until a session is idle. Raises TimeoutError if none becomes available."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle:
+                if self._closed:
+                    raise RuntimeError(f"{self.name} is closed")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{self.name}: no session available after {timeout:.0f}s")
+                self._fill()
+                self._cond.wait(min(remaining, 1.0))
+            entry = self._idle.popleft()
+            self._leased += 1
+            entry.uses += 1
+            return entry
+
+    def release(self, entry: PooledSession) -> None:
+        with self._cond:
+            self._leased -= 1
+            if self._closed:
+                entry.session.close()
+                return
+            if entry.failed:
+                self._retire(entry, cooldown=True)
+                self.stats["retired"] += 1
+            elif time.monotonic() - entry.created > self.max_age:
+                self._retire(entry)
+                self.stats["expired"] += 1
+            else:
+                self._idle.append(entry)
+            self._fill()
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def lease(self, timeout: float = 120.0):
+        """with pool.lease() as leased: leased.session.get(url, proxies=leased.proxies) ..."""
+        entry = self.acquire(timeout)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+
+    def ready_count(self) -> int:
+        with self._cond:
+            return len(self._idle)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+        for entry in idle:
+            entry.session.close()
+
+    # --- Internals (callers hold self._cond unless noted) ---
+
+    def _fill(self) -> int:
+        """Starts handshakes until live + pending sessions reach size. Returns how many were started."""
+        started = 0
+        while not self._closed and len(self._idle) + self._leased + self._pending < self.size:
+            proxy = self._next_proxy()
+            if proxy is None:
+                self._request_refresh()
+                break
+            self._bound_proxies.add(proxy)
+            self._pending += 1
+            self._executor.submit(self._authenticate, proxy)
+            started += 1
+        return started
+
+    def _next_proxy(self) -> Optional[str]:
+        now = time.monotonic()
+        for proxy in pick_proxies(self.proxy_pool, len(self.proxy_pool)):
+            if proxy not in self._bound_proxies and self._cooldown.get(proxy, 0) <= now:
+                return proxy
+        return None
+
+    def _request_refresh(self) -> None:
+        if (self.refresh is None or self._refreshing or self._closed
+                or time.monotonic() - self._last_refresh < self.refresh_interval):
+            return
+        self._refreshing = True
+        try:
+            self._executor.submit(self._refresh_proxies, list(self.proxy_pool))
+        except RuntimeError:
+            self._refreshing = False  # Executor shut down by close()
+
+    def _refresh_proxies(self, current: List[str]) -> None:
+        # Runs on an auth worker thread
+        try:
+            fresh = self.refresh(current) or []
+        except Exception as e:
+            logging.warning(f"[{self.name}] Proxy refresh failed: {e}")
+            fresh = []
+
+        with self._cond:
+            self._refreshing = False
+            self._last_refresh = time.monotonic()
+            known = set(self.proxy_pool)
+            added = [p for p in fresh if p not in known]
+            self.proxy_pool.extend(added)
+            self.stats["proxies_added"] += len(added)
+            if added:
+                status(self.name, f"Added {len(added)} proxies (pool of {len(self.proxy_pool)})")
+            self._fill()
+            self._cond.notify_all()
+
+    def _retire(self, entry: PooledSession, cooldown: bool = False) -> None:
+        self._bound_proxies.discard(entry.proxy)
+        if cooldown:
+            self._cooldown[entry.proxy] = time.monotonic() + self.proxy_cooldown
+        entry.session.close()
+
+    def _authenticate(self, proxy: str) -> None:
+        # Runs on an auth worker thread
+        try:
+            session = self.authenticate(proxy)
+        except Exception as e:
+            logging.debug(f"[{self.name}] Handshake via {proxy} failed: {e}")
+            session = None
+
+        with self._cond:
+            self._pending -= 1
+            if session is None or self._closed:
+                self._bound_proxies.discard(proxy)
+                self._cooldown[proxy] = time.monotonic() + self.proxy_cooldown
+                if session is None:
+                    self.stats["auth_failed"] += 1
+                else:
+                    session.close()
+            else:
+                self._idle.append(PooledSession(session, proxy))
+                self.stats["authenticated"] += 1
+            self._fill()
+            self._cond.notify_all()
+
+    def _health_check(self, entry: PooledSession) -> None:
+        # Runs on an auth worker thread; entry counts as leased meanwhile
+        try:
+            healthy = bool(self.check(entry.session, entry.proxy))
+        except Exception:
+            healthy = False
+        entry.checked = time.monotonic()
+        if not healthy:
+            entry.fail()
+            with self._cond:
+                self.stats["health_failed"] += 1
+        self.release(entry)
+
+    def _run(self) -> None:
+        # Maintainer: expire old sessions, health-check idle ones, keep the pool full
+        tick = min(5.0, self.check_interval) if self.check else 5.0
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                keep: "deque[PooledSession]" = deque()
+                to_check: List[PooledSession] = []
+                for entry in self._idle:
+                    if now - entry.created > self.max_age:
+                        self._retire(entry)
+                        self.stats["expired"] += 1
+                    elif self.check and now - entry.checked > self.check_interval:
+                        to_check.append(entry)
+                        self._leased += 1
+                    else:
+                        keep.append(entry)
+                self._idle = keep
+                self._fill()
+                self._cond.notify_all()
+
+            for entry in to_check:
+                try:
+                    self._executor.submit(self._health_check, entry)
+                except RuntimeError:
+                    return  # Executor shut down by close()
+            time.sleep(tick)
+
+# --- ASYNC HTTP (aiohttp) ---
+# asyncio counterpart of get_resilient_session/get_session for scrapers that want
+# hundreds of in-flight requests through slow proxies without one thread each.
+try:
+    import asyncio
+    import weakref
+    import aiohttp
+    from urllib.parse import urlsplit
+    from yarl import URL
+
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    class AsyncResponse:
+        """Fully-read response exposing the subset of requests.Response the scrapers use."""
+
+        def __init__(self, url: str, status_code: int, headers: Any, content: bytes, encoding: Optional[str]) -> None:
+            self.url = url
+            self.status_code = status_code
+            self.headers = headers
+            self.content = content
+            self.encoding = encoding or "utf-8"
+
+        @property
+        def text(self) -> str:
+            return self.content.decode(self.encoding, errors="replace")
+
+        def json(self) -> Any:
+            return json.loads(self.text)
+
+        def raise_for_status(self) -> None:
+            if self.status_code >= 400:
+                raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    class AsyncHTTPEngine:
+        """
+        Shared aiohttp engine.
+        - One connection pool (ClientSession) per proxy, so keep-alive connections
+          to a proxy are reused across every logical session routed through it.
+        - A semaphore per target host caps in-flight requests to that host.
+        aiohttp errors are re-raised as requests exceptions so callers keep
+        their existing `except requests.RequestException` handling.
+        """
+
+        def __init__(self, per_host_limit: int = 50, per_proxy_pool_size: int = 10, timeout: float = 20) -> None:
+            self.per_host_limit = per_host_limit
+            self.per_proxy_pool_size = per_proxy_pool_size
+            self.timeout = timeout
+            self._pools: Dict[Optional[str], aiohttp.ClientSession] = {}
+            self._host_limits: Dict[str, asyncio.Semaphore] = {}
+            self._shutdown_hook: Any = None  # Set by get_async_engine() for per-loop default engines
+
+        async def __aenter__(self) -> 'AsyncHTTPEngine':
+            return self
+
+        async def __aexit__(self, *exc: Any) -> None:
+            await self.close()
+
+        def _pool_for(self, proxy: Optional[str]) -> aiohttp.ClientSession:
+            pool = self._pools.get(proxy)
+            if pool is None or pool.closed:
+                connector = aiohttp.TCPConnector(limit=self.per_proxy_pool_size)
+                # Cookies live on AsyncSession, not on the shared pool
+                pool = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+                self._pools[proxy] = pool
+            return pool
+
+        def _host_limit(self, url: str) -> asyncio.Semaphore:
+            host = urlsplit(url).hostname or ""
+            sem = self._host_limits.get(host)
+            if sem is None:
+                sem = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+            return sem
+
+        async def request(self, method: str, url: str, proxy: Optional[str] = None,
+                          headers: Optional[Dict[str, str]] = None, cookie_jar: Optional['aiohttp.CookieJar'] = None,
+                          verify: bool = True, timeout: Optional[float] = None, allow_redirects: bool = True,
+                          max_redirects: int = 10, **kwargs: Any) -> AsyncResponse:
+            """
+            Performs a request. kwargs are passed to aiohttp (params, data, json).
+            Redirects are followed here one hop at a time, so cookies set by a redirect
+            response (ASP.NET 302 postbacks) are stored in cookie_jar and sent on the next hop.
+            """
+            if not verify:
+                kwargs["ssl"] = False
+
+            for _ in range(max_redirects + 1):
+                resp = await self._send(method, url, proxy, headers, cookie_jar, timeout, kwargs)
+                location = resp.headers.get("Location")
+                if not allow_redirects or resp.status_code not in REDIRECT_STATUSES or not location:
+                    return resp
+
+                url = str(URL(resp.url).join(URL(location)))
+                kwargs.pop("params", None)  # Already part of the URL that redirected
+                if resp.status_code == 303 or (resp.status_code in (301, 302) and method.upper() == "POST"):
+                    # Same as browsers and requests: follow with a GET and drop the body
+                    method = "GET"
+                    kwargs.pop("data", None)
+                    kwargs.pop("json", None)
+
+            raise requests.TooManyRedirects(f"Exceeded {max_redirects} redirects for url: {url}")
+
+        async def _send(self, method: str, url: str, proxy: Optional[str], headers: Optional[Dict[str, str]],
+                        cookie_jar: Optional['aiohttp.CookieJar'], timeout: Optional[float], kwargs: Dict[str, Any]) -> AsyncResponse:
+            """One request/response, without following redirects."""
+            if cookie_jar is not None:
+                kwargs = dict(kwargs, cookies=cookie_jar.filter_cookies(URL(url)))
+
+            async with self._host_limit(url):
+                try:
+                    async with self._pool_for(proxy).request(
+                        method, url,
+                        proxy=f"http://{proxy}" if proxy else None,
+                        headers=headers,
+                        timeout=aiohttp.ClientTimeout(total=timeout or self.timeout),
+                        allow_redirects=False,
+                        **kwargs
+                    ) as resp:
+                        content = await resp.read()
+                        if cookie_jar is not None:
+                            cookie_jar.update_cookies(resp.cookies, resp.url)
+                        return AsyncResponse(str(resp.url), resp.status, resp.headers.copy(), content, resp.charset)
+                except asyncio.TimeoutError as e:
+                    raise requests.Timeout(f"Timeout for url: {url}") from e
+                except aiohttp.ClientError as e:
+                    raise requests.ConnectionError(str(e)) from e
+
+        async def drop_proxy(self, proxy: Optional[str]) -> None:
+            """Closes the connection pool of a proxy that went dead."""
+            pool = self._pools.pop(proxy, None)
+            if pool is not None:
+                await pool.close()
+
+        async def close(self) -> None:
+            pools = list(self._pools.values())
+            self._pools.clear()
+            for pool in pools:
+                await pool.close()
+
+    class AsyncSession:
+        """Logical browser session (headers + cookies) bound to one proxy of an AsyncHTTPEngine."""
+
+        def __init__(self, engine: AsyncHTTPEngine, proxy: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> None:
+            self.engine = engine
+            self.proxy = proxy
+            self.headers: Dict[str, str] = dict(headers or {})
+            self.cookies = aiohttp.CookieJar(unsafe=True)
+
+        async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> AsyncResponse:
+            merged = dict(self.headers)
+            if headers:
+                merged.update(headers)
+            return await self.engine.request(method, url, proxy=self.proxy, headers=merged, cookie_jar=self.cookies, **kwargs)
+
+        async def get(self, url: str, **kwargs: Any) -> AsyncResponse:
+            return await self.request("GET", url, **kwargs)
+
+        async def post(self, url: str, **kwargs: Any) -> AsyncResponse:
+            return await self.request("POST", url, **kwargs)
+
+    # One default engine per event loop (repeated asyncio.run() calls each get their own)
+    _async_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHTTPEngine]" = weakref.WeakKeyDictionary()
+
+    async def _close_on_loop_shutdown(loop: asyncio.AbstractEventLoop, engine: AsyncHTTPEngine) -> Any:
+        # Parked at its first yield; loop.shutdown_asyncgens() (run by asyncio.run on exit)
+        # finalizes it, which closes the engine's pools while the loop can still run them.
+        try:
+            yield
+        finally:
+            _async_engines.pop(loop, None)
+            await engine.close()
+
+    def get_async_engine() -> AsyncHTTPEngine:
+        """Returns the engine shared by the current event loop; it is closed when the loop shuts down."""
+        loop = asyncio.get_running_loop()
+        engine = _async_engines.get(loop)
+        if engine is None:
+            engine = _async_engines[loop] = AsyncHTTPEngine()
+            engine._shutdown_hook = _close_on_loop_shutdown(loop, engine)  # Kept alive by the engine
+            loop.create_task(engine._shutdown_hook.__anext__())
+        return engine
+
+    async def get_resilient_session_async(user_agent: Optional[str], proxy_pool: Optional[List[str]], verify: bool = True,
+                                          test_url: Optional[str] = None, engine: Optional[AsyncHTTPEngine] = None) -> Tuple[Optional[AsyncSession], Optional[str]]:
+        """
+        Async variant of get_resilient_session (same 3x3 retry strategy).
+        Returns: (AsyncSession, proxy_used) or (None, None)
+        """
+        engine = engine or get_async_engine()
+        headers = {"User-Agent": user_agent or random.choice(USER_AGENTS)}
+
+        # Direct Mode (No Proxies)
+        if not proxy_pool:
+            for attempt in range(3):
+                session = AsyncSession(engine, None, headers)
+                try:
+                    if test_url:
+                        resp = await session.get(test_url, verify=verify)
+                        resp.raise_for_status()
+                    return session, None
+                except requests.RequestException as e:
+                    logging.warning(f"Direct connection attempt {attempt+1}/3 failed: {e}")
+                    await asyncio.sleep(1)
+            return None, None
+
+        # Proxy Mode
+        for proxy in pick_proxies(proxy_pool, 3):
+            for attempt in range(3):
+                session = AsyncSession(engine, proxy, headers)
+                try:
+                    if test_url:
+                        start = time.monotonic()
+                        resp = await session.get(test_url, verify=verify)
+                        resp.raise_for_status()
+                        report_proxy_result(proxy, True, time.monotonic() - start)
+                    return session, proxy
+                except requests.RequestException as e:
+                    logging.warning(f"Proxy {proxy} attempt {attempt+1}/3 failed: {e}")
+                    report_proxy_result(proxy, False)
+                    await asyncio.sleep(1)
+
+            logging.warning(f"Proxy {proxy} failed 3 times. Switching...")
+            await engine.drop_proxy(proxy)
+
+        return None, None
+
+    async def get_session_async(proxy_pool: Optional[List[str]] = None, user_agent: Optional[str] = None,
+                                engine: Optional[AsyncHTTPEngine] = None) -> Tuple[AsyncSession, Optional[str]]:
+        """Async variant of get_session: a session with browser headers and a random proxy."""
+        engine = engine or get_async_engine()
+        headers = {
+            "User-Agent": user_agent if user_agent else random.choice(USER_AGENTS),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Connection": "keep-alive"
+        }
+        proxy = choose_proxy(proxy_pool) if proxy_pool else None
+        return AsyncSession(engine, proxy, headers), proxy
+
+except ImportError:
+    # aiohttp is optional; the blocking helpers above keep working without it
+    class AsyncHTTPEngine:  # type: ignore[no-redef]
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            raise ImportError("aiohttp is required for async sessions (pip install aiohttp)")
+
+    class AsyncSession:  # type: ignore[no-redef]
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            raise ImportError("aiohttp is required for async sessions (pip install aiohttp)")
+
+    def get_async_engine() -> Any:
+        raise ImportError("aiohttp is required for async sessions (pip install aiohttp)")
+
+    async def get_resilient_session_async(*args: Any, **kwargs: Any) -> Any:
+        raise ImportError("aiohttp is required for async sessions (pip install aiohttp)")
+
+    async def get_session_async(*args: Any, **kwargs: Any) -> Any:
+        raise ImportError("aiohttp is required for async sessions (pip install aiohttp)")
+
 # --- DATE PARSING ---
-def parse_date(date_str: Optional[str], formats: Optional[List[str]] = None) -> Optional[datetime]:
+DEFAULT_DATE_FORMATS: Tuple[str, ...] = (
+    '%m/%d/%Y %I:%M:%S %p', # 9/20/2025 12:00:00 AM
+    '%m/%d/%Y',             # 9/20/2025
+    '%Y%m%d',               # 20250920
+    '%Y-%m-%d'              # 2025-09-20
+)
+
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _valid_ymd(year: int, month: int, day: int) -> bool:
+    if year < 1 or not 1 <= month <= 12 or day < 1:
+        return False
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return day <= 29
+    return day <= _DAYS_IN_MONTH[month]
+
+
+def _small_int(part: str) -> int:
+    """int() of a 1-2 char ASCII digit string, else -1 (anything else is left to strptime)."""
+    if 0 < len(part) <= 2 and part.isascii() and part.isdigit():
+        return int(part)
+    return -1
+
+
+def _split_mdy(part: str) -> Optional[Tuple[int, int, int]]:
+    """'9/20/2025' -> (2025, 9, 20) when unambiguous, else None."""
+    fields = part.split('/')
+    if len(fields) != 3 or len(fields[2]) != 4 or not (fields[2].isascii() and fields[2].isdigit()):
+        return None
+    month, day, year = _small_int(fields[0]), _small_int(fields[1]), int(fields[2])
+    return (year, month, day) if _valid_ymd(year, month, day) else None
+
+
+def _sniff_default(date_str: str) -> Optional[datetime]:
     """
-    Tries to parse a date string using a list of formats.
-    Default formats: '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y', '%Y%m%d', ISO format
+    Parses the shapes DEFAULT_DATE_FORMATS produce with slicing/int().
+    Returns None whenever the shape is not clear-cut; the caller then runs the
+    strptime loop, so results are identical to trying the formats in order.
     """
-    if not date_str: return None
-    
+    length = len(date_str)
+
+    if length == 8 and date_str.isascii() and date_str.isdigit():  # %Y%m%d
+        year, month, day = int(date_str[:4]), int(date_str[4:6]), int(date_str[6:])
+        return datetime(year, month, day) if _valid_ymd(year, month, day) else None
+
+    if length == 10 and date_str[4] == '-' and date_str[7] == '-':  # %Y-%m-%d
+        digits = date_str[:4] + date_str[5:7] + date_str[8:]
+        if not (digits.isascii() and digits.isdigit()):
+            return None
+        year, month, day = int(digits[:4]), int(digits[4:6]), int(digits[6:])
+        return datetime(year, month, day) if _valid_ymd(year, month, day) else None
+
+    if length <= 10:  # %m/%d/%Y
+        ymd = _split_mdy(date_str)
+        return datetime(*ymd) if ymd else None
+
+    parts = date_str.split(' ')  # %m/%d/%Y %I:%M:%S %p
+    if len(parts) != 3:
+        return None
+    meridiem = parts[2].upper()
+    clock = parts[1].split(':')
+    if meridiem not in ('AM', 'PM') or len(clock) != 3:
+        return None
+    ymd = _split_mdy(parts[0])
+    hour, minute, second = _small_int(clock[0]), _small_int(clock[1]), _small_int(clock[2])
+    if ymd is None or not 1 <= hour <= 12 or not 0 <= minute <= 59 or not 0 <= second <= 59:
+        return None
+    hour %= 12
+    if meridiem == 'PM':
+        hour += 12
+    return datetime(ymd[0], ymd[1], ymd[2], hour, minute, second)
+
+
+def _strptime_any(date_str: str, formats: Tuple[str, ...]) -> Optional[datetime]:
+    for fmt in formats:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_cached(date_str: str, formats: Optional[Tuple[str, ...]]) -> Optional[datetime]:
     # Handle ISO format with Z
     if 'Z' in date_str:
         try:
@@ -316,20 +1436,99 @@ def parse_date(date_str: Optional[str], formats: Optional[List[str]] = None) ->
             pass
 
     if formats is None:
-        formats = [
-            '%m/%d/%Y %I:%M:%S %p', # 9/20/2025 12:00:00 AM
-            '%m/%d/%Y',             # 9/20/2025
-            '%Y%m%d',               # 20250920
-            '%Y-%m-%d'              # 2025-09-20
-        ]
-        
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
+        return _sniff_default(date_str) or _strptime_any(date_str, DEFAULT_DATE_FORMATS)
+    return _strptime_any(date_str, formats)
+
+
+def parse_date(date_str: Optional[str], formats: Optional[List[str]] = None) -> Optional[datetime]:
+    """
+    Tries to parse a date string using a list of formats.
+    Default formats: '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y', '%Y%m%d', ISO format
+
+    With the default formats the common shapes are sniffed and parsed directly,
+    falling back to strptime when in doubt. Results are cached per (value, formats).
+    """
+    if not date_str: return None
+    return _parse_date_cached(date_str, tuple(formats) if formats is not None else None)
+
+
+def parse_dates(date_strs: List[Optional[str]], formats: Optional[List[str]] = None) -> List[Optional[datetime]]:
+    """Batch parse_date: each distinct value is parsed once, results keep input order."""
+    fmt_key = tuple(formats) if formats is not None else None
+    parsed: Dict[str, Optional[datetime]] = {}
+    results: List[Optional[datetime]] = []
+    for date_str in date_strs:
+        if not date_str:
+            results.append(None)
             continue
-            
-    return None
+        if date_str not in parsed:
+            parsed[date_str] = _parse_date_cached(date_str, fmt_key)
+        results.append(parsed[date_str])
+    return results
+
+# --- HTML PARSING ---
+# lxml is optional but much faster: pages are read straight from its C tree when available
+try:
+    import lxml.html
+    HTML_PARSER: str = "lxml"
+except ImportError:
+    lxml = None
+    HTML_PARSER = "html.parser"
+
+ASPNET_STATE_FIELDS: Tuple[str, ...] = ("__VIEWSTATE", "__VIEWSTATEGENERATOR", "__EVENTVALIDATION")
+
+
+def lxml_document(html: str) -> Optional[Any]:
+    """lxml element tree for the page, or None if lxml is missing or cannot parse it (callers fall back to bs4)."""
+    if lxml is None or not html or not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        return None
+
+
+def lxml_text(element: Any) -> str:
+    """Same result as BeautifulSoup's get_text(strip=True) for an lxml element."""
+    return "".join(text.strip() for text in element.xpath(".//text()"))
+
+
+try:
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    def parse_html(html: str, only: Optional[Any] = None) -> BeautifulSoup:
+        """
+        BeautifulSoup with HTML_PARSER. `only` (tag name, list of names or a
+        SoupStrainer) builds just the matching subtrees instead of the whole page.
+        """
+        if only is not None and not isinstance(only, SoupStrainer):
+            only = SoupStrainer(only)
+        return BeautifulSoup(html, HTML_PARSER, parse_only=only)
+
+    def extract_form_state(html: str, fields: Tuple[str, ...] = ASPNET_STATE_FIELDS) -> Dict[str, str]:
+        """Values of the named <input> fields (ASP.NET ViewState by default); missing fields are omitted."""
+        doc = lxml_document(html)
+        if doc is not None:
+            state: Dict[str, str] = {}
+            for element in doc.iter("input"):
+                name = element.get("name")
+                if name in fields and name not in state:
+                    state[name] = element.get("value", "")
+            return state
+
+        soup = parse_html(html, SoupStrainer("input", attrs={"name": list(fields)}))
+        state = {}
+        for tag in soup.find_all("input"):
+            state.setdefault(tag["name"], tag.get("value", ""))
+        return state
+
+except ImportError:
+    # bs4 is only needed by the HTML scrapers
+    def parse_html(*args: Any, **kwargs: Any) -> Any:
+        raise ImportError("beautifulsoup4 is required for HTML parsing (pip install beautifulsoup4)")
+
+    def extract_form_state(*args: Any, **kwargs: Any) -> Dict[str, str]:
+        raise ImportError("beautifulsoup4 is required for HTML parsing (pip install beautifulsoup4)")
 
 # --- RETRY LOGIC (Tenacity) ---
 try: